@@ -0,0 +1,38 @@
+# bench/branch.py — branch extraction cost vs. clan size
+#
+#   python -m bench.branch [sizes...]     (default: 2000 20000 200000)
+#
+# The root is a fixed person near the top, so the branch grows with the tree; the
+# per-person cost should stay flat, and far below copying the whole tree.
+
+import copy
+import gc
+import sys
+import time
+
+from familytree.branch import MODES, extract_branch
+from familytree.synthetic import synthetic_graph
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'mode':>12} {'branch':>7} {'ms':>8} {'us/person':>10} {'full copy ms':>13}")
+    for n in sizes:
+        g = synthetic_graph(n, seed=2, clans=4)
+        root = list(g.persons)[60]
+        t0 = time.perf_counter()
+        copy.deepcopy(g.tree)
+        full = (time.perf_counter() - t0) * 1000
+        for mode in MODES:
+            best = float("inf")
+            for _ in range(3):   # best of 3: a collection of the big heap would dominate small branches
+                gc.collect()
+                t0 = time.perf_counter()
+                sub = extract_branch(g, [root], mode)
+                best = min(best, time.perf_counter() - t0)
+            ms = best * 1000
+            k = len(sub["persons"])
+            print(f"{len(g):>8} {mode:>12} {k:>7} {ms:8.2f} {ms * 1000 / k:10.1f} {full:13.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [2000, 20000, 200000])
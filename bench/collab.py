@@ -0,0 +1,60 @@
+# bench/collab.py — op-log sync between two replicas of a synthetic tree
+#
+#   python -m bench.collab [sizes...]     (default: 1000 5000 20000)
+#
+# The host seeds the room, a guest replays it from empty, then the host makes 200
+# edits in 20 batches (rename, add child, new marriage) and the guest pulls each
+# batch. "per batch" is flush + poll, i.e. what one peer change costs to arrive;
+# it should not grow with the tree.
+
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from familytree.collab import Collab, FileStore
+from familytree.graph import FamilyGraph
+from familytree.synthetic import synthetic_graph
+
+
+def _edit(g: FamilyGraph, rng: random.Random):
+    pids, mids = list(g.persons), list(g.marriages)
+    roll = rng.random()
+    if roll < 0.4:
+        g.update_person(rng.choice(pids), note=f"備註 {rng.random():.3f}")
+    elif roll < 0.8:
+        g.add_child(rng.choice(mids), g.add_person("新成員", rng.choice("男女")))
+    else:
+        g.add_or_get_marriage(rng.choice(pids), g.add_person("新配偶", "女"))
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'seed ops':>9} {'join s':>7} {'per batch ms':>13} {'per op µs':>10} {'same':>5}")
+    for n in sizes:
+        root = tempfile.mkdtemp(prefix="ft_collab_")
+        try:
+            host = Collab(synthetic_graph(n, seed=3), FileStore("bench", root), "host")
+            host.seed()
+            guest = Collab(FamilyGraph(), FileStore("bench", root), "guest")
+            t0 = time.perf_counter()
+            guest.poll()
+            join = time.perf_counter() - t0
+            rng = random.Random(1)
+            ops, t_sync = 0, 0.0
+            for _ in range(20):
+                for _ in range(10):
+                    _edit(host.g, rng)
+                t0 = time.perf_counter()
+                ops += host.flush()
+                guest.poll()
+                t_sync += time.perf_counter() - t0
+            same = host.g.tree == guest.g.tree
+            print(f"{len(host.g):>8} {host.sent - ops:>9} {join:7.2f} {t_sync / 20 * 1000:13.2f} "
+                  f"{t_sync / ops * 1e6:10.1f} {str(same):>5}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000, 20000])
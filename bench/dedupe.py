@@ -0,0 +1,54 @@
+# bench/dedupe.py — duplicate detection on synthetic trees with injected copies
+#
+#   python -m bench.dedupe [sizes...]     (default: 5000 10000 20000)
+#
+# 1% of persons get a copy: the same name with a space inserted or in simplified
+# script, attached to the original's spouse, parents, or a copy of the spouse.
+
+import random
+import sys
+import time
+
+from familytree.dedupe import find_duplicates
+from familytree.synthetic import synthetic_graph
+
+_SIMPLIFY = str.maketrans("張劉陳楊黃趙吳孫馬羅華偉強傑國麗", "张刘陈杨黄赵吴孙马罗华伟强杰国丽")
+
+
+def _inject(g, rate: float, seed: int):
+    rng = random.Random(seed)
+    pairs = []
+    for pid in rng.sample(list(g.persons), int(len(g) * rate)):
+        p = g.persons[pid]
+        name = p["name"]
+        name = name[0] + " " + name[1:] if rng.random() < 0.5 else name.translate(_SIMPLIFY)
+        copy = g.add_person(name, p["gender"])
+        pairs.append((pid, copy))
+        spouses, parents = g.spouses_of(pid), g.parent_marriage_of(pid)
+        roll = rng.random()
+        if spouses and roll < 0.4:
+            g.add_or_get_marriage(copy, spouses[0])
+        elif parents and roll < 0.7:
+            g.add_child(parents, copy)
+        elif spouses:
+            s = g.persons[spouses[0]]
+            s_copy = g.add_person(s["name"], s["gender"])
+            g.add_or_get_marriage(copy, s_copy)
+            pairs.append((spouses[0], s_copy))
+    return {tuple(sorted(x)) for x in pairs}
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'injected':>9} {'seconds':>8} {'found':>6} {'recall':>7} {'all pairs':>12}")
+    for n in sizes:
+        g = synthetic_graph(n, seed=3)
+        truth = _inject(g, 0.01, seed=1)
+        t0 = time.perf_counter()
+        found = {(c.a, c.b) for c in find_duplicates(g)}
+        dt = time.perf_counter() - t0
+        recall = len(truth & found) / len(truth)
+        print(f"{len(g):>8} {len(truth):>9} {dt:8.2f} {len(found):>6} {recall:7.1%} {len(g) * (len(g) - 1) // 2:>12,}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [5000, 10000, 20000])
@@ -0,0 +1,56 @@
+# bench/diff.py — diff and three-way merge on synthetic trees
+#
+#   python -m bench.diff [sizes...]     (default: 5000 20000)
+#
+# Each side edits 1.5% of persons (notes, new spouses and children, divorces,
+# deletions of leaves) in disjoint halves of the tree, so the merge is conflict-free.
+
+import copy
+import random
+import sys
+import time
+
+from familytree.diff import diff, merge3
+from familytree.graph import FamilyGraph
+from familytree.synthetic import synthetic_graph
+
+
+def _edit(tree: dict, seed: int, parity: int) -> dict:
+    g = FamilyGraph.from_dict(copy.deepcopy(tree))
+    rng = random.Random(seed)
+    pool = [p for p in g.persons if int(p[2:]) % 2 == parity]
+    for i in range(len(g) * 3 // 200):
+        pid = rng.choice(pool)
+        if pid not in g.persons:
+            continue
+        r = rng.random()
+        if r < 0.4:
+            g.update_person(pid, note=f"edit {seed}.{i}")
+        elif r < 0.6:
+            g.add_or_get_marriage(pid, g.add_person("新配偶", "女", pid=f"s{seed}_{i}"))
+        elif r < 0.8 and g.marriages_of(pid):
+            g.add_child(g.marriages_of(pid)[0], g.add_person("新生兒", "男", pid=f"c{seed}_{i}"))
+        elif r < 0.9 and g.marriages_of(pid):
+            g.toggle_divorce(g.marriages_of(pid)[0], True)
+        elif not g.marriages_of(pid):
+            g.delete_person(pid)
+    return g.tree
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'entities':>9} {'diff ms':>8} {'merge ms':>9} {'changes':>8} {'conflicts':>10}")
+    for n in sizes:
+        base = copy.deepcopy(synthetic_graph(n, seed=7).tree)
+        ours, theirs = _edit(base, 1, 0), _edit(base, 2, 1)
+        t0 = time.perf_counter()
+        d = diff(base, ours)
+        t1 = time.perf_counter()
+        _, conflicts = merge3(base, ours, theirs)
+        t2 = time.perf_counter()
+        entities = len(base["persons"]) + len(base["marriages"])
+        print(f"{n:>8} {entities:>9} {(t1 - t0) * 1000:8.0f} {(t2 - t1) * 1000:9.0f} "
+              f"{sum(d.summary().values()):>8} {len(conflicts):>10}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000])
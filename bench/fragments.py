@@ -0,0 +1,66 @@
+# bench/fragments.py — per-interaction latency of the tree page, whole page vs one section
+#
+#   python -m bench.fragments [sizes...]     (default: 1000 5000 10000)
+#
+# Runs the page in streamlit's AppTest. "page" is a rerun of the whole script after
+# a widget change (what every interaction cost before the sections became
+# fragments); "section" reruns only the fragment that owns the widget, which is
+# what Streamlit now does for that interaction. Best of 3, seconds.
+
+import os
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from familytree.synthetic import synthetic_graph
+
+PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages_familytree.py")
+
+# (label, section function, how to change its widget on the i-th repeat)
+INTERACTIONS = [
+    ("type a new person's name", "_person_manager", lambda at, i: at.text_input(key="person_name").input(f"張{i}")),
+    ("search a spouse", "_marriage_manager", lambda at, i: at.text_input(key="spouse_a_select_q").input("王李"[i % 2])),
+    ("switch graph engine", "_viewer",
+     lambda at, i: at.radio(key="tree_render_mode").set_value(["瀏覽器排版", "內建快速排版"][i % 2])),
+    ("pick kinship person", "_kinship_panel",
+     lambda at, i: at.selectbox(key="kin_a").set_value(list(at.session_state["family_tree"]["persons"])[i + 2])),
+]
+
+
+def _app(tree, section=None) -> AppTest:
+    if section is None:
+        at = AppTest.from_file(PAGE, default_timeout=600)
+    else:
+        at = AppTest.from_string(f"import pages_familytree as P\nP._init_state()\nP.{section}()\n",
+                                 default_timeout=600)
+    at.session_state["family_tree"] = tree
+    at.session_state["tree_render_mode"] = "內建快速排版"   # same engine for both, no Graphviz needed
+    at.run()
+    return at
+
+
+def _best(at: AppTest, change, repeats: int = 3) -> float:
+    best = float("inf")
+    for i in range(repeats):
+        change(at, i)
+        t0 = time.perf_counter()
+        at.run()
+        best = min(best, time.perf_counter() - t0)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return best
+
+
+def main(sizes):
+    print(f"{'persons':>8}  {'interaction':<28} {'page s':>7} {'section s':>10} {'speed-up':>9}")
+    for n in sizes:
+        tree = synthetic_graph(n, seed=1).tree
+        for label, section, change in INTERACTIONS:
+            t_page = _best(_app(tree), change)
+            t_section = _best(_app(tree, section), change)
+            print(f"{n:>8}  {label:<28} {t_page:7.3f} {t_section:10.3f} {t_page / t_section:8.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 5000, 10000])
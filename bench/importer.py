@@ -0,0 +1,53 @@
+# bench/importer.py — streaming import vs json.loads + from_dict
+#
+#   python -m bench.importer [sizes...]     (default: 5000 20000 50000)
+#
+# Both start from the uploaded bytes (an indented family_tree.json). "model MB" is
+# what is still allocated afterwards (the graph), "peak MB" the tracemalloc peak
+# during the import; the bytes themselves are not counted. Time is taken on a
+# separate run without tracemalloc, which slows the allocation-heavy streamer most.
+
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from familytree.graph import FamilyGraph
+from familytree.importer import read_tree
+from familytree.synthetic import synthetic_graph
+from familytree.validate import errors, validate_tree
+
+
+def _loads(data: bytes) -> FamilyGraph:
+    obj = json.loads(io.BytesIO(data).read().decode("utf-8"))
+    assert not errors(validate_tree(obj))
+    return FamilyGraph.from_dict(obj)
+
+
+def _stream(data: bytes) -> FamilyGraph:
+    return read_tree(io.BytesIO(data), total=len(data))[0]
+
+
+def _measure(fn, data: bytes):
+    t0 = time.perf_counter()
+    fn(data)
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    g = fn(data)
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return g, dt, cur / 2 ** 20, peak / 2 ** 20
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'file MB':>8} {'method':>7} {'time s':>7} {'model MB':>9} {'peak MB':>8}")
+    for n in sizes:
+        data = json.dumps(synthetic_graph(n, seed=1).tree, ensure_ascii=False, indent=2).encode("utf-8")
+        for label, fn in (("loads", _loads), ("stream", _stream)):
+            g, dt, cur, peak = _measure(fn, data)
+            print(f"{len(g):>8} {len(data) / 2 ** 20:8.1f} {label:>7} {dt:7.2f} {cur:9.1f} {peak:8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000, 50000])
@@ -0,0 +1,26 @@
+# bench/kinship.py — all-pairs kinship table on synthetic trees
+#
+#   python -m bench.kinship [sizes...]     (default: 200 500 1000)
+
+import sys
+import time
+from collections import Counter
+
+from familytree.kinship import KinshipIndex
+from familytree.synthetic import synthetic_graph
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'pairs':>10} {'seconds':>8} {'pairs/s':>10}  top terms")
+    for n in sizes:
+        g = synthetic_graph(n, seed=5)
+        t0 = time.perf_counter()
+        terms = Counter(t for _, _, t in KinshipIndex(g).table())
+        dt = time.perf_counter() - t0
+        pairs = sum(terms.values())
+        top = "、".join(t for t, _ in terms.most_common(5))
+        print(f"{n:>8} {pairs:>10} {dt:8.2f} {pairs / dt:10.0f}  {top}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [200, 500, 1000])
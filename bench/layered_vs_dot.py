@@ -0,0 +1,45 @@
+# bench/layered_vs_dot.py — built-in layered layout vs Graphviz dot on synthetic trees
+#
+#   python -m bench.layered_vs_dot [sizes...]      (default: 100 500 2000 10000)
+#
+# dot timings are skipped (shown as "-") when the Graphviz binaries are missing,
+# and for sizes above DOT_MAX where a single dot run takes minutes.
+
+import sys
+import time
+
+import graphviz
+
+from familytree.layered import layered_layout, layered_svg
+from familytree.render import render_graph
+from familytree.synthetic import synthetic_tree
+
+DOT_MAX = 5000
+
+
+def _time(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'marriages':>9} {'layered':>10} {'lay+svg':>10} {'dot svg':>10} {'ratio':>7}")
+    for n in sizes:
+        tree = synthetic_tree(n, seed=7)
+        t_lay = _time(lambda: layered_layout(tree))
+        t_svg = _time(lambda: layered_svg(tree))
+        t_dot = None
+        if n <= DOT_MAX:
+            try:
+                t_dot = _time(lambda: render_graph(tree).pipe(format="svg"))
+            except graphviz.ExecutableNotFound:
+                t_dot = None
+        dot_s = f"{t_dot * 1000:8.0f}ms" if t_dot is not None else f"{'-':>10}"
+        ratio = f"{t_dot / t_svg:6.1f}x" if t_dot is not None else f"{'-':>7}"
+        print(f"{len(tree['persons']):>8} {len(tree['marriages']):>9} {t_lay * 1000:8.0f}ms "
+              f"{t_svg * 1000:8.0f}ms {dot_s} {ratio}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 500, 2000, 10000])
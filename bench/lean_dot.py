@@ -0,0 +1,56 @@
+# bench/lean_dot.py — classic vs lean DOT emission: size, element counts, dot layout time
+#
+#   python -m bench.lean_dot [--max-dot N] [sizes...]     (default: 100 500 1000 2000 5000 10000)
+#
+# Layout time needs the Graphviz binaries; it is skipped above --max-dot persons
+# (default 2000) because the classic emitter takes minutes there.
+
+import re
+import sys
+import time
+
+import graphviz
+
+from familytree.render import render_graph
+from familytree.synthetic import synthetic_tree
+
+_EDGE = re.compile(r"^\s*\S+\s*->\s*\S+", re.M)
+_NODE = re.compile(r"^\s*[\w\"]+\s*\[", re.M)
+_CLUSTER = re.compile(r"subgraph\s+\"?cluster_", re.M)
+
+
+def _counts(src: str):
+    return len(_NODE.findall(src)), len(_EDGE.findall(src)), len(_CLUSTER.findall(src))
+
+
+def _layout_ms(g: graphviz.Digraph):
+    try:
+        t0 = time.perf_counter()
+        g.pipe(format="json0")
+        return (time.perf_counter() - t0) * 1000
+    except graphviz.ExecutableNotFound:
+        return None
+
+
+def main(sizes, max_dot: int = 2000):
+    print(f"{'persons':>8} {'emitter':>8} {'DOT KB':>8} {'nodes':>7} {'edges':>7} {'clusters':>8} {'layout':>10}")
+    for n in sizes:
+        tree = synthetic_tree(n, seed=11)
+        for lean in (False, True):
+            g = render_graph(tree, lean=lean)
+            src = g.source
+            nodes, edges, clusters = _counts(src)
+            ms = _layout_ms(g) if n <= max_dot else None
+            lay = f"{ms:8.0f}ms" if ms is not None else f"{'-':>10}"
+            print(f"{n:>8} {'lean' if lean else 'classic':>8} {len(src.encode('utf-8')) / 1024:8.1f} "
+                  f"{nodes:>7} {edges:>7} {clusters:>8} {lay}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    max_dot = 2000
+    if "--max-dot" in args:
+        i = args.index("--max-dot")
+        max_dot = int(args[i + 1])
+        del args[i:i + 2]
+    main([int(a) for a in args] or [100, 500, 1000, 2000, 5000, 10000], max_dot)
@@ -0,0 +1,51 @@
+# bench/rank_hints.py — dot layout time with and without per-generation rank hints
+#
+#   python -m bench.rank_hints [--max-children K] [sizes...]   (default: 200 500 1000 2000)
+#
+# Deep trees (many generations, few children each) are where dot's ranking pass
+# costs most. Needs the Graphviz binaries; without them only DOT sizes are printed.
+
+import sys
+import time
+
+import graphviz
+
+from familytree.generations import Generations
+from familytree.render import render_graph
+from familytree.synthetic import synthetic_graph
+
+
+def _layout_ms(g: graphviz.Digraph):
+    try:
+        t0 = time.perf_counter()
+        g.pipe(format="json0")
+        return (time.perf_counter() - t0) * 1000
+    except graphviz.ExecutableNotFound:
+        return None
+
+
+def main(sizes, max_children: int = 2):
+    print(f"{'persons':>8} {'gens':>5} {'emitter':>8} {'hints':>6} {'DOT KB':>8} {'layout':>10} {'gen pass':>9}")
+    for n in sizes:
+        graph = synthetic_graph(n, seed=13, max_children=max_children)
+        t0 = time.perf_counter()
+        gens = Generations(graph).mapping()
+        gen_ms = (time.perf_counter() - t0) * 1000
+        depth = max(gens.values()) + 1 if gens else 0
+        for lean in (False, True):
+            for hints in (False, True):
+                g = render_graph(graph.tree, lean=lean, generations=gens if hints else None)
+                ms = _layout_ms(g)
+                lay = f"{ms:8.0f}ms" if ms is not None else f"{'-':>10}"
+                print(f"{n:>8} {depth:>5} {'lean' if lean else 'classic':>8} {'yes' if hints else 'no':>6} "
+                      f"{len(g.source.encode('utf-8')) / 1024:8.1f} {lay} {gen_ms:7.1f}ms")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    kids = 2
+    if "--max-children" in args:
+        i = args.index("--max-children")
+        kids = int(args[i + 1])
+        del args[i:i + 2]
+    main([int(a) for a in args] or [200, 500, 1000, 2000], kids)
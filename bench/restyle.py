@@ -0,0 +1,55 @@
+# bench/restyle.py — full `dot` layout vs pinned `neato -n` restyle on a synthetic tree
+#
+#   python -m bench.restyle [n_persons] [repeats]
+#
+# Needs the Graphviz binaries (see packages.txt).
+
+import random
+import sys
+import time
+
+from familytree.layout_reuse import LayoutStore, full_layout, structure_key
+from familytree.render import render_graph
+from familytree.synthetic import synthetic_graph
+
+
+def _timed(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(n: int = 2000, repeats: int = 3):
+    graph = synthetic_graph(n, seed=1)
+    tree = graph.tree
+    rng = random.Random(0)
+    print(f"tree: {len(graph.persons)} persons, {len(graph.marriages)} marriages")
+
+    t_full = _timed(lambda: render_graph(tree).pipe(format="svg"), repeats)
+    print(f"full dot layout + svg     : {t_full * 1000:9.1f} ms")
+
+    store = LayoutStore()
+    key = structure_key(tree)
+    store.put(key, full_layout(tree))
+
+    # style-only edits: deceased flag, short note, divorce line
+    pid = rng.choice(list(tree["persons"]))
+    mid = rng.choice(list(tree["marriages"]))
+    tree["persons"][pid]["deceased"] = not tree["persons"][pid].get("deceased")
+    tree["persons"][pid]["note"] = "1950"
+    graph.toggle_divorce(mid, not tree["marriages"][mid].get("divorced"))
+    assert structure_key(tree) == key, "edit unexpectedly changed the structure key"
+
+    positions = store.get(key)
+    t_pin = _timed(lambda: render_graph(tree, positions=positions).pipe(format="svg", engine="neato",
+                                                                         neato_no_op=1), repeats)
+    print(f"restyle (neato -n pinned) : {t_pin * 1000:9.1f} ms")
+    print(f"speed-up                  : {t_full / t_pin:9.1f}x")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,48 @@
+# bench/search.py — typeahead search index: build, query and incremental update
+#
+#   python -m bench.search [sizes...]     (default: 5000 20000)
+#
+# "query" is the mean over a mix of name prefixes, mid-name fragments, pinyin
+# initials and single surnames; "edit" is one rename followed by a query (the
+# index re-indexes just that person), against a full rebuild.
+
+import random
+import sys
+import time
+
+from familytree.search import SearchIndex, lazy_pinyin, phonetic_keys
+from familytree.synthetic import synthetic_graph
+
+
+def main(sizes):
+    if lazy_pinyin is None:
+        print("(pypinyin not installed: pinyin / zhuyin keys are skipped)")
+    print(f"{'persons':>8} {'build s':>8} {'query ms':>9} {'hits':>6} {'edit ms':>8} {'rebuild s':>10}")
+    for n in sizes:
+        g = synthetic_graph(n, seed=5)
+        t0 = time.perf_counter()
+        idx = SearchIndex(g)
+        idx.search("")
+        t_build = time.perf_counter() - t0
+        rng = random.Random(0)
+        names = [g.persons[p]["name"] for p in rng.sample(list(g.persons), 50)]
+        queries = [nm[:2] for nm in names] + [nm[1:] for nm in names] + [nm[0] for nm in names]
+        queries += [k[1] for k in map(phonetic_keys, names) if k]
+        t0 = time.perf_counter()
+        hits = sum(len(idx.search(q)) for q in queries)
+        t_query = (time.perf_counter() - t0) / len(queries)
+        pids = rng.sample(list(g.persons), 50)
+        t0 = time.perf_counter()
+        for i, pid in enumerate(pids):
+            g.update_person(pid, name=f"改名{i}")
+            idx.search(f"改名{i}")
+        t_edit = (time.perf_counter() - t0) / len(pids)
+        t0 = time.perf_counter()
+        SearchIndex(g).search("")
+        t_rebuild = time.perf_counter() - t0
+        print(f"{len(g):>8} {t_build:8.2f} {t_query * 1000:9.2f} {hits // len(queries):>6} "
+              f"{t_edit * 1000:8.2f} {t_rebuild:10.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000])
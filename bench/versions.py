@@ -0,0 +1,55 @@
+# bench/versions.py — delta snapshots vs full copies
+#
+#   python -m bench.versions [sizes...]     (default: 5000 20000)
+#
+# 30 versions, each after 50 random edits (note change, new child, deletion).
+# "full" is what packing every version whole would cost; "rebuild" is the mean
+# time to materialise a version, "compare" diffs the 4th against the 27th.
+
+import random
+import sys
+import time
+
+from familytree.synthetic import synthetic_graph
+from familytree.versions import VersionStore
+from familytree.workspace import pack
+
+
+def _edit(g, rng: random.Random):
+    pids = list(g.persons)
+    roll = rng.random()
+    if roll < 0.5:
+        g.update_person(rng.choice(pids), note=f"{rng.random():.4f}")
+    elif roll < 0.8:
+        g.add_child(rng.choice(list(g.marriages)), g.add_person("新成員", "男"))
+    else:
+        g.delete_person(rng.choice(pids))
+
+
+def main(sizes):
+    print(f"{'persons':>8} {'store KB':>9} {'full KB':>8} {'ratio':>6} {'snapshot s':>11} "
+          f"{'rebuild s':>10} {'compare s':>10}")
+    for n in sizes:
+        g = synthetic_graph(n, seed=2)
+        rng = random.Random(0)
+        vs, full, t_snap = VersionStore(), 0, 0.0
+        for v in range(30):
+            for _ in range(50):
+                _edit(g, rng)
+            t0 = time.perf_counter()
+            vs.snapshot(g.tree, f"v{v}")
+            t_snap += time.perf_counter() - t0
+            full += len(pack(g.tree))
+        t0 = time.perf_counter()
+        for i in range(len(vs)):
+            vs.tree(i)
+        t_rebuild = (time.perf_counter() - t0) / len(vs)
+        t0 = time.perf_counter()
+        vs.compare(3, 26)
+        t_cmp = time.perf_counter() - t0
+        print(f"{len(g):>8} {vs.total_bytes() // 1024:>9} {full // 1024:>8} {full / vs.total_bytes():6.1f} "
+              f"{t_snap / 30:11.3f} {t_rebuild:10.3f} {t_cmp:10.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [5000, 20000])
@@ -0,0 +1,35 @@
+# bench/workspace.py — switch latency and footprint per workspace tier
+#
+#   python -m bench.workspace [persons]     (default: 2000)
+#
+# Five client trees of `persons` each; the budget only fits the active one live,
+# so opening an older tree goes through packed or spilled storage.
+
+import sys
+import time
+
+from familytree.synthetic import synthetic_graph
+from familytree.workspace import Workspace, live_bytes
+
+
+def main(n: int):
+    graphs = [synthetic_graph(n, seed=i) for i in range(5)]
+    one = live_bytes(graphs[0])
+    ws = Workspace(max_bytes=int(one * 1.5), max_live=3)
+    for i, g in enumerate(graphs):
+        ws.put(f"client{i}", g)
+    print(f"{'open':>8} {'from':>8} {'ms':>8} {'total KB':>9}  tiers")
+    for name in ["client4", "client3", "client4", "client0", "client3"]:
+        tier = next(r["tier"] for r in ws.stats() if r["name"] == name)
+        t0 = time.perf_counter()
+        ws.open(name)
+        ms = (time.perf_counter() - t0) * 1000
+        tiers = " ".join(r["tier"][0] for r in ws.stats())
+        print(f"{name:>8} {tier:>8} {ms:8.1f} {ws.total_bytes() // 1024:>9}  {tiers}")
+    packed = [r["bytes"] for r in ws.stats() if r["tier"] == "packed"]
+    if packed:
+        print(f"live estimate {one // 1024} KB, packed {packed[0] // 1024} KB per tree")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
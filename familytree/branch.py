@@ -0,0 +1,96 @@
+# familytree/branch.py — one person's branch as a self-contained tree
+#
+# extract_branch() walks FamilyGraph's spouse/child indexes outward from the chosen
+# persons and copies only what it reaches, so the cost is O(size of the branch) no
+# matter how big the clan is. The result is in the usual `{"persons", "marriages"}` shape
+# with fresh dicts, so it goes straight into JSON export, render_within_budget and
+# poster.export_pdf, and can be re-imported on its own.
+#
+#   descendants   the persons, their spouses, children, children's spouses, …
+#   ancestors     the persons, their parents, grandparents, … (siblings left out)
+#   both          the union of the two
+#
+# Every marriage kept has all its spouses in the result; children are trimmed to
+# those in the result.
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from familytree.graph import FamilyGraph
+
+MODES = ("descendants", "ancestors", "both")
+
+
+def _descendants(g: FamilyGraph, roots: Iterable[str], depth: Optional[int],
+                 persons: Set[str], mids: Set[str]):
+    q = deque((r, 0) for r in roots)
+    seen = {r for r, _ in q}
+    persons.update(seen)
+    while q:
+        pid, d = q.popleft()
+        for mid in g.marriages_of(pid):
+            m = g.marriages[mid]
+            mids.add(mid)
+            persons.update(m.get("spouses", []))
+            if depth is not None and d >= depth:
+                continue
+            for c in m.get("children", []):
+                if c not in seen:
+                    seen.add(c)
+                    persons.add(c)
+                    q.append((c, d + 1))
+
+
+def _ancestors(g: FamilyGraph, roots: Iterable[str], depth: Optional[int],
+               persons: Set[str], line: Dict[str, List[str]]):
+    q = deque((r, 0) for r in roots)
+    seen = {r for r, _ in q}
+    persons.update(seen)
+    while q:
+        pid, d = q.popleft()
+        if depth is not None and d >= depth:
+            continue
+        for mid in g.parent_marriages_of(pid):
+            line.setdefault(mid, []).append(pid)
+            for s in g.marriages[mid].get("spouses", []):
+                if s not in seen:
+                    seen.add(s)
+                    persons.add(s)
+                    q.append((s, d + 1))
+
+
+def extract_branch(g: FamilyGraph, roots: Iterable[str], mode: str = "descendants",
+                   depth: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """Branch of `roots` in the `{"persons", "marriages"}` shape (copies, safe to edit).
+
+    depth   generations to follow from the roots (None = all)
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    roots = [r for r in dict.fromkeys(roots) if r in g.persons]
+    persons: Set[str] = set()
+    mids: Set[str] = set()
+    line: Dict[str, List[str]] = {}   # ancestors' marriage -> the children it was reached through
+    if mode in ("descendants", "both"):
+        _descendants(g, roots, depth, persons, mids)
+    if mode in ("ancestors", "both"):
+        _ancestors(g, roots, depth, persons, line)
+
+    sub_p = {pid: dict(g.persons[pid]) for pid in persons if pid in g.persons}
+    sub_m: Dict[str, Dict[str, Any]] = {}
+    for mid in mids | set(line):
+        m = g.marriages[mid]
+        mm = {k: v for k, v in m.items() if not isinstance(v, list)}
+        mm["spouses"] = [s for s in m.get("spouses", []) if s in sub_p]
+        mm["order"] = [s for s in (m.get("order") or m.get("spouses", [])) if s in sub_p]
+        if mid not in mids and len(line[mid]) == 1:
+            # one line through an ancestor's marriage: skip scanning all the siblings
+            mm["children"] = list(line[mid])
+        else:
+            mm["children"] = [c for c in m.get("children", []) if c in sub_p]
+        sub_m[mid] = mm
+    # deterministic order (interned index) so exports and layout caches are stable
+    order_p = sorted(sub_p, key=lambda pid: g.pid_index(pid))
+    order_m = sorted(sub_m, key=lambda mid: g.mid_index(mid))
+    return {"persons": {pid: sub_p[pid] for pid in order_p},
+            "marriages": {mid: sub_m[mid] for mid in order_m}}
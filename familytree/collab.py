@@ -0,0 +1,353 @@
+# familytree/collab.py — 顧問陪跑模式: several sessions editing one tree through an op log
+#
+# Every edit to the FamilyGraph is turned into small operations and appended to a
+# per-session log in a shared room directory; peers tail each other's logs and
+# apply only the new lines, so a change costs O(1) per op to ship and to apply and
+# nothing ever re-sends the tree.
+#
+# The log is a conflict-free replicated structure: every op carries a Lamport
+# timestamp (clock, site) and
+#   persons / marriages   are created under unique ids; deletion wins over edits
+#   fields                are last-writer-wins registers per (entity, field)
+#   children              are last-writer-wins memberships per (marriage, child),
+#                         kept in timestamp order so every peer lists them alike
+# so peers that have seen the same ops hold the same tree, whatever order the ops
+# arrived in. Ops are not captured by hand in each page mutator: a FamilyGraph
+# listener records the before-image of whatever an edit touches (like the undo
+# journal) and flush() diffs it against the current state, so undo/redo, merges
+# and bulk edits are shared too.
+#
+# Known limits: two peers marrying the same couple at the same moment end up with
+# one marriage under different ids on each side (same content); edits are not
+# re-validated when they merge, so concurrent edits can combine into a structure
+# the per-edit Validator would have refused.
+
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from familytree.graph import FamilyGraph
+from familytree.render_cache import DATA_DIR
+
+COLLAB_DIR = os.path.join(DATA_DIR, "collab")
+
+Ts = Tuple[int, str]
+_ZERO: Ts = (0, "")
+
+
+# ----------------------------- shared store -----------------------------
+
+def _safe_room(room: str) -> str:
+    return "".join(ch for ch in room if ch.isalnum() or ch in "-_") or "room"
+
+
+def room_exists(room: str, root: str = COLLAB_DIR) -> bool:
+    return os.path.isdir(os.path.join(root, _safe_room(room)))
+
+
+class FileStore:
+    """One append-only JSON-lines file per site in a room directory.
+
+    Each file has a single writer (its site), so appends need no locking; readers
+    remember a byte offset per file and only consume complete lines.
+    """
+
+    def __init__(self, room: str, root: str = COLLAB_DIR):
+        self.room = _safe_room(room)
+        self.path = os.path.join(root, self.room)
+        os.makedirs(self.path, exist_ok=True)
+        self._offsets: Dict[str, int] = {}
+
+    def append(self, site: str, ops: List[Dict[str, Any]]):
+        if not ops:
+            return
+        data = "".join(json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n" for op in ops)
+        with open(os.path.join(self.path, f"{site}.jsonl"), "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+
+    def read_new(self, skip_site: Optional[str] = None) -> List[Dict[str, Any]]:
+        out = []
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return out
+        for name in names:
+            if not name.endswith(".jsonl") or name[:-6] == skip_site:
+                continue
+            path = os.path.join(self.path, name)
+            pos = self._offsets.get(name, 0)
+            try:
+                with open(path, "rb") as f:
+                    f.seek(pos)
+                    chunk = f.read()
+            except OSError:
+                continue
+            end = chunk.rfind(b"\n") + 1   # a writer may be mid-line
+            for line in chunk[:end].splitlines():
+                if line.strip():
+                    out.append(json.loads(line))
+            self._offsets[name] = pos + end
+        return out
+
+    def sites(self) -> List[str]:
+        try:
+            return sorted(n[:-6] for n in os.listdir(self.path) if n.endswith(".jsonl"))
+        except OSError:
+            return []
+
+    def destroy(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+# ----------------------------- replica -----------------------------
+
+class Collab:
+    """Links one FamilyGraph to a room: flush() publishes local edits, poll() applies peers'."""
+
+    def __init__(self, graph: FamilyGraph, store: FileStore, site: Optional[str] = None):
+        self.g = graph
+        self.store = store
+        self.site = site or uuid.uuid4().hex[:8]
+        self.clock = 0
+        self.seq = 0
+        self.sent = self.received = 0
+        self._applying = False
+        self._before: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        self._field_ts: Dict[Tuple[str, str, str], Ts] = {}
+        self._child_ts: Dict[Tuple[str, str], Ts] = {}
+        self._child_on: Dict[Tuple[str, str], bool] = {}
+        self._dead: Dict[Tuple[str, str], Ts] = {}       # tombstones
+        self._alias: Dict[str, str] = {}                   # peer marriage id -> local one (same couple)
+        self._pending: List[Dict[str, Any]] = []           # ops waiting for an entity not seen yet
+        graph.add_listener(self._on_touch)
+
+    # ---------- capture ----------
+    def _on_touch(self, kind: str, key: str):
+        if not self._applying and (kind, key) not in self._before:
+            self._before[(kind, key)] = self.g.image(kind, key)
+
+    def _tick(self) -> Ts:
+        self.clock += 1
+        return (self.clock, self.site)
+
+    def _op(self, **kw) -> Dict[str, Any]:
+        self.seq += 1
+        ts = self._tick()
+        kw["ts"] = list(ts)
+        return kw
+
+    def seed(self):
+        """Publish the whole current tree (the room's first member does this once)."""
+        for pid in self.g.persons:
+            self._before.setdefault(("p", pid), None)
+        for mid in self.g.marriages:
+            self._before.setdefault(("m", mid), None)
+        self.flush()
+
+    def flush(self) -> int:
+        """Turn the edits made since the last flush into ops and append them to the log."""
+        if not self._before:
+            return 0
+        touched, self._before = self._before, {}
+        ops: List[Dict[str, Any]] = []
+        # created/edited persons, then marriages, then deleted persons: a peer applies
+        # them in this order, so a merge's spouse swap lands before the old spouse goes
+        def rank(item):
+            (kind, key), _ = item
+            return 1 if kind == "m" else (0 if key in self.g.persons else 2)
+        for (kind, key), before in sorted(touched.items(), key=rank):
+            ops.extend(self._ops_for(kind, key, before, self.g.image(kind, key)))
+        for op in ops:
+            self._record(op)
+        self.store.append(self.site, ops)
+        self.sent += len(ops)
+        return len(ops)
+
+    def _ops_for(self, kind: str, key: str, before, after) -> List[Dict[str, Any]]:
+        ops = []
+        if after is None:
+            if before is not None:
+                ops.append(self._op(op="del", kind=kind, key=key))
+            return ops
+        if kind == "p":
+            if before is None:
+                ops.append(self._op(op="add_p", key=key, fields=after))
+            else:
+                for f, v in after.items():
+                    if before.get(f) != v:
+                        ops.append(self._op(op="set", kind="p", key=key, field=f, value=v))
+            return ops
+        kids_before = (before or {}).get("children", [])
+        if before is None:
+            ops.append(self._op(op="add_m", key=key, spouses=after.get("spouses", []),
+                                order=after.get("order") or after.get("spouses", []),
+                                fields={k: v for k, v in after.items() if not isinstance(v, list)}))
+        else:
+            for f, v in after.items():
+                if f == "spouses" and v != before.get("spouses"):
+                    ops.append(self._op(op="spouses", key=key, old=before.get("spouses", []), new=v))
+                elif not isinstance(v, list) and before.get(f) != v:
+                    ops.append(self._op(op="set", kind="m", key=key, field=f, value=v))
+        had, has = set(kids_before), set(after.get("children", []))
+        for c in after.get("children", []):
+            if c not in had:
+                ops.append(self._op(op="child", key=key, child=c, on=True))
+        for c in kids_before:
+            if c not in has:
+                ops.append(self._op(op="child", key=key, child=c, on=False))
+        return ops
+
+    def _record(self, op: Dict[str, Any]):
+        # local ops are already applied; just remember their timestamps
+        ts = tuple(op["ts"])
+        if op["op"] == "set":
+            self._field_ts[(op["kind"], op["key"], op["field"])] = ts
+        elif op["op"] == "child":
+            self._child_ts[(op["key"], op["child"])] = ts
+            self._child_on[(op["key"], op["child"])] = op["on"]
+        elif op["op"] == "add_p":
+            for f in op["fields"]:
+                self._field_ts[("p", op["key"], f)] = ts
+        elif op["op"] == "add_m":
+            for f in op["fields"]:
+                self._field_ts[("m", op["key"], f)] = ts
+        elif op["op"] == "del":
+            self._dead[(op["kind"], op["key"])] = ts
+
+    # ---------- apply ----------
+    def poll(self) -> int:
+        """Publish local edits, then apply every new peer op; returns how many were applied."""
+        self.flush()
+        ops = self._pending + self.store.read_new(skip_site=self.site)
+        if not ops:
+            return 0
+        ops.sort(key=lambda op: (op["ts"][0], op["ts"][1]))   # causal order (Lamport)
+        self._pending = []
+        applied = 0
+        self._applying = True
+        try:
+            for op in ops:
+                self.clock = max(self.clock, op["ts"][0])
+                if self._apply(op):
+                    applied += 1
+                else:
+                    self._pending.append(op)
+        finally:
+            self._applying = False
+        self.received += applied
+        return applied
+
+    def _mid(self, mid: str) -> str:
+        return self._alias.get(mid, mid)
+
+    def _apply(self, op: Dict[str, Any]) -> bool:
+        """Apply one peer op; False = it refers to something not seen yet (retry later)."""
+        g, ts, kind = self.g, tuple(op["ts"]), op["op"]
+        if kind == "del":
+            key = op["key"] if op["kind"] == "p" else self._mid(op["key"])
+            self._dead[(op["kind"], key)] = max(ts, self._dead.get((op["kind"], key), _ZERO))
+            if op["kind"] == "p":
+                g.delete_person(key)
+            else:
+                g.delete_marriage(key)
+            return True
+        if kind == "add_p":
+            key = op["key"]
+            if ("p", key) in self._dead or key in g.persons:
+                return True
+            g.restore({("p", key): dict(op["fields"])})
+            for k in op["fields"]:
+                self._field_ts[("p", key, k)] = ts
+            return True
+        if kind == "add_m":
+            key = op["key"]
+            if ("m", key) in self._dead or key in g.marriages:
+                return True
+            spouses = [s for s in op["spouses"] if ("p", s) not in self._dead]
+            if any(s not in g.persons for s in spouses):
+                return False
+            found = g.find_marriage(*spouses) if len(spouses) == 2 else None
+            if found is not None:
+                self._alias[key] = found   # the same couple married on two sites at once
+            else:
+                order = [s for s in op.get("order", spouses) if s in spouses] or spouses
+                g.restore({("m", key): {"spouses": spouses, "order": order, "children": [], "divorced": False}})
+            for k, v in op["fields"].items():
+                self._set_marriage_field(self._mid(key), k, v, ts)
+            return True
+        if kind == "set":
+            key = op["key"] if op["kind"] == "p" else self._mid(op["key"])
+            if (op["kind"], key) in self._dead:
+                return True
+            if key not in (g.persons if op["kind"] == "p" else g.marriages):
+                return False
+            if op["kind"] == "p":
+                reg = ("p", key, op["field"])
+                if ts > self._field_ts.get(reg, _ZERO):
+                    self._field_ts[reg] = ts
+                    g.update_person(key, **{op["field"]: op["value"]})
+            else:
+                self._set_marriage_field(key, op["field"], op["value"], ts)
+            return True
+        if kind == "spouses":
+            key = self._mid(op["key"])
+            if ("m", key) in self._dead:
+                return True
+            if key not in g.marriages:
+                return False
+            old, new = set(op["old"]), set(op["new"])
+            gone, came = list(old - new), list(new - old)
+            if len(gone) == 1 and len(came) == 1:
+                if came[0] not in g.persons:
+                    return ("p", came[0]) in self._dead
+                g.replace_spouse(key, gone[0], came[0])
+            return True
+        if kind == "child":
+            return self._apply_child(self._mid(op["key"]), op["child"], op["on"], ts)
+        return True
+
+    def _set_marriage_field(self, mid: str, field: str, value, ts: Ts):
+        if field in ("spouses", "order", "children"):
+            return   # structural: carried by the spouses / child ops, never by a register
+        reg = ("m", mid, field)
+        if ts <= self._field_ts.get(reg, _ZERO):
+            return
+        self._field_ts[reg] = ts
+        self.g.update_marriage(mid, **{field: bool(value) if field == "divorced" else value})
+
+    def _apply_child(self, mid: str, child: str, on: bool, ts: Ts) -> bool:
+        g = self.g
+        if ("m", mid) in self._dead or ("p", child) in self._dead:
+            return True
+        if mid not in g.marriages or child not in g.persons:
+            return False
+        reg = (mid, child)
+        if ts <= self._child_ts.get(reg, _ZERO):
+            return True
+        self._child_ts[reg] = ts
+        self._child_on[reg] = on
+        if not on:
+            g.remove_children(mid, [child])
+            return True
+        if g.has_child(mid, child):   # set index, O(1)
+            return True
+        # insert in timestamp order, so peers that saw the same adds list them alike;
+        # ops arrive sorted, so this is almost always an append (only a concurrent,
+        # older add walks back over the few newer children)
+        kids = g.marriages[mid]["children"]
+        i = len(kids)
+        while i > 0 and self._child_ts.get((mid, kids[i - 1]), _ZERO) > ts:
+            i -= 1
+        g.add_child(mid, child, None if i == len(kids) else i)
+        return True
+
+    # ---------- info ----------
+    def peers(self) -> List[str]:
+        return [s for s in self.store.sites() if s != self.site]
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "received": self.received, "pending": len(self._pending),
+                "clock": self.clock}
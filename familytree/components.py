@@ -0,0 +1,265 @@
+# familytree/components.py — lay out unconnected clans separately, in parallel, then pack
+#
+# Imported trees often hold several families that share no marriage. Each connected
+# component is laid out on its own and cached under its own key — editing one clan
+# leaves the other clans' layouts untouched. `dot` jobs run concurrently on the shared
+# Graphviz pool (familytree.gv_pool); the built-in layered engine uses a process pool.
+# The pieces are then shelf-packed into one canvas.
+
+import hashlib
+import multiprocessing
+import os
+import re
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from familytree.gv_pool import LayoutTimeout, PoolBusy, get_pool
+from familytree.layered import LayeredLayout, layered_layout, layered_svg
+from familytree.layout_reuse import LayoutStore, parse_positions, structure_key
+from familytree.render import Positions, render_graph
+from familytree.render_cache import render_svg
+
+PACK_GAP = 40             # px (layered) / pt (dot) between packed components
+POOL_MIN_PERSONS = 400    # below this, process start-up costs more than it saves
+MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+_STORE = LayoutStore(max_items=512)
+_POOL: Optional[ProcessPoolExecutor] = None
+_BB = re.compile(rb'"bb"\s*:\s*"([^"]*)"')
+_RENDER_EXEC = ThreadPoolExecutor(max_workers=4, thread_name_prefix="render")
+
+
+def split_components(tree: dict) -> List[Dict[str, Any]]:
+    """Connected components (spouse and parent/child links), largest first."""
+    persons = tree.get("persons", {})
+    marriages = tree.get("marriages", {})
+    parent = {pid: pid for pid in persons}
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    m_root: Dict[str, Optional[str]] = {}
+    for mid, m in marriages.items():
+        members = [x for x in list(m.get("spouses", [])) + list(m.get("children", [])) if x in parent]
+        for x in members[1:]:
+            ra, rb = find(members[0]), find(x)
+            if ra != rb:
+                parent[rb] = ra
+        m_root[mid] = members[0] if members else None
+
+    comps: Dict[str, Dict[str, Any]] = {}
+    for pid, p in persons.items():
+        comps.setdefault(find(pid), {"persons": {}, "marriages": {}})["persons"][pid] = p
+    for mid, m in marriages.items():
+        if m_root[mid] is not None:
+            comps[find(m_root[mid])]["marriages"][mid] = m
+    return sorted(comps.values(), key=lambda c: -len(c["persons"]))
+
+
+def component_key(sub: dict, engine: str, lean: bool = False, degraded: bool = False,
+                  ranked: bool = False) -> str:
+    if engine == "dot":
+        # dot coordinates survive restyles (drawn with neato -n), see layout_reuse
+        variant = "degraded" if degraded else ("lean" if lean else "classic")
+        return f"dot-{variant}{'-ranked' if ranked else ''}:" + structure_key(sub)
+    # the layered engine sizes boxes exactly, so labels are part of its key
+    h = hashlib.sha1(structure_key(sub).encode("utf-8"))
+    for pid, p in sub["persons"].items():
+        h.update(f"{pid}\0{p.get('name', '')}\0{p.get('note', '')}\0".encode("utf-8"))
+    return "layered:" + h.hexdigest()
+
+
+# ---------- per-component layout ----------
+
+def _parse_dot_layout(layout_json: bytes) -> Tuple[Positions, Tuple[float, float]]:
+    # the graph's own bb comes before "objects" (whose clusters carry theirs)
+    m = _BB.search(layout_json)
+    _, _, w, h = (float(v) for v in (m.group(1) if m else b"0,0,0,0").split(b","))
+    return parse_positions(layout_json), (w, h)
+
+
+def _pool() -> Optional[ProcessPoolExecutor]:
+    global _POOL
+    if _POOL is None and MAX_WORKERS > 1:
+        try:
+            # never fork the multi-threaded server process
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _POOL = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context(method))
+        except (OSError, NotImplementedError):
+            return None
+    return _POOL
+
+
+def _layout_dot_many(comps: List[dict], todo: List[int], results: List[Any], lean: bool,
+                     degraded: bool, timeout: Optional[float], owner: Optional[str],
+                     generations: Optional[Dict[str, int]] = None):
+    gv = get_pool()
+    futures = {}
+    try:
+        for i in todo:
+            src = render_graph(comps[i], lean=lean, degraded=degraded, generations=generations).source
+            futures[i] = gv.submit(src, fmt="json0", timeout=timeout, owner=owner)
+        for i, fut in futures.items():
+            try:
+                out = fut.result(timeout=(timeout or gv.timeout) + 2.0)
+            except TimeoutError:
+                raise LayoutTimeout("graphviz result did not arrive in time")
+            results[i] = _parse_dot_layout(out)
+    except BaseException:
+        # one clan failed or ran out of time: don't leave its siblings running
+        for fut in futures.values():
+            fut.cancel()
+        if owner is not None:
+            gv.cancel(owner)
+        raise
+
+
+def _layout_layered_many(comps: List[dict], todo: List[int], results: List[Any]):
+    pool = _pool() if len(todo) > 1 and sum(len(comps[i]["persons"]) for i in todo) >= POOL_MIN_PERSONS else None
+    if pool is not None:
+        try:
+            futures = {i: pool.submit(layered_layout, comps[i]) for i in todo}
+            for i, fut in futures.items():
+                results[i] = fut.result()
+            return
+        except BrokenProcessPool:
+            # a worker died: drop the pool (a new one starts next time) and finish inline
+            global _POOL
+            if _POOL is pool:
+                _POOL = None
+            pool.shutdown(wait=False, cancel_futures=True)
+    for i in todo:
+        if results[i] is None:
+            results[i] = layered_layout(comps[i])
+
+
+def layout_components(comps: List[dict], engine: str = "dot", lean: bool = False,
+                      degraded: bool = False, timeout: Optional[float] = None,
+                      owner: Optional[str] = None,
+                      generations: Optional[Dict[str, int]] = None) -> List[Any]:
+    """Layout for every component: cache hits first, misses in parallel.
+
+    `generations` (dot only) adds per-generation rank hints, see render_graph.
+    """
+    keys = [component_key(c, engine, lean, degraded, ranked=bool(generations)) for c in comps]
+    results: List[Any] = [_STORE.get(k) for k in keys]
+    todo = [i for i, r in enumerate(results) if r is None]
+    _STORE.restyles += len(comps) - len(todo)
+    _STORE.full_layouts += len(todo)
+
+    if engine == "dot":
+        _layout_dot_many(comps, todo, results, lean, degraded, timeout, owner, generations)
+    else:
+        _layout_layered_many(comps, todo, results)
+    for i in todo:
+        _STORE.put(keys[i], results[i])
+    return results
+
+
+def shelf_pack(sizes: List[Tuple[float, float]], gap: float = PACK_GAP) -> Tuple[List[Tuple[float, float]], float, float]:
+    """Top-left offsets for boxes (in the given order) on rows of roughly square canvas."""
+    if not sizes:
+        return [], 0.0, 0.0
+    area = sum((w + gap) * (h + gap) for w, h in sizes)
+    row_w = max(max(w for w, _ in sizes), area ** 0.5 * 1.5)
+    offsets = []
+    x = y = row_h = 0.0
+    width = 0.0
+    for w, h in sizes:
+        if x > 0 and x + w > row_w:
+            y += row_h + gap
+            x = row_h = 0.0
+        offsets.append((x, y))
+        x += w + gap
+        row_h = max(row_h, h)
+        width = max(width, x - gap)
+    return offsets, width, y + row_h
+
+
+def _merge_layered(layouts: List[LayeredLayout]) -> LayeredLayout:
+    offsets, width, height = shelf_pack([(l.width, l.height) for l in layouts])
+    out = LayeredLayout()
+    for (dx, dy), lay in zip(offsets, layouts):
+        for pid, (x, y, w, h) in lay.boxes.items():
+            out.boxes[pid] = (x + dx, y + dy, w, h)
+        for mid, (x, y) in lay.points.items():
+            out.points[mid] = (x + dx, y + dy)
+        out.ranks.update(lay.ranks)
+    out.width, out.height = width, height
+    return out
+
+
+def _merge_dot(layouts: List[Tuple[Positions, Tuple[float, float]]]) -> Positions:
+    offsets, _, height = shelf_pack([bb for _, bb in layouts])
+    merged: Positions = {}
+    for (dx, dy), (positions, (_, h)) in zip(offsets, layouts):
+        # Graphviz y grows upwards: top of this shelf slot is `height - dy`
+        oy = height - dy - h
+        for name, (x, y) in positions.items():
+            merged[name] = (x + dx, y + oy)
+    return merged
+
+
+def packed_layered_layout(tree: dict) -> LayeredLayout:
+    """Built-in layout of the whole tree from the per-clan cache (used by poster export)."""
+    return _merge_layered(layout_components(split_components(tree), "layered"))
+
+
+def render_components_svg(tree: dict, engine: str = "dot", lean: bool = False,
+                          degraded: bool = False, timeout: Optional[float] = None,
+                          owner: Optional[str] = None,
+                          generations: Optional[Dict[str, int]] = None) -> bytes:
+    """SVG of the whole tree with each clan laid out (and cached) independently."""
+    comps = split_components(tree)
+    layouts = layout_components(comps, engine, lean, degraded, timeout, owner, generations)
+    if engine == "layered":
+        return layered_svg(tree, _merge_layered(layouts))
+    g = render_graph(tree, positions=_merge_dot(layouts), lean=lean, degraded=degraded)
+    return render_svg(g.source, engine="neato", neato_no_op=1, timeout=timeout, owner=owner)
+
+
+def render_within_budget(tree: dict, lean: bool = False, timeout: Optional[float] = None,
+                         owner: Optional[str] = None,
+                         generations: Optional[Dict[str, int]] = None) -> Tuple[bytes, str]:
+    """Graphviz SVG, degrading when the time budget or the queue runs out.
+
+    Returns (svg, level) with level "full", "degraded" (capped dot iterations, no
+    clusters) or "layered" (built-in engine, no Graphviz). Any other Graphviz
+    failure (missing binary, a crashed or failing dot, unreadable output) also
+    ends at "layered". CancelledError propagates: it means this render was
+    superseded by a newer rerun of the same session.
+    """
+    try:
+        return render_components_svg(tree, "dot", lean=lean, timeout=timeout, owner=owner,
+                                     generations=generations), "full"
+    except CancelledError:
+        raise
+    except (LayoutTimeout, PoolBusy):
+        pass
+    except Exception:
+        return render_components_svg(tree, "layered"), "layered"
+    try:
+        return render_components_svg(tree, "dot", degraded=True, timeout=timeout, owner=owner,
+                                     generations=generations), "degraded"
+    except CancelledError:
+        raise
+    except Exception:
+        return render_components_svg(tree, "layered"), "layered"
+
+def request_render(tree: dict, lean: bool = False, timeout: Optional[float] = None,
+                   owner: Optional[str] = None,
+                   generations: Optional[Dict[str, int]] = None) -> Future:
+    """render_within_budget() off the caller's thread; the Future yields (svg, level).
+
+    The tree is copied here, so edits made while it is laid out don't race the
+    layout. Cancel a superseded render with get_pool().cancel(owner).
+    """
+    snap = {"persons": {pid: dict(p) for pid, p in tree.get("persons", {}).items()},
+            "marriages": {mid: {k: list(v) if isinstance(v, list) else v for k, v in m.items()}
+                          for mid, m in tree.get("marriages", {}).items()}}
+    gens = dict(generations) if generations is not None else None
+    return _RENDER_EXEC.submit(render_within_budget, snap, lean, timeout, owner, gens)
@@ -0,0 +1,285 @@
+# familytree/dedupe.py — duplicate-person detection and merging
+#
+# Repeated imports and manual entry leave the same person in the tree twice
+# ("王大明" and "王 大明", or "张大明" from a simplified-Chinese file). Comparing every
+# pair is quadratic, so candidates are first grouped into blocks that duplicates
+# almost always share:
+#   name      the folded name (NFKC, no whitespace/punctuation, simplified -> traditional)
+#   spouse    the same spouse record, or a spouse with the same folded name + own surname
+#   parents   the same parent marriage (a child entered twice)
+# and only pairs inside a block are scored. Blocks are capped at MAX_BLOCK; an
+# oversized name block (a very common name) is re-blocked by relatives' names, so
+# the total work stays near-linear in the number of persons.
+#
+# merge_persons() folds one record into another using FamilyGraph's mutators, so a
+# merge is journaled (one undo step) and seen by every listener like any edit.
+
+import unicodedata
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from familytree.graph import FamilyGraph
+from familytree.validate import Issue, ValidationError, Validator
+
+try:  # full conversion tables when available; the built-in table covers common name characters
+    from opencc import OpenCC
+    _S2T = OpenCC("s2t").convert
+except Exception:
+    _S2T = None
+
+MAX_BLOCK = 50
+DEFAULT_THRESHOLD = 0.75
+
+# simplified (or variant) -> traditional, for characters common in names
+_PAIRS = """
+张張 刘劉 陈陳 杨楊 黄黃 赵趙 吴吳 孙孫 马馬 罗羅 郑鄭 谢謝 韩韓 冯馮 邓鄧 许許 萧蕭 叶葉 吕呂 苏蘇
+卢盧 蒋蔣 贾賈 钟鍾 陆陸 邹鄒 龙龍 万萬 钱錢 汤湯 乔喬 贺賀 赖賴 龚龔 庞龐 兰蘭 颜顏 严嚴 温溫 芦蘆
+鲁魯 韦韋 毕畢 聂聶 丛叢 骆駱 齐齊 阎閻 谭譚 顾顧 邝鄺 郦酈 闵閔 鲍鮑 华華 伟偉 丽麗 强強 杰傑 国國
+军軍 红紅 宝寶 凤鳳 庆慶 兴興 荣榮 贵貴 东東 云雲 艳艷 飞飛 鹏鵬 辉輝 刚剛 涛濤 鸿鴻 宁寧 静靜 莹瑩
+颖穎 岚嵐 锋鋒 铭銘 钧鈞 锦錦 银銀 进進 达達 远遠 连連 运運 顺順 义義 礼禮 爱愛 怀懷 忆憶 亿億 诚誠
+谊誼 让讓 谦謙 伦倫 长長 发發 丰豐 财財 贤賢 宾賓 贞貞 赛賽 赞贊 凯凱 岭嶺 岛島 汉漢 泽澤 洁潔 渊淵
+滨濱 灿燦 炜煒 烨燁 焕煥 玮瑋 环環 琼瓊 韵韻 颂頌 风風 飘飄 鹤鶴 鸣鳴 莲蓮 苹蘋 蕴蘊 乐樂 欢歡 绿綠
+纯純 绍紹 继繼 维維 纬緯 绮綺 缘緣 绪緒 纲綱 经經 丝絲 启啟 师師 帅帥 历歷 宪憲 实實 宽寬 养養 卫衛
+学學 觉覺 亲親 为為 会會 传傳 侠俠 俭儉 优優 创創 劲勁 勋勳 动動 单單 号號 员員 尧堯 坚堅 场場 坛壇
+声聲 处處 备備 复復 头頭 奋奮 妇婦 妈媽 娅婭 娴嫻 婵嬋 将將 尔爾 岁歲 峡峽 广廣 庄莊 应應 开開 异異
+弥彌 归歸 当當 录錄 彦彥 态態 怜憐 恒恆 恋戀 悦悅 愿願 战戰 扬揚 护護 报報 拥擁 择擇 挥揮 数數 斋齋
+无無 时時 昙曇 显顯 晓曉 晖暉 晋晉 书書 术術 机機 权權 条條 来來 极極 枢樞 标標 栋棟 树樹 桥橋 梦夢
+楼樓 欧歐 气氣 汇匯 沪滬 浅淺 济濟 浏瀏 涌湧 润潤 涧澗 湾灣 满滿 潇瀟 澜瀾 灵靈 灯燈 点點 炼煉 热熱
+爷爺 狮獅 献獻 玛瑪 珑瓏 瑶瑤 电電 画畫 畅暢 盖蓋 盘盤 硕碩 确確 祯禎 禅禪 离離 种種 积積 称稱 稳穩
+竞競 笔筆 筑築 简簡 粮糧 纤纖 约約 级級 纪紀 纱紗 纳納 纶綸 纵縱 纸紙 线線 练練 组組 细細 织織 终終
+绅紳 绘繪 给給 统統 绢絹 绣繡 绥綏 绵綿 综綜 绽綻 缅緬 缤繽 翘翹 聪聰 肃肅 胜勝 舰艦 艺藝 节節 苍蒼
+荐薦 药藥 莺鶯 获獲 萤螢 营營 蓝藍 蔼藹 袭襲 见見 观觀 规規 视視 览覽 誉譽 计計 认認 训訓 议議 记記
+讲講 论論 设設 访訪 证證 评評 识識 诗詩 话話 询詢 详詳 语語 说說 读讀 谈談 谋謀 谨謹 谱譜 贝貝 贡貢
+责責 资資 赋賦 赏賞 赐賜 赠贈 赢贏 跃躍 车車 轩軒 轮輪 轻輕 载載 辽遼 边邊 过過 还還 这這 选選 逊遜
+邻鄰 释釋 钊釗 钏釧 钜鉅 钰鈺 钢鋼 铃鈴 铸鑄 锐銳 锡錫 键鍵 镇鎮 镜鏡 门門 闯闖 闲閒 闻聞 阁閣 阔闊
+队隊 阳陽 阴陰 阵陣 阶階 际際 陕陝 随隨 隐隱 难難 雾霧 霁霽 页頁 顶頂 项項 须須 领領 颐頤 频頻 题題
+饶饒 馆館 驰馳 驹駒 骏駿 骐騏 骥驥 鱼魚 鲜鮮 鸟鳥 鹰鷹 麦麥 龄齡 峯峰 裏裡 着著 綫線 姉姊 妳你
+"""
+_FOLD = {ord(p[0]): p[1] for p in _PAIRS.split()}
+
+_DROP_CATEGORIES = {"Zs", "Zl", "Zp", "Cc", "Cf", "Pc", "Pd", "Po"}   # spaces, controls, ·．-_ etc.
+
+
+def fold_name(name: str) -> str:
+    """Comparison key for a name: width/compat forms unified, separators removed, traditional script."""
+    s = unicodedata.normalize("NFKC", name or "")
+    s = "".join(ch for ch in s if unicodedata.category(ch) not in _DROP_CATEGORIES)
+    if _S2T is not None:
+        s = _S2T(s)
+    return s.translate(_FOLD).casefold()
+
+
+class Candidate(NamedTuple):
+    a: str
+    b: str
+    score: float
+    reasons: Tuple[str, ...]
+
+
+# ----------------------------- features -----------------------------
+
+class _Profile:
+    __slots__ = ("name", "gender", "deceased", "spouses", "parents", "rel_names")
+
+    def __init__(self, name: str, gender: str, deceased: bool, spouses: FrozenSet[str],
+                 parents: FrozenSet[str], rel_names: FrozenSet[str]):
+        self.name = name
+        self.gender = gender
+        self.deceased = deceased
+        self.spouses = spouses
+        self.parents = parents
+        self.rel_names = rel_names
+
+
+def _profiles(g: FamilyGraph) -> Dict[str, _Profile]:
+    folded = {pid: fold_name(p.get("name", "")) for pid, p in g.persons.items()}
+    out = {}
+    for pid, p in g.persons.items():
+        spouses, children, parents = set(), set(), set()
+        for mid in g.marriages_of(pid):
+            m = g.marriages[mid]
+            spouses.update(s for s in m.get("spouses", []) if s != pid)
+            children.update(m.get("children", []))
+        pms = g.parent_marriages_of(pid)
+        for mid in pms:
+            parents.update(g.marriages[mid].get("spouses", []))
+        rel = {"配" + folded[x] for x in spouses if x in folded}
+        rel.update("親" + folded[x] for x in parents if x in folded)
+        rel.update("子" + folded[x] for x in children if x in folded)
+        out[pid] = _Profile(folded[pid], (p.get("gender") or "").strip(), bool(p.get("deceased")),
+                            frozenset(spouses), frozenset(pms), frozenset(rel))
+    return out
+
+
+def _blocks(g: FamilyGraph, prof: Dict[str, _Profile]) -> Iterable[List[str]]:
+    by_name: Dict[str, List[str]] = {}
+    by_rel: Dict[Tuple[str, str], List[str]] = {}
+    for pid, pr in prof.items():
+        by_name.setdefault(pr.name, []).append(pid)
+        surname = pr.name[:1]
+        for token in pr.rel_names:
+            if token[0] != "子":
+                by_rel.setdefault((token, surname), []).append(pid)
+    for pids in by_name.values():
+        if len(pids) <= MAX_BLOCK:
+            yield pids
+            continue
+        # very common name: only compare people who also share a relative's name
+        sub: Dict[str, List[str]] = {}
+        for pid in pids:
+            for token in prof[pid].rel_names:
+                sub.setdefault(token, []).append(pid)
+        for s in sub.values():
+            if len(s) <= MAX_BLOCK:
+                yield s
+    for pids in by_rel.values():
+        if len(pids) <= MAX_BLOCK:
+            yield pids
+    for pid in g.persons:   # everyone married to the same record
+        sp = g.spouses_of(pid)
+        if 1 < len(sp) <= MAX_BLOCK:
+            yield sp
+    for m in g.marriages.values():   # the same child entered twice
+        kids = m.get("children", [])
+        if 1 < len(kids) <= MAX_BLOCK:
+            yield kids
+
+
+def _score(a: _Profile, b: _Profile, pb: str) -> Optional[Tuple[float, Tuple[str, ...]]]:
+    if a.gender and b.gender and a.gender != b.gender:
+        return None
+    if pb in a.spouses:
+        return None
+    reasons = []
+    if a.name == b.name:
+        name = 1.0
+        reasons.append("姓名相同")
+    else:
+        name = SequenceMatcher(None, a.name, b.name).ratio()
+        if a.name[:1] != b.name[:1]:
+            name *= 0.5
+        if name < 0.5:
+            return None
+        reasons.append(f"姓名相近 {name:.0%}")
+
+    # the same spouse / parent record is strong evidence only for the same name:
+    # two wives of one man, or siblings sharing a generation character, look alike too
+    rel = None
+    if a.parents & b.parents:
+        if a.name != b.name:
+            return None
+        rel = 1.0
+        reasons.append("同一對父母")
+    elif a.spouses & b.spouses:
+        rel = 1.0 if a.name == b.name else 0.5
+        reasons.append("同一位配偶")
+    elif a.rel_names and b.rel_names:
+        shared = len(a.rel_names & b.rel_names)
+        rel = shared / min(len(a.rel_names), len(b.rel_names))
+        if shared:
+            reasons.append(f"共同親屬 {shared} 位")
+
+    score = name * 0.85 if rel is None else 0.6 * name + 0.4 * rel
+    if a.deceased != b.deceased:
+        score -= 0.1
+        reasons.append("生歿狀態不同")
+    return score, tuple(reasons)
+
+
+def find_duplicates(g: FamilyGraph, threshold: float = DEFAULT_THRESHOLD,
+                    limit: Optional[int] = None) -> List[Candidate]:
+    """Likely duplicate pairs, best first. Near-linear: only pairs sharing a block are scored."""
+    prof = _profiles(g)
+    seen: Set[Tuple[str, str]] = set()
+    out: List[Candidate] = []
+    for block in _blocks(g, prof):
+        for x, y in combinations(block, 2):
+            if x == y:
+                continue
+            key = (x, y) if x < y else (y, x)
+            if key in seen:
+                continue
+            seen.add(key)
+            r = _score(prof[key[0]], prof[key[1]], key[1])
+            if r is not None and r[0] >= threshold:
+                out.append(Candidate(key[0], key[1], round(r[0], 3), r[1]))
+    out.sort(key=lambda c: (-c.score, c.a, c.b))
+    return out[:limit] if limit is not None else out
+
+
+# ----------------------------- merge -----------------------------
+
+def check_merge(g: FamilyGraph, keep: str, drop: str, validator=None) -> List[Issue]:
+    """Reasons `drop` cannot be folded into `keep` (empty list = OK)."""
+    if keep not in g.persons or drop not in g.persons:
+        return [Issue("missing_person", "成員不存在", pids=(keep, drop))]
+    if keep == drop:
+        return [Issue("bad_merge", "請選擇兩位不同的成員", pids=(keep,))]
+    if drop in g.spouses_of(keep):
+        return [Issue("bad_merge", "兩位成員互為配偶，不能合併", pids=(keep, drop))]
+    v = validator or Validator(g)
+    # after the merge keep/drop and their spouses form one spouse group (plus drop's
+    # parents above it when keep has none); it must not descend from itself
+    group = v.spouse_group([keep, drop])
+    kids = {c for s in group for mid in g.marriages_of(s) for c in g.marriages[mid].get("children", [])}
+    above = set()
+    if not g.parent_marriages_of(keep):
+        above = v.spouse_group(s for mid in g.parent_marriages_of(drop) for s in g.marriages[mid].get("spouses", []))
+    if any(v.reaches_down(c, group | above) for c in kids) or (above and any(v.reaches_down(x, above) for x in group)):
+        return [Issue("cycle", "兩位成員為直系親屬，合併後會成為自己的祖先", pids=(keep, drop))]
+    return []
+
+
+def merge_persons(g: FamilyGraph, keep: str, drop: str, validator=None) -> List[str]:
+    """Fold `drop` into `keep` and delete `drop`; returns notes on anything left out.
+
+    - `keep`'s empty fields are filled from `drop`; deceased if either says so.
+    - Each marriage of `drop` is moved to `keep`; if `keep` is already married to
+      that spouse, the children move over and the empty record is deleted.
+    - `drop`'s parents become `keep`'s when `keep` has none; differing parents are
+      reported and `keep`'s are kept.
+    Raises ValidationError when the two are spouses or in a direct line.
+    """
+    issues = check_merge(g, keep, drop, validator)
+    if issues:
+        raise ValidationError(issues)
+    notes: List[str] = []
+    pk, pd = g.persons[keep], g.persons[drop]
+    fields = {k: pd[k] for k in ("gender", "note") if not pk.get(k) and pd.get(k)}
+    if pd.get("deceased") and not pk.get("deceased"):
+        fields["deceased"] = True
+    for k, v in pd.items():   # extra fields from newer imports
+        if k not in pk and k not in fields:
+            fields[k] = v
+    g.update_person(keep, **fields)
+
+    for mid in g.marriages_of(drop):
+        m = g.marriages[mid]
+        other = next((s for s in m.get("spouses", []) if s != drop), None)
+        target = g.find_marriage(keep, other) if other is not None else None
+        if target is None:
+            g.replace_spouse(mid, drop, keep)
+            continue
+        kids = g.children_of(mid)
+        g.remove_children(mid, kids)
+        for c in kids:
+            g.add_child(target, c)
+        if m.get("divorced") and not g.marriages[target].get("divorced"):
+            notes.append(f"婚姻 {mid} 標示為離婚，合併後沿用 {target} 的狀態")
+        g.delete_marriage(mid)
+
+    keep_parents = g.parent_marriages_of(keep)
+    for mid in g.parent_marriages_of(drop):
+        kids = g.children_of(mid)
+        if not keep_parents:
+            # keep takes drop's place in the sibling order
+            tail = kids[kids.index(drop) + 1:]
+            g.remove_children(mid, [drop, *tail])
+            for c in [keep, *tail]:
+                g.add_child(mid, c)
+            keep_parents = [mid]
+        elif mid not in keep_parents:
+            notes.append(f"父母紀錄不同（{keep_parents[0]}／{mid}），保留 {g.persons[keep].get('name', keep)} 原有的父母")
+    g.delete_person(drop)
+    return notes
@@ -0,0 +1,344 @@
+# familytree/diff.py — diff and three-way merge of `{"persons", "marriages"}` trees
+#
+# Two advisors editing copies of family_tree.json no longer have to overwrite each
+# other. Entities are compared by a fingerprint (hash of their canonical items), so
+# unchanged ones cost one hash each and only changed ones are compared field by
+# field. Entities are matched by id; ids present on one side only are then matched
+# by content (same fingerprint), and marriages additionally by their spouse pair,
+# so a person re-created with a fresh id still lines up with the original.
+#
+# merge3(base, ours, theirs) applies both change sets to base. Non-overlapping
+# edits combine (child lists merge by added/removed members); overlapping ones are
+# reported as Conflicts and resolved in favour of `ours`; nothing is deleted that
+# the other side still edits, and references to deleted persons are dropped.
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from familytree.validate import errors, validate_tree
+
+Tree = Dict[str, Dict[str, Any]]
+Fields = Dict[str, Tuple[Any, Any]]
+
+_MISSING = object()
+
+
+def _freeze(v):
+    if isinstance(v, list):
+        return tuple(_freeze(x) for x in v)
+    if isinstance(v, dict):
+        return tuple(sorted((k, _freeze(x)) for k, x in v.items()))
+    return v
+
+
+def fingerprint(entity: Dict[str, Any]) -> int:
+    """Hash of an entity's content (stable within a process)."""
+    return hash(tuple([(k, _freeze(v)) if type(v) in (list, dict) else (k, v)
+                       for k, v in sorted(entity.items())]))
+
+
+Fingerprints = Tuple[Dict[str, int], Dict[str, int]]
+
+
+def fingerprints(tree: Tree) -> Fingerprints:
+    """(person fingerprints, marriage fingerprints); pass to diff() to reuse for a base tree."""
+    return ({k: fingerprint(v) for k, v in tree.get("persons", {}).items()},
+            {k: fingerprint(v) for k, v in tree.get("marriages", {}).items()})
+
+
+def _fields(a: Dict[str, Any], b: Dict[str, Any]) -> Fields:
+    out = {}
+    for k in a.keys() | b.keys():
+        va, vb = a.get(k, _MISSING), b.get(k, _MISSING)
+        if va != vb:
+            out[k] = (None if va is _MISSING else va, None if vb is _MISSING else vb)
+    return out
+
+
+def child_edit(old: List[str], new: List[str]) -> Dict[str, Any]:
+    """Child-list change as members added / removed (+ whether the kept ones were reordered)."""
+    so, sn = set(old), set(new)
+    kept_old = [c for c in old if c in sn]
+    kept_new = [c for c in new if c in so]
+    return {"add": [c for c in new if c not in so], "remove": [c for c in old if c not in sn],
+            "reorder": kept_old != kept_new}
+
+
+class Diff:
+    """Changes that turn tree `a` into tree `b` (ids of `b` already mapped onto `a`)."""
+
+    __slots__ = ("p_added", "p_removed", "p_modified", "m_added", "m_removed", "m_modified",
+                 "p_map", "m_map")
+
+    def __init__(self):
+        self.p_added: Dict[str, Dict[str, Any]] = {}
+        self.p_removed: Dict[str, Dict[str, Any]] = {}
+        self.p_modified: Dict[str, Fields] = {}
+        self.m_added: Dict[str, Dict[str, Any]] = {}
+        self.m_removed: Dict[str, Dict[str, Any]] = {}
+        self.m_modified: Dict[str, Fields] = {}   # "children" holds a child_edit() dict
+        self.p_map: Dict[str, str] = {}           # b person id -> a person id (content match)
+        self.m_map: Dict[str, str] = {}           # b marriage id -> a marriage id
+
+    def __bool__(self) -> bool:
+        return any((self.p_added, self.p_removed, self.p_modified,
+                    self.m_added, self.m_removed, self.m_modified))
+
+    def summary(self) -> Dict[str, int]:
+        return {"persons_added": len(self.p_added), "persons_removed": len(self.p_removed),
+                "persons_modified": len(self.p_modified), "marriages_added": len(self.m_added),
+                "marriages_removed": len(self.m_removed), "marriages_modified": len(self.m_modified),
+                "ids_rematched": len(self.p_map) + len(self.m_map)}
+
+    def rows(self, names: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """Flat change list for display; `names` = persons dict used to label ids."""
+        names = names or {}
+        label = lambda pid: f"{names.get(pid, {}).get('name', pid)}（{pid}）"
+        rows = []
+        for pid, p in self.p_added.items():
+            rows.append({"類型": "新增成員", "對象": f"{p.get('name', pid)}（{pid}）", "內容": ""})
+        for pid, p in self.p_removed.items():
+            rows.append({"類型": "刪除成員", "對象": f"{p.get('name', pid)}（{pid}）", "內容": ""})
+        for pid, f in self.p_modified.items():
+            rows.append({"類型": "修改成員", "對象": label(pid),
+                         "內容": "；".join(f"{k}: {o!r} → {n!r}" for k, (o, n) in f.items())})
+        for mid in self.m_added:
+            rows.append({"類型": "新增婚姻", "對象": mid, "內容": ""})
+        for mid in self.m_removed:
+            rows.append({"類型": "刪除婚姻", "對象": mid, "內容": ""})
+        for mid, f in self.m_modified.items():
+            parts = []
+            for k, v in f.items():
+                if k == "children":
+                    parts += [f"加入子女 {label(c)}" for c in v["add"]]
+                    parts += [f"移除子女 {label(c)}" for c in v["remove"]]
+                    if v["reorder"]:
+                        parts.append("子女順序調整")
+                else:
+                    parts.append(f"{k}: {v[0]!r} → {v[1]!r}")
+            rows.append({"類型": "修改婚姻", "對象": mid, "內容": "；".join(parts)})
+        return rows
+
+
+def _match_by_content(only_a: List[str], only_b: List[str], fa: Dict[str, int],
+                      fb: Dict[str, int]) -> Dict[str, str]:
+    # only unambiguous matches: two identical "王明" records could be anyone
+    pool: Dict[int, List[str]] = {}
+    for k in only_a:
+        pool.setdefault(fa[k], []).append(k)
+    cands: Dict[int, List[str]] = {}
+    for k in only_b:
+        if len(pool.get(fb[k], ())) == 1:
+            cands.setdefault(fb[k], []).append(k)
+    return {ks[0]: pool[f][0] for f, ks in cands.items() if len(ks) == 1}
+
+
+def _remap_marriage(m: Dict[str, Any], pmap: Dict[str, str]) -> Dict[str, Any]:
+    mm = dict(m)
+    for k in ("spouses", "order", "children"):
+        if k in mm:
+            mm[k] = [pmap.get(x, x) for x in mm[k]]
+    return mm
+
+
+def _pair(m: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    sp = m.get("spouses") or []
+    return tuple(sorted(sp)) if sp else None
+
+
+def diff(a: Tree, b: Tree, fp_a: Optional[Fingerprints] = None) -> Diff:
+    """Minimal change set from `a` to `b` (`fp_a` = fingerprints(a), if already known)."""
+    d = Diff()
+    pa, pb = a.get("persons", {}), b.get("persons", {})
+    fa, ga = fp_a or fingerprints(a)
+    fb = {k: fingerprint(v) for k, v in pb.items()}
+    only_a = [k for k in pa if k not in pb]
+    only_b = [k for k in pb if k not in pa]
+    d.p_map = _match_by_content(only_a, only_b, fa, fb)
+    matched_a = set(d.p_map.values())
+    for k in pa.keys() & pb.keys():
+        if fa[k] != fb[k]:
+            d.p_modified[k] = _fields(pa[k], pb[k])
+    d.p_removed = {k: pa[k] for k in only_a if k not in matched_a}
+    d.p_added = {k: pb[k] for k in only_b if k not in d.p_map}
+
+    ma = a.get("marriages", {})
+    mb = b.get("marriages", {})
+    if d.p_map:
+        mb = {k: _remap_marriage(m, d.p_map) for k, m in mb.items()}
+    gb = {k: fingerprint(v) for k, v in mb.items()}
+    only_a = [k for k in ma if k not in mb]
+    only_b = [k for k in mb if k not in ma]
+    d.m_map = _match_by_content(only_a, only_b, ga, gb)
+    # then by spouse pair: the same couple re-created with a new id and some edits
+    taken = set(d.m_map.values())
+    left_a = {_pair(ma[k]): k for k in only_a if k not in taken and _pair(ma[k])}
+    for k in only_b:
+        if k not in d.m_map:
+            hit = left_a.pop(_pair(mb[k]), None)
+            if hit is not None:
+                d.m_map[k] = hit
+    for kb, ka in d.m_map.items():
+        if ga[ka] != gb[kb]:
+            d.m_modified[ka] = _marriage_fields(ma[ka], mb[kb])
+    for k in ma.keys() & mb.keys():
+        if ga[k] != gb[k]:
+            d.m_modified[k] = _marriage_fields(ma[k], mb[k])
+    matched_a = set(d.m_map.values())
+    d.m_removed = {k: ma[k] for k in only_a if k not in matched_a}
+    d.m_added = {k: mb[k] for k in only_b if k not in d.m_map}
+    return d
+
+
+def _marriage_fields(a: Dict[str, Any], b: Dict[str, Any]) -> Fields:
+    f = _fields({k: v for k, v in a.items() if k != "children"},
+                {k: v for k, v in b.items() if k != "children"})
+    ca, cb = a.get("children", []), b.get("children", [])
+    if ca != cb:
+        f["children"] = child_edit(ca, cb)
+    return f
+
+
+# ----------------------------- three-way merge -----------------------------
+
+class Conflict(NamedTuple):
+    kind: str              # "field" | "modify/delete" | "add/add" | "dangling" | "invalid"
+    entity: str            # "p" | "m" | ""
+    key: str
+    field: str = ""
+    ours: Any = None
+    theirs: Any = None
+    message: str = ""
+
+
+def _remap_tree(t: Tree, pmap: Dict[str, str], mmap: Dict[str, str]) -> Tree:
+    persons = {pmap.get(k, k): v for k, v in t.get("persons", {}).items()}
+    marriages = {mmap.get(k, k): _remap_marriage(m, pmap) for k, m in t.get("marriages", {}).items()}
+    return {"persons": persons, "marriages": marriages}
+
+
+def _theirs_onto_ours(base: Tree, theirs: Tree, d_ours: Diff, fp_base: Fingerprints) -> Tuple[Tree, Diff]:
+    """Theirs with ids rewritten so entities it shares with base or with ours' additions
+    use one id, and its diff from base."""
+    d0 = diff(base, theirs, fp_base)
+    # persons both sides added stay separate (dedupe can join them); a couple both
+    # sides married is one marriage
+    pmap = dict(d0.p_map)
+    mmap = dict(d0.m_map)
+    pairs = {_pair(m): k for k, m in d_ours.m_added.items() if _pair(m)}
+    for k, m in d0.m_added.items():
+        hit = pairs.get(_pair(m))
+        if hit is not None and hit != k:
+            mmap[k] = hit
+    if not pmap and not mmap:
+        return theirs, d0
+    theirs = _remap_tree(theirs, pmap, mmap)
+    return theirs, diff(base, theirs, fp_base)
+
+
+def _merge_fields(kind: str, key: str, target: Dict[str, Any], fo: Fields, ft: Fields,
+                  conflicts: List[Conflict], label: str):
+    for f, change in list(fo.items()) + [(f, v) for f, v in ft.items() if f not in fo]:
+        if f == "children":
+            continue
+        new = change[1]
+        if new is None:
+            target.pop(f, None)
+        else:
+            target[f] = new
+    for f, change in ft.items():
+        new = change[1] if f != "children" else None
+        if f != "children" and f in fo and fo[f][1] != new:
+            conflicts.append(Conflict("field", kind, key, f, fo[f][1], new,
+                                      f"{label} 的「{f}」兩邊改法不同，採用我方：{fo[f][1]!r}（對方：{new!r}）"))
+
+
+def _merge_children(base: List[str], ours: List[str], theirs: List[str], eo: Optional[Dict[str, Any]],
+                    et: Optional[Dict[str, Any]]) -> List[str]:
+    if not et:
+        return list(ours) if eo else list(base)
+    if not eo:
+        return list(theirs)
+    drop = set(et["remove"])
+    out = [c for c in ours if c not in drop]
+    have = set(out)
+    return out + [c for c in et["add"] if c not in have]
+
+
+def merge3(base: Tree, ours: Tree, theirs: Tree) -> Tuple[Tree, List[Conflict]]:
+    """Merged tree (fresh dicts, base's ids) and the conflicts met on the way (resolved toward `ours`)."""
+    fp_base = fingerprints(base)
+    d_o = diff(base, ours, fp_base)
+    if d_o.p_map or d_o.m_map:
+        ours = _remap_tree(ours, d_o.p_map, d_o.m_map)
+        d_o = diff(base, ours, fp_base)
+    theirs, d_t = _theirs_onto_ours(base, theirs, d_o, fp_base)
+    conflicts: List[Conflict] = []
+    bp, bm = base.get("persons", {}), base.get("marriages", {})
+    op, om = ours.get("persons", {}), ours.get("marriages", {})
+    tp, tm = theirs.get("persons", {}), theirs.get("marriages", {})
+    name = lambda pid: (op.get(pid) or bp.get(pid) or tp.get(pid) or {}).get("name", pid)
+
+    persons = {k: dict(v) for k, v in bp.items()}
+    for pid in d_o.p_modified.keys() | d_t.p_modified.keys():
+        _merge_fields("p", pid, persons[pid], d_o.p_modified.get(pid, {}), d_t.p_modified.get(pid, {}),
+                      conflicts, f"成員 {name(pid)}")
+    for mine, other, who in ((d_o, d_t, "我方"), (d_t, d_o, "對方")):
+        for pid in mine.p_removed:
+            if pid in other.p_modified:
+                conflicts.append(Conflict("modify/delete", "p", pid,
+                                          message=f"{who}刪除了 {name(pid)}，另一方修改了此成員；已保留"))
+            else:
+                persons.pop(pid, None)
+    for pid, p in d_o.p_added.items():
+        persons[pid] = dict(p)
+    for pid, p in d_t.p_added.items():
+        if pid in persons:
+            if fingerprint(persons[pid]) != fingerprint(p):
+                conflicts.append(Conflict("add/add", "p", pid, "", persons[pid], p,
+                                          f"兩邊都新增了 id {pid} 但內容不同，採用我方"))
+            continue
+        persons[pid] = dict(p)
+
+    marriages = {k: {kk: list(vv) if isinstance(vv, list) else vv for kk, vv in v.items()} for k, v in bm.items()}
+    for mid in d_o.m_modified.keys() | d_t.m_modified.keys():
+        fo, ft = d_o.m_modified.get(mid, {}), d_t.m_modified.get(mid, {})
+        _merge_fields("m", mid, marriages[mid], fo, ft, conflicts, f"婚姻 {mid}")
+        if "children" in fo or "children" in ft:
+            marriages[mid]["children"] = _merge_children(
+                bm[mid].get("children", []), om.get(mid, {}).get("children", []),
+                tm.get(mid, {}).get("children", []), fo.get("children"), ft.get("children"))
+    for mine, other, who in ((d_o, d_t, "我方"), (d_t, d_o, "對方")):
+        for mid in mine.m_removed:
+            if mid in other.m_modified:
+                conflicts.append(Conflict("modify/delete", "m", mid,
+                                          message=f"{who}刪除了婚姻 {mid}，另一方修改了它；已保留"))
+            else:
+                marriages.pop(mid, None)
+    for mid, m in d_o.m_added.items():
+        marriages[mid] = dict(m)
+    for mid, m in d_t.m_added.items():
+        if mid in marriages:
+            if fingerprint(marriages[mid]) != fingerprint(m):
+                conflicts.append(Conflict("add/add", "m", mid, "", marriages[mid], m,
+                                          f"兩邊都新增了婚姻 {mid} 但內容不同，採用我方"))
+            continue
+        marriages[mid] = dict(m)
+
+    # references to persons deleted on one side but still used by the other
+    for mid in list(marriages):
+        m = marriages[mid]
+        for k in ("spouses", "order", "children"):
+            vals = m.get(k, [])
+            gone = [x for x in vals if x not in persons]
+            if gone:
+                m[k] = [x for x in vals if x in persons]
+                if k != "order":
+                    conflicts.append(Conflict("dangling", "m", mid, k, message=(
+                        f"婚姻 {mid} 參照的成員 {'、'.join(name(x) for x in gone)} 已被刪除，已移除該參照")))
+        if not m.get("spouses") and not m.get("children"):
+            del marriages[mid]
+
+    merged = {"persons": persons, "marriages": marriages}
+    for issue in errors(validate_tree(merged)):
+        conflicts.append(Conflict("invalid", "", ",".join(issue.pids + issue.mids), message=issue.message))
+    return merged, conflicts
@@ -0,0 +1,140 @@
+# familytree/generations.py — generation numbers, kept current as the tree is edited
+#
+# Generations follow the built-in layout's ranks (familytree.layered.assign_ranks):
+# spouses share a generation, children sit at least one below their parents, and
+# parents without parents of their own are pulled down to just above their children
+# (so in-laws' parents line up with the in-law's generation). Each clan is numbered
+# from 0 at its top.
+#
+# Edits only dirty the people they touch (via FamilyGraph.add_listener); the next
+# read re-ranks just the clans containing them, so editing one family branch of a
+# workspace with several clans leaves the others alone.
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from familytree.graph import FamilyGraph
+from familytree.layered import assign_ranks
+
+
+class Generations:
+    """pid -> generation (0 = top of the person's clan) over a live FamilyGraph."""
+
+    def __init__(self, graph: FamilyGraph):
+        self.g = graph
+        self._gen: Dict[str, int] = {}
+        self._dirty: Set[str] = set(graph.persons)
+        self._dirty_m: Set[str] = set()   # marriages touched: their members after the edit count too
+        self.reranked = 0   # persons re-ranked so far (for benchmarks)
+        graph.add_listener(self._on_touch)
+
+    def _on_touch(self, kind: str, key: str):
+        if kind == "p":
+            self._dirty.add(key)
+            return
+        # members before the edit (people it removes); a new marriage has none yet,
+        # so the members it ends up with are collected on the next read
+        self._dirty_m.add(key)
+        m = self.g.marriages.get(key)
+        if m is not None:
+            self._dirty.update(m.get("spouses", []))
+            self._dirty.update(m.get("children", []))
+
+    def _clan(self, seeds: Iterable[str]) -> Set[str]:
+        g = self.g
+        seen = set(seeds)
+        q = deque(seen)
+        while q:
+            pid = q.popleft()
+            for mid in g.marriages_of(pid) + g.parent_marriages_of(pid):
+                m = g.marriages[mid]
+                for x in m.get("spouses", []) + m.get("children", []):
+                    if x not in seen and x in g.persons:
+                        seen.add(x)
+                        q.append(x)
+        return seen
+
+    def _refresh(self):
+        g = self.g
+        if self._dirty_m:
+            touched, self._dirty_m = self._dirty_m, set()
+            for mid in touched:
+                m = g.marriages.get(mid)
+                if m is not None:
+                    self._dirty.update(m.get("spouses", []))
+                    self._dirty.update(m.get("children", []))
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        for pid in dirty:
+            if pid not in g.persons:
+                self._gen.pop(pid, None)
+        clan = self._clan(p for p in dirty if p in g.persons)
+        if not clan:
+            return
+        persons = {pid: g.persons[pid] for pid in clan}
+        marriages = {}
+        for pid in clan:
+            for mid in g.marriages_of(pid) + g.parent_marriages_of(pid):
+                marriages[mid] = g.marriages[mid]
+        pids, gop, rank, _ = assign_ranks(persons, marriages)
+        self._rank_clans(pids, gop, rank, marriages)
+        self.reranked += len(pids)
+
+    def _rank_clans(self, pids: List[str], gop, rank, marriages: Dict[str, Any]):
+        # assign_ranks normalises the whole batch; renormalise each clan to start at 0
+        parent = {p: p for p in pids}
+
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+
+        for m in marriages.values():
+            members = [x for x in m.get("spouses", []) + m.get("children", []) if x in parent]
+            for x in members[1:]:
+                ra, rb = find(members[0]), find(x)
+                if ra != rb:
+                    parent[rb] = ra
+        top: Dict[str, int] = {}
+        for i, p in enumerate(pids):
+            r = find(p)
+            top[r] = min(top.get(r, 1 << 30), int(rank[gop[i]]))
+        for i, p in enumerate(pids):
+            self._gen[p] = int(rank[gop[i]]) - top[find(p)]
+
+    # ---------- public ----------
+    def get(self, pid: str) -> Optional[int]:
+        self._refresh()
+        return self._gen.get(pid)
+
+    def mapping(self) -> Dict[str, int]:
+        """Current pid -> generation map (do not mutate)."""
+        self._refresh()
+        return self._gen
+
+    def span(self) -> Tuple[int, int]:
+        gens = self.mapping()
+        return (min(gens.values()), max(gens.values())) if gens else (0, 0)
+
+
+def generations_of(tree: dict) -> Dict[str, int]:
+    """One-off generation map for a plain tree dict (no incremental state)."""
+    return Generations(FamilyGraph.from_dict(tree)).mapping()
+
+
+def filter_generations(tree: dict, gens: Dict[str, int], lo: int, hi: int) -> Dict[str, Any]:
+    """Sub-tree with the persons of generations lo..hi (copies of the marriage dicts)."""
+    persons = {pid: p for pid, p in tree.get("persons", {}).items() if lo <= gens.get(pid, lo) <= hi}
+    marriages = {}
+    for mid, m in tree.get("marriages", {}).items():
+        spouses = [s for s in m.get("spouses", []) if s in persons]
+        if not spouses:
+            continue
+        mm = dict(m)
+        mm["spouses"] = spouses
+        mm["order"] = [s for s in (m.get("order") or m.get("spouses", [])) if s in persons]
+        mm["children"] = [c for c in m.get("children", []) if c in persons]
+        marriages[mid] = mm
+    return {"persons": persons, "marriages": marriages}
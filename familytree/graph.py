@@ -0,0 +1,440 @@
+# familytree/graph.py — indexed persons/marriages model for the family tree page
+#
+# `persons` / `marriages` keep exactly the JSON shape used by pages_familytree
+# (so export/import round-trips unchanged); everything else here is an index
+# over them, kept in sync by the mutators below.
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import uuid
+
+
+def _uid(prefix: str = "id") -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+
+
+class _Interner:
+    """str id <-> compact int id; freed slots are reused."""
+
+    __slots__ = ("ix", "keys", "_free")
+
+    def __init__(self):
+        self.ix: Dict[str, int] = {}
+        self.keys: List[Optional[str]] = []
+        self._free: List[int] = []
+
+    def intern(self, key: str) -> int:
+        i = self.ix.get(key)
+        if i is not None:
+            return i
+        if self._free:
+            i = self._free.pop()
+            self.keys[i] = key
+        else:
+            i = len(self.keys)
+            self.keys.append(key)
+        self.ix[key] = i
+        return i
+
+    def release(self, key: str) -> Optional[int]:
+        i = self.ix.pop(key, None)
+        if i is not None:
+            self.keys[i] = None
+            self._free.append(i)
+        return i
+
+
+class FamilyGraph:
+    """Persons/marriages with O(1) spouse-pair lookup and O(degree) deletes.
+
+    Indexes (all on interned ints):
+      _pair          sorted spouse pair      -> marriage
+      _spouse_in     person                  -> marriages where they are a spouse
+      _child_in      person                  -> marriages where they are a child
+      _kids          marriage                -> set of children (order lives in the dict)
+    """
+
+    def __init__(self):
+        self.persons: Dict[str, Dict[str, Any]] = {}
+        self.marriages: Dict[str, Dict[str, Any]] = {}
+        self._p = _Interner()
+        self._m = _Interner()
+        self._pair: Dict[Tuple[int, int], int] = {}
+        self._spouse_in: Dict[int, Set[int]] = {}
+        self._child_in: Dict[int, Set[int]] = {}
+        self._kids: Dict[int, Set[int]] = {}
+        # before-images of entities touched since begin_journal(), see familytree.history
+        self._journal: Optional[Dict[Tuple[str, str], Optional[Dict[str, Any]]]] = None
+        # called with (kind, key) just before an entity changes, see add_listener()
+        self._listeners: List[Callable[[str, str], None]] = []
+        # bumped on every change; derived views compare it to know they are current
+        self.version = 0
+
+    # ----------------------------- JSON shape -----------------------------
+
+    @property
+    def tree(self) -> Dict[str, Dict[str, Any]]:
+        """Live view in the legacy `{"persons", "marriages"}` shape (same dict objects)."""
+        return {"persons": self.persons, "marriages": self.marriages}
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return self.tree
+
+    @classmethod
+    def from_dict(cls, obj: Dict[str, Any]) -> "FamilyGraph":
+        g = cls()
+        for pid, p in (obj.get("persons") or {}).items():
+            g.load_person(pid, p)
+        for mid, m in (obj.get("marriages") or {}).items():
+            g.load_marriage(mid, m)
+        return g
+
+    # bulk loading (from_dict, familytree.importer): takes the dicts as they are,
+    # no listeners, no journal, no checks — validate the result afterwards
+    def load_person(self, pid: str, p: Dict[str, Any]):
+        pid = str(pid)
+        self.persons[pid] = p
+        self._p.intern(pid)
+
+    def load_marriage(self, mid: str, m: Dict[str, Any]):
+        mid = str(mid)
+        m.setdefault("spouses", [])
+        m.setdefault("children", [])
+        # backfill order for old data
+        if m.get("spouses") and "order" not in m:
+            m["order"] = list(m["spouses"])
+        self.marriages[mid] = m
+        self._index_marriage(mid, m)
+
+    def _index_marriage(self, mid: str, m: Dict[str, Any]):
+        mi = self._m.intern(mid)
+        sp = [self._p.intern(s) for s in m.get("spouses", [])]
+        for si in sp:
+            self._spouse_in.setdefault(si, set()).add(mi)
+        if len(sp) == 2:
+            self._pair.setdefault(tuple(sorted(sp)), mi)
+        kids = self._kids.setdefault(mi, set())
+        for c in m.get("children", []):
+            ci = self._p.intern(c)
+            kids.add(ci)
+            self._child_in.setdefault(ci, set()).add(mi)
+
+    # ----------------------------- Lookups -----------------------------
+
+    def __contains__(self, pid: str) -> bool:
+        return pid in self.persons
+
+    def __len__(self) -> int:
+        return len(self.persons)
+
+    def pid_index(self, pid: str) -> Optional[int]:
+        return self._p.ix.get(pid)
+
+    def pid_at(self, i: int) -> Optional[str]:
+        return self._p.keys[i] if 0 <= i < len(self._p.keys) else None
+
+    def mid_index(self, mid: str) -> Optional[int]:
+        return self._m.ix.get(mid)
+
+    def mid_at(self, i: int) -> Optional[str]:
+        return self._m.keys[i] if 0 <= i < len(self._m.keys) else None
+
+    def find_marriage(self, p1: str, p2: str) -> Optional[str]:
+        a, b = self._p.ix.get(p1), self._p.ix.get(p2)
+        if a is None or b is None:
+            return None
+        mi = self._pair.get((a, b) if a < b else (b, a))
+        return None if mi is None else self._m.keys[mi]
+
+    def marriages_of(self, pid: str) -> List[str]:
+        """Marriages where `pid` is a spouse."""
+        i = self._p.ix.get(pid)
+        return [self._m.keys[mi] for mi in self._spouse_in.get(i, ())] if i is not None else []
+
+    def parent_marriages_of(self, pid: str) -> List[str]:
+        """Marriages where `pid` is listed as a child."""
+        i = self._p.ix.get(pid)
+        return [self._m.keys[mi] for mi in self._child_in.get(i, ())] if i is not None else []
+
+    def parent_marriage_of(self, pid: str) -> Optional[str]:
+        mids = self.parent_marriages_of(pid)
+        return mids[0] if mids else None
+
+    def spouses_of(self, pid: str) -> List[str]:
+        out = []
+        for mid in self.marriages_of(pid):
+            out.extend(s for s in self.marriages[mid].get("spouses", []) if s != pid)
+        return out
+
+    def children_of(self, mid: str) -> List[str]:
+        m = self.marriages.get(mid)
+        return list(m.get("children", [])) if m else []
+
+    def has_child(self, mid: str, pid: str) -> bool:
+        mi, ci = self._m.ix.get(mid), self._p.ix.get(pid)
+        return mi is not None and ci is not None and ci in self._kids.get(mi, ())
+
+    def iter_child_edges(self) -> Iterator[Tuple[str, str]]:
+        """(marriage, child) pairs, in marriage insertion order."""
+        for mid, m in self.marriages.items():
+            for c in m.get("children", []):
+                yield mid, c
+
+    # ----------------------------- Journal -----------------------------
+
+    def begin_journal(self):
+        self._journal = {}
+
+    def end_journal(self) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """Before-images (None = did not exist) of every entity touched since begin_journal()."""
+        out, self._journal = self._journal or {}, None
+        return out
+
+    def image(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """Copy of one entity ("p" person / "m" marriage); lists copied, nothing deeper."""
+        src = (self.persons if kind == "p" else self.marriages).get(key)
+        if src is None:
+            return None
+        return {k: list(v) if isinstance(v, list) else v for k, v in src.items()}
+
+    def add_listener(self, fn: Callable[[str, str], None]):
+        """Register fn(kind, key), called before a person ("p") or marriage ("m") changes.
+
+        Derived indexes (generations, search, …) use it to invalidate only what an
+        edit touched.
+        """
+        self._listeners.append(fn)
+
+    def _touch(self, kind: str, key: str):
+        self.version += 1
+        for fn in self._listeners:
+            fn(kind, key)
+        j = self._journal
+        if j is not None and (kind, key) not in j:
+            j[(kind, key)] = self.image(kind, key)
+
+    def restore(self, images: Dict[Tuple[str, str], Optional[Dict[str, Any]]]):
+        """Put the given entities back to `images` and re-index them.
+
+        Entities keep their dict identity (and position) when they exist on both
+        sides. `images` must be a closed set — what a journal records — so no
+        untouched marriage references a person that disappears here.
+        """
+        for (kind, key), img in images.items():
+            self._touch(kind, key)
+        mids = [key for kind, key in images if kind == "m"]
+        kept: Dict[str, Dict[str, Any]] = {}
+        for mid in mids:
+            m = self.marriages.get(mid)
+            if m is None:
+                continue
+            self._unindex_marriage(mid, m)
+            if images[("m", mid)] is None:
+                del self.marriages[mid]
+                self._m.release(mid)
+            else:
+                kept[mid] = m
+        for (kind, pid), img in images.items():
+            if kind != "p":
+                continue
+            if img is None:
+                self.persons.pop(pid, None)
+                self._p.release(pid)
+            elif pid in self.persons:
+                self.persons[pid].clear()
+                self.persons[pid].update(img)
+            else:
+                self.persons[pid] = dict(img)
+                self._p.intern(pid)
+        for mid in mids:
+            img = images[("m", mid)]
+            if img is None:
+                continue
+            m = kept.get(mid)
+            if m is None:
+                m = self.marriages[mid] = {}
+            m.clear()
+            m.update({k: list(v) if isinstance(v, list) else v for k, v in img.items()})
+            self._index_marriage(mid, m)
+
+    def _unindex_marriage(self, mid: str, m: Dict[str, Any]):
+        mi = self._m.ix[mid]
+        sp = [self._p.ix[s] for s in m.get("spouses", []) if s in self._p.ix]
+        if len(sp) == 2:
+            key = tuple(sorted(sp))
+            if self._pair.get(key) == mi:
+                del self._pair[key]
+        for si in sp:
+            self._drop_from(self._spouse_in, si, mi)
+        for ci in self._kids.pop(mi, set()):
+            self._drop_from(self._child_in, ci, mi)
+
+    # ----------------------------- Mutators -----------------------------
+
+    def add_person(self, name: str, gender: str = "", note: str = "",
+                   deceased: bool = False, pid: Optional[str] = None) -> str:
+        pid = pid or _uid("p")
+        self._touch("p", pid)
+        self.persons[pid] = {
+            "name": (name or "").strip() or pid,
+            "gender": (gender or "").strip(),
+            "note": (note or "").strip(),
+            "deceased": bool(deceased),
+        }
+        self._p.intern(pid)
+        return pid
+
+    def update_person(self, pid: str, **fields) -> bool:
+        """Set plain person fields; returns True if anything changed."""
+        p = self.persons.get(pid)
+        if p is None:
+            return False
+        changed = False
+        for k, v in fields.items():
+            if p.get(k) != v:
+                self._touch("p", pid)
+                p[k] = v
+                changed = True
+        return changed
+
+    def update_marriage(self, mid: str, **fields) -> bool:
+        """Set plain marriage fields (not spouses / order / children); returns True if anything changed."""
+        m = self.marriages.get(mid)
+        if m is None:
+            return False
+        structural = set(fields) & {"spouses", "order", "children"}
+        if structural:
+            raise ValueError(f"use the marriage mutators for {sorted(structural)}")
+        changed = False
+        for k, v in fields.items():
+            if m.get(k) != v:
+                self._touch("m", mid)
+                m[k] = v
+                changed = True
+        return changed
+
+    def add_or_get_marriage(self, p1: str, p2: str, mid: Optional[str] = None) -> str:
+        a, b = sorted([p1, p2])
+        found = self.find_marriage(a, b)
+        if found is not None:
+            m = self.marriages[found]
+            if "order" not in m:
+                self._touch("m", found)
+                m["order"] = [a, b]
+            return found
+        mid = mid or _uid("m")
+        self._touch("m", mid)
+        m = {"spouses": [a, b], "order": [a, b], "children": [], "divorced": False}
+        self.marriages[mid] = m
+        self._index_marriage(mid, m)
+        return mid
+
+    def replace_spouse(self, mid: str, old: str, new: str) -> bool:
+        """Put `new` in `old`'s place in one marriage (children, order, flags kept).
+
+        Returns False (and changes nothing) if that would duplicate a spouse or an
+        existing spouse pair.
+        """
+        m = self.marriages.get(mid)
+        if not m or old not in m.get("spouses", []) or new in m.get("spouses", []):
+            return False
+        others = [s for s in m["spouses"] if s != old]
+        if others and self.find_marriage(others[0], new) is not None:
+            return False
+        self._touch("m", mid)
+        self._unindex_marriage(mid, m)
+        m["spouses"] = [new if s == old else s for s in m["spouses"]]
+        m["order"] = [new if s == old else s for s in (m.get("order") or m["spouses"])]
+        self._index_marriage(mid, m)
+        return True
+
+    def toggle_divorce(self, mid: str, value: bool):
+        m = self.marriages.get(mid)
+        if m and m.get("divorced", False) != bool(value):
+            self._touch("m", mid)
+            m["divorced"] = bool(value)
+
+    def add_child(self, mid: str, child_pid: str, index: Optional[int] = None):
+        """Append a child (or insert it at `index` of the children list)."""
+        m = self.marriages.get(mid)
+        if not m or self.has_child(mid, child_pid):
+            return
+        self._touch("m", mid)
+        mi, ci = self._m.intern(mid), self._p.intern(child_pid)
+        if index is None:
+            m["children"].append(child_pid)
+        else:
+            m["children"].insert(index, child_pid)
+        self._kids.setdefault(mi, set()).add(ci)
+        self._child_in.setdefault(ci, set()).add(mi)
+
+    def remove_children(self, mid: str, child_ids: Iterable[str]):
+        m = self.marriages.get(mid)
+        if not m:
+            return
+        drop = set(child_ids)
+        self._touch("m", mid)
+        m["children"] = [c for c in m.get("children", []) if c not in drop]
+        mi = self._m.ix[mid]
+        kids = self._kids.get(mi, set())
+        for c in drop:
+            ci = self._p.ix.get(c)
+            if ci is None or ci not in kids:
+                continue
+            kids.discard(ci)
+            self._drop_from(self._child_in, ci, mi)
+
+    def delete_person(self, pid: str):
+        """Remove a person and clean up marriages that reference them (O(degree))."""
+        if pid not in self.persons:
+            return
+        pi = self._p.ix.get(pid)
+        self._touch("p", pid)
+
+        for mi in list(self._spouse_in.get(pi, ())):
+            mid = self._m.keys[mi]
+            self._touch("m", mid)
+            m = self.marriages[mid]
+            sp = [self._p.ix[s] for s in m.get("spouses", []) if s in self._p.ix]
+            if len(sp) == 2:
+                key = tuple(sorted(sp))
+                if self._pair.get(key) == mi:
+                    del self._pair[key]
+            m["spouses"] = [x for x in m["spouses"] if x != pid]
+            m["order"] = [x for x in (m.get("order") or []) if x != pid]
+            if m["spouses"] and not m["order"]:
+                m["order"] = m["spouses"][:]
+            self._maybe_drop_marriage(mid)
+        self._spouse_in.pop(pi, None)
+
+        for mi in list(self._child_in.get(pi, ())):
+            mid = self._m.keys[mi]
+            self._touch("m", mid)
+            m = self.marriages[mid]
+            m["children"] = [x for x in m["children"] if x != pid]
+            self._kids.get(mi, set()).discard(pi)
+            self._maybe_drop_marriage(mid)
+        self._child_in.pop(pi, None)
+
+        self.persons.pop(pid, None)
+        self._p.release(pid)
+
+    def delete_marriage(self, mid: str):
+        if mid not in self.marriages:
+            return
+        self._touch("m", mid)
+        m = self.marriages.pop(mid)
+        self._unindex_marriage(mid, m)
+        self._m.release(mid)
+
+    def _maybe_drop_marriage(self, mid: str):
+        m = self.marriages.get(mid)
+        if m is not None and not m.get("spouses") and not m.get("children"):
+            self.delete_marriage(mid)
+
+    @staticmethod
+    def _drop_from(index: Dict[int, Set[int]], key: int, value: int):
+        s = index.get(key)
+        if s is not None:
+            s.discard(value)
+            if not s:
+                del index[key]
@@ -0,0 +1,184 @@
+# familytree/gv_pool.py — bounded, cancellable Graphviz execution shared by all sessions
+#
+# A fixed set of long-lived worker threads owns every Graphviz child process, so at
+# most `workers` layouts run at once no matter how many advisors are connected.
+# Jobs wait in a bounded queue, each has a time budget (the child is killed when it
+# runs out), and jobs are tagged with an owner (a Streamlit session) so a rerun can
+# cancel the previous run's jobs instead of letting them finish for nobody.
+
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import CancelledError, Future, TimeoutError
+from typing import Dict, List, Optional
+
+import graphviz
+
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+DEFAULT_QUEUE = 32
+DEFAULT_TIMEOUT = 8.0   # seconds per job
+
+
+class LayoutTimeout(Exception):
+    """Graphviz did not finish within the job's time budget."""
+
+
+class PoolBusy(Exception):
+    """The job queue is full; callers should degrade instead of waiting."""
+
+
+class _Job:
+    __slots__ = ("cmd", "source", "deadline", "future", "proc", "owner", "lock")
+
+    def __init__(self, cmd, source: bytes, deadline: float, owner: Optional[str]):
+        self.cmd = cmd
+        self.source = source
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.proc: Optional[subprocess.Popen] = None
+        self.owner = owner
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.future.cancel()
+            if self.proc is not None and self.proc.poll() is None:
+                _kill(self.proc)
+
+
+def _kill(proc: subprocess.Popen):
+    # the engine runs in its own process group so helpers it spawns die with it
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        proc.kill()
+
+
+class GraphvizPool:
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_QUEUE,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._q: "queue.Queue[_Job]" = queue.Queue(maxsize=max_queue)
+        self._by_owner: Dict[str, List[_Job]] = {}
+        self._lock = threading.Lock()
+        self.completed = self.timeouts = self.cancelled = 0
+        self._threads = [threading.Thread(target=self._run, name=f"graphviz-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    # ---------- client side ----------
+    def submit(self, source: str, engine: str = "dot", fmt: str = "svg", neato_no_op: int = 0,
+               timeout: Optional[float] = None, owner: Optional[str] = None) -> Future:
+        """Queue a render; the Future yields the output bytes.
+
+        Raises PoolBusy when the queue is full and graphviz.ExecutableNotFound when
+        the engine binary is missing.
+        """
+        exe = shutil.which(engine)
+        if exe is None:
+            raise graphviz.ExecutableNotFound([engine])
+        cmd = [exe, f"-T{fmt}"] + ([f"-n{neato_no_op}"] if neato_no_op else [])
+        budget = self.timeout if timeout is None else timeout
+        job = _Job(cmd, source.encode("utf-8"), time.monotonic() + budget, owner)
+        try:
+            self._q.put_nowait(job)
+        except queue.Full:
+            raise PoolBusy("graphviz queue is full")
+        if owner is not None:
+            with self._lock:
+                self._by_owner.setdefault(owner, []).append(job)
+        return job.future
+
+    def run(self, source: str, engine: str = "dot", fmt: str = "svg", neato_no_op: int = 0,
+            timeout: Optional[float] = None, owner: Optional[str] = None) -> bytes:
+        """Blocking submit(); raises LayoutTimeout, PoolBusy or CancelledError."""
+        budget = self.timeout if timeout is None else timeout
+        fut = self.submit(source, engine, fmt, neato_no_op, budget, owner)
+        # queue wait counts against the budget; small grace for process teardown
+        try:
+            return fut.result(timeout=budget + 2.0)
+        except TimeoutError:
+            fut.cancel()
+            raise LayoutTimeout("graphviz result did not arrive in time")
+
+    def cancel(self, owner: str):
+        """Cancel every queued or running job of `owner` (call at the start of a rerun)."""
+        with self._lock:
+            jobs = self._by_owner.pop(owner, [])
+        for job in jobs:
+            if not job.future.done():
+                job.cancel()
+                self.cancelled += 1
+
+    # ---------- worker side ----------
+    def _run(self):
+        while True:
+            job = self._q.get()
+            try:
+                self._execute(job)
+            except Exception as e:
+                # never let one job take its worker thread down with it
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._q.task_done()
+                if job.owner is not None:
+                    with self._lock:
+                        jobs = self._by_owner.get(job.owner)
+                        if jobs is not None and job in jobs:
+                            jobs.remove(job)
+                            if not jobs:
+                                del self._by_owner[job.owner]
+
+    def _execute(self, job: _Job):
+        remaining = job.deadline - time.monotonic()
+        if remaining <= 0:
+            if job.future.set_running_or_notify_cancel():
+                self.timeouts += 1
+                job.future.set_exception(LayoutTimeout("timed out while queued"))
+            return
+        with job.lock:
+            if not job.future.set_running_or_notify_cancel():
+                return  # cancelled before it started
+            try:
+                job.proc = subprocess.Popen(job.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE, start_new_session=(os.name == "posix"))
+            except OSError as e:   # EAGAIN / ENOMEM, or the engine vanished since submit()
+                job.future.set_exception(e)
+                return
+        try:
+            out, err = job.proc.communicate(job.source, timeout=remaining)
+        except subprocess.TimeoutExpired:
+            _kill(job.proc)
+            job.proc.communicate()
+            self.timeouts += 1
+            job.future.set_exception(LayoutTimeout(f"graphviz exceeded {remaining:.1f}s"))
+            return
+        if job.future.cancelled():
+            return
+        if job.proc.returncode != 0:
+            if job.proc.returncode < 0:  # killed by cancel()
+                job.future.set_exception(CancelledError())
+            else:
+                job.future.set_exception(RuntimeError(err.decode("utf-8", "replace").strip()
+                                                      or f"graphviz exited {job.proc.returncode}"))
+            return
+        self.completed += 1
+        job.future.set_result(out)
+
+
+_POOL: Optional[GraphvizPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> GraphvizPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = GraphvizPool()
+        return _POOL
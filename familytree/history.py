@@ -0,0 +1,129 @@
+# familytree/history.py — undo/redo for FamilyGraph edits
+#
+# A step stores before-images of only the persons/marriages it touched (recorded by
+# FamilyGraph's journal); every other entity is shared with the live tree, so a step
+# costs O(changed entities) rather than a copy of the tree. Undo swaps the images
+# with the current state of the same entities, which becomes the redo step. History
+# is bounded by step count and by an approximate byte budget per session.
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from familytree.graph import FamilyGraph
+
+Images = Dict[Tuple[str, str], Optional[Dict[str, Any]]]
+
+DEFAULT_DEPTH = 50
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+def _approx_bytes(images: Images) -> int:
+    n = 0
+    for (_, key), img in images.items():
+        n += 120 + len(key)
+        for k, v in (img or {}).items():
+            n += 60 + len(k) + (sum(len(x) + 56 for x in v) if isinstance(v, list) else len(str(v)))
+    return n
+
+
+class Step:
+    __slots__ = ("label", "images", "size")
+
+    def __init__(self, label: str, images: Images):
+        self.label = label
+        self.images = images
+        self.size = _approx_bytes(images)
+
+
+class History:
+    """Bounded undo/redo stacks over one FamilyGraph."""
+
+    def __init__(self, graph: FamilyGraph, depth: int = DEFAULT_DEPTH,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.graph = graph
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self._undo: Deque[Step] = deque()
+        self._redo: List[Step] = []
+        self._bytes = 0
+        self._nesting = 0
+
+    @contextmanager
+    def step(self, label: str) -> Iterator[None]:
+        """Group the edits made inside the block into one undoable step (re-entrant)."""
+        if self._nesting:
+            self._nesting += 1
+            try:
+                yield
+            finally:
+                self._nesting -= 1
+            return
+        self._nesting = 1
+        self.graph.begin_journal()
+        try:
+            yield
+        finally:
+            self._nesting = 0
+            images = self.graph.end_journal()
+            # an exception mid-step still leaves edits behind; keep them undoable
+            if images:
+                self._push_undo(Step(label, images))
+                self._drop_redo()
+
+    def _push_undo(self, st: Step):
+        self._undo.append(st)
+        self._bytes += st.size
+        while self._undo and (len(self._undo) > self.depth or self._bytes > self.max_bytes):
+            self._bytes -= self._undo.popleft().size
+
+    def _drop_redo(self):
+        for st in self._redo:
+            self._bytes -= st.size
+        self._redo.clear()
+
+    def _swap(self, st: Step) -> Step:
+        current = {(kind, key): self.graph.image(kind, key) for kind, key in st.images}
+        self.graph.restore(st.images)
+        return Step(st.label, current)
+
+    # ---------- public ----------
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo_label(self) -> Optional[str]:
+        return self._undo[-1].label if self._undo else None
+
+    def redo_label(self) -> Optional[str]:
+        return self._redo[-1].label if self._redo else None
+
+    def undo(self) -> Optional[str]:
+        if not self._undo:
+            return None
+        st = self._undo.pop()
+        self._bytes -= st.size
+        back = self._swap(st)
+        self._redo.append(back)
+        self._bytes += back.size
+        return st.label
+
+    def redo(self) -> Optional[str]:
+        if not self._redo:
+            return None
+        st = self._redo.pop()
+        self._bytes -= st.size
+        self._push_undo(self._swap(st))
+        return st.label
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"undo": len(self._undo), "redo": len(self._redo), "bytes": self._bytes}
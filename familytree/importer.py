@@ -0,0 +1,241 @@
+# familytree/importer.py — streaming, size-limited import of family_tree.json
+#
+# json.loads() on an upload keeps the raw bytes, the decoded text and the whole
+# parsed object alive at once, and accepts any size or nesting. read_tree() instead
+# walks the top-level object itself and decodes one person / marriage record at a
+# time (json.JSONDecoder.raw_decode on a small rolling buffer) and checks it. The
+# parsed records *are* the model's dicts: they are collected as they are, the
+# cross-record checks (dangling ids, double parentage, cycles) run on them via
+# validate_tree, and only then does FamilyGraph.from_dict build its indexes, so
+# the checker's scratch space and the indexes are never alive together. Peak
+# memory is the final graph plus one read chunk and the record being decoded.
+#
+# ImportLimits caps the file size, entity counts, one record's size, its nesting
+# depth and a marriage's child list; crossing one stops the import at once.
+
+import codecs
+import json
+import re
+from typing import IO, Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from familytree.graph import FamilyGraph
+from familytree.validate import Issue, ValidationError, errors, validate_tree
+
+CHUNK = 64 * 1024
+_WS = re.compile(r"[ \t\n\r]*")
+
+Progress = Callable[[int, Optional[int], int, int], None]   # (bytes read, total or None, persons, marriages)
+
+
+class ImportLimits(NamedTuple):
+    max_bytes: int = 50 * 1024 * 1024
+    max_persons: int = 200_000
+    max_marriages: int = 200_000
+    max_record_bytes: int = 64 * 1024
+    max_depth: int = 6            # nesting inside one record (a marriage's lists are depth 2)
+    max_children: int = 1_000
+
+
+DEFAULT_LIMITS = ImportLimits()
+
+
+def _limit(message: str) -> ValidationError:
+    return ValidationError([Issue("limit", message)])
+
+
+def _size(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n // (1024 * 1024)} MB"
+    return f"{n // 1024} KB" if n >= 1024 else f"{n} bytes"
+
+
+def _interned(rec: Dict[str, Any], keys: Dict[str, str]) -> Dict[str, Any]:
+    # each raw_decode call makes its own key strings; share them across records
+    return {keys.setdefault(k, k): v for k, v in rec.items()}
+
+
+def _too_deep(rec: Dict[str, Any], limit: int) -> bool:
+    # plain records (scalar fields, id lists) are never walked
+    return any(isinstance(v, (dict, list)) and _depth(v) >= limit for v in rec.values())
+
+
+def _depth(v: Any) -> int:
+    if isinstance(v, dict):
+        return 1 + max(map(_depth, v.values()), default=0)
+    if isinstance(v, list):
+        return 1 + max(map(_depth, v), default=0)
+    return 0
+
+
+class _Reader:
+    """Rolling text buffer over a binary or text stream, counting the bytes read."""
+
+    def __init__(self, fp: IO, limits: ImportLimits):
+        self.fp = fp
+        self.limits = limits
+        self.buf = ""
+        self.pos = 0
+        self.read_bytes = 0
+        self.eof = False
+        self._dec = json.JSONDecoder()
+        self._utf8 = None
+
+    def _more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(CHUNK)
+        if not chunk:
+            self.eof = True
+            if self._utf8 is not None:
+                self.buf = self.buf[self.pos:] + self._utf8.decode(b"", final=True)
+                self.pos = 0
+            return False
+        self.read_bytes += len(chunk)
+        if self.read_bytes > self.limits.max_bytes:
+            raise _limit(f"檔案超過 {_size(self.limits.max_bytes)} 上限")
+        # what is kept across reads is one unfinished value: never more than a record
+        if len(self.buf) - self.pos > self.limits.max_record_bytes:
+            raise _limit(f"單筆資料超過 {_size(self.limits.max_record_bytes)} 上限")
+        if isinstance(chunk, bytes):
+            if self._utf8 is None:
+                self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+            chunk = self._utf8.decode(chunk)
+        self.buf = self.buf[self.pos:] + chunk   # drop what was consumed
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at the end)."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, ch: str):
+        got = self.peek()
+        if got != ch:
+            raise ValidationError([Issue("bad_json", f"JSON 格式錯誤：預期 {ch!r}，讀到 {got or '檔案結尾'!r}")])
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode one JSON value, reading more until it is complete (up to max_record_bytes)."""
+        self.peek()
+        while True:
+            try:
+                v, end = self._dec.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if len(self.buf) - self.pos > self.limits.max_record_bytes:
+                    raise _limit(f"單筆資料超過 {_size(self.limits.max_record_bytes)} 上限")
+                if self._more():
+                    continue
+                raise ValidationError([Issue("bad_json", f"JSON 格式錯誤：{e.msg}")])
+            except RecursionError:
+                raise _limit("資料巢狀層數過多")
+            # a number or literal cut at the chunk end decodes "successfully": make sure it was not
+            if end == len(self.buf) and not self.eof and not isinstance(v, (dict, list, str)):
+                if self._more():
+                    continue
+            if end - self.pos > self.limits.max_record_bytes:
+                raise _limit(f"單筆資料超過 {_size(self.limits.max_record_bytes)} 上限")
+            self.pos = end
+            return v
+
+
+def _check_person(pid: str, p: Any, limits: ImportLimits) -> List[Issue]:
+    if not isinstance(p, dict):
+        return [Issue("bad_shape", f"成員 {pid} 的資料格式錯誤", pids=(pid,))]
+    if _too_deep(p, limits.max_depth):
+        return [Issue("limit", f"成員 {pid} 的資料巢狀層數過多", pids=(pid,))]
+    return []
+
+
+def _check_marriage(mid: str, m: Any, limits: ImportLimits) -> List[Issue]:
+    if not isinstance(m, dict):
+        return [Issue("bad_shape", f"婚姻 {mid} 的資料格式錯誤", mids=(mid,))]
+    spouses, children = m.get("spouses", []), m.get("children", [])
+    if not isinstance(spouses, list) or not isinstance(children, list):
+        return [Issue("bad_shape", f"婚姻 {mid} 的 spouses / children 必須是陣列", mids=(mid,))]
+    if not all(isinstance(x, str) for x in spouses + children):
+        return [Issue("bad_shape", f"婚姻 {mid} 的成員編號必須是字串", mids=(mid,))]
+    if len(children) > limits.max_children:
+        return [Issue("limit", f"婚姻 {mid} 的子女超過 {limits.max_children} 位上限", mids=(mid,))]
+    if _too_deep({k: v for k, v in m.items() if k not in ("spouses", "children", "order")}, limits.max_depth):
+        return [Issue("limit", f"婚姻 {mid} 的資料巢狀層數過多", mids=(mid,))]
+    return []
+
+
+def read_tree(fp: Union[IO[bytes], IO[str]], limits: ImportLimits = DEFAULT_LIMITS,
+              progress: Optional[Progress] = None, total: Optional[int] = None
+              ) -> Tuple[FamilyGraph, List[Issue]]:
+    """Stream a `{"persons", "marriages"}` JSON file into a FamilyGraph.
+
+    Returns the graph and the warnings; raises ValidationError for errors, malformed
+    JSON or a crossed limit. `total` (the file size, if known) is passed on to
+    `progress`, which is called every 500 records and at the end.
+    """
+    if total is not None and total > limits.max_bytes:
+        raise _limit(f"檔案超過 {_size(limits.max_bytes)} 上限")
+    r = _Reader(fp, limits)
+    parts: Dict[str, Dict[str, Any]] = {"persons": {}, "marriages": {}}
+    issues: List[Issue] = []
+    caps = {"persons": limits.max_persons, "marriages": limits.max_marriages}
+    labels = {"persons": "成員", "marriages": "婚姻"}
+    keys: Dict[str, str] = {}
+
+    def report():
+        if progress is not None:
+            progress(r.read_bytes, total, len(parts["persons"]), len(parts["marriages"]))
+
+    r.expect("{")
+    first = True
+    n = 0
+    while r.peek() != "}":
+        if not first:
+            r.expect(",")
+        first = False
+        key = r.value()
+        r.expect(":")
+        if key not in parts:
+            r.value()    # other top-level keys: decoded (within the record limit) and ignored
+            continue
+        if r.peek() != "{":
+            raise ValidationError([Issue("bad_shape", "persons / marriages 必須是物件")])
+        r.expect("{")
+        part = parts[key]
+        inner_first = True
+        while r.peek() != "}":
+            if not inner_first:
+                r.expect(",")
+            inner_first = False
+            ident = r.value()
+            if not isinstance(ident, str):
+                raise ValidationError([Issue("bad_json", "JSON 格式錯誤：物件的鍵必須是字串")])
+            r.expect(":")
+            rec = r.value()
+            if ident in part:
+                issues.append(Issue("duplicate_id", f"{labels[key]}編號 {ident} 重複",
+                                    **({"pids": (ident,)} if key == "persons" else {"mids": (ident,)})))
+                continue
+            if len(part) >= caps[key]:
+                raise _limit(f"{labels[key]}數量超過 {caps[key]:,} 筆上限")
+            bad = _check_person(ident, rec, limits) if key == "persons" else _check_marriage(ident, rec, limits)
+            if bad:
+                issues.extend(bad)
+                continue
+            part[ident] = _interned(rec, keys)
+            n += 1
+            if n % 500 == 0:
+                report()
+        r.expect("}")
+    r.expect("}")
+    if r.peek() != "":
+        raise ValidationError([Issue("bad_json", "JSON 格式錯誤：物件結尾後還有多餘內容")])
+    report()
+    if errors(issues):
+        raise ValidationError(issues)
+    issues += validate_tree(parts)
+    if errors(issues):
+        raise ValidationError(issues)
+    return FamilyGraph.from_dict(parts), issues
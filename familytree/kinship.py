@@ -0,0 +1,460 @@
+# familytree/kinship.py — "how is A related to B": relationship path and Chinese kinship term
+#
+# Blood relations come from memoized ancestor maps (person -> {ancestor: (generations,
+# parent on a shortest way up)}): the closest common ancestor gives the path, and
+# the maps are shared by every query, so an all-pairs table mostly costs dictionary
+# lookups. When A and B share no ancestor the shortest path through marriages is
+# found with a bidirectional BFS over parent / child / spouse links.
+#
+# Birth order is not stored in the tree. Terms that need it (哥哥/弟弟, 伯父/叔叔 …)
+# use a person's optional "birth" field when both sides have one, otherwise the
+# order of the children list for siblings of the same marriage, otherwise a neutral
+# term (兄弟, 伯叔).
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from familytree.graph import FamilyGraph
+
+UP, DOWN, SPOUSE = "up", "down", "spouse"
+_REVERSE = {UP: DOWN, DOWN: UP, SPOUSE: SPOUSE}
+
+Path = Tuple[List[str], List[str]]   # (persons A..B, step kinds between them)
+
+# longest path any special term below applies to (spouse + 3 up + 2 down);
+# longer relations are described as a chain (父親的妻子的…) or, for blood
+# relatives, by their civil-law degree (旁系血親第 N 親等)
+MAX_TERM_STEPS = 6
+MAX_BLOOD_TERM_STEPS = 5
+
+
+class KinshipIndex:
+    """Relationship queries over one graph; memo is valid until the graph is edited."""
+
+    def __init__(self, graph: FamilyGraph):
+        self.g = graph
+        self._anc: Dict[str, Dict[str, Tuple[int, str]]] = {}
+        self._parents: Dict[str, List[str]] = {}
+        self._adj: Dict[str, List[Tuple[str, str]]] = {}
+        self._sexes: Dict[str, Optional[str]] = {}
+
+    # ---------- neighbours ----------
+    def parents(self, pid: str) -> List[str]:
+        ps = self._parents.get(pid)
+        if ps is None:
+            ps = []
+            for mid in self.g.parent_marriages_of(pid):
+                ps.extend(s for s in self.g.marriages[mid].get("spouses", []) if s not in ps)
+            self._parents[pid] = ps
+        return ps
+
+    def children(self, pid: str) -> List[str]:
+        out: List[str] = []
+        for mid in self.g.marriages_of(pid):
+            out.extend(c for c in self.g.marriages[mid].get("children", []) if c not in out)
+        return out
+
+    def _neighbours(self, pid: str) -> List[Tuple[str, str]]:
+        adj = self._adj.get(pid)
+        if adj is None:
+            adj = ([(p, UP) for p in self.parents(pid)] + [(c, DOWN) for c in self.children(pid)]
+                   + [(s, SPOUSE) for s in self.g.spouses_of(pid)])
+            self._adj[pid] = adj
+        return adj
+
+    # ---------- ancestors ----------
+    def ancestors(self, pid: str) -> Dict[str, Tuple[int, str]]:
+        """{ancestor: (generations up, parent of `pid` on a shortest way there)}, memoized."""
+        memo = self._anc
+        if pid in memo:
+            return memo[pid]
+        # iterative post-order so deep trees don't hit the recursion limit
+        stack = [pid]
+        visiting = set()
+        while stack:
+            cur = stack[-1]
+            if cur in memo:
+                stack.pop()
+                continue
+            pending = [p for p in self.parents(cur) if p not in memo and p not in visiting]
+            if pending and cur not in visiting:
+                visiting.add(cur)
+                stack.extend(pending)
+                continue
+            stack.pop()
+            visiting.discard(cur)
+            out: Dict[str, Tuple[int, str]] = {}
+            for p in self.parents(cur):
+                if p == cur:
+                    continue
+                if p not in out or out[p][0] > 1:
+                    out[p] = (1, p)
+                for x, (d, _) in memo.get(p, {}).items():   # missing only on a cycle
+                    if x != cur and (x not in out or out[x][0] > d + 1):
+                        out[x] = (d + 1, p)
+            memo[cur] = out
+        return memo[pid]
+
+    def _chain_up(self, pid: str, ancestor: str) -> List[str]:
+        chain = [pid]
+        while chain[-1] != ancestor:
+            chain.append(self.ancestors(chain[-1])[ancestor][1])
+        return chain
+
+    def _common(self, a: str, b: str) -> Optional[Tuple[int, int, str]]:
+        """(generations a→X, generations b→X, X) for the closest common ancestor X."""
+        anc_a, anc_b = self.ancestors(a), self.ancestors(b)
+        best = None
+        if b in anc_a:
+            best = (anc_a[b][0], 0, b)
+        if a in anc_b and (best is None or anc_b[a][0] < best[0] + best[1]):
+            best = (0, anc_b[a][0], a)
+        if anc_a and anc_b:
+            flip = len(anc_a) > len(anc_b)
+            small, large = (anc_b, anc_a) if flip else (anc_a, anc_b)
+            for x, (d1, _) in small.items():
+                hit = large.get(x)
+                if hit is not None and (best is None or d1 + hit[0] < best[0] + best[1]):
+                    best = (hit[0], d1, x) if flip else (d1, hit[0], x)
+        return best
+
+    def blood_path(self, a: str, b: str) -> Optional[Path]:
+        """Path through the closest common ancestor, or None if there is none."""
+        if a == b:
+            return [a], []
+        best = self._common(a, b)
+        if best is None:
+            return None
+        x = best[2]
+        up = self._chain_up(a, x)
+        down = self._chain_up(b, x)[::-1]
+        nodes = up + down[1:]
+        return nodes, [UP] * (len(up) - 1) + [DOWN] * (len(down) - 1)
+
+    # ---------- any path ----------
+    def shortest_path(self, a: str, b: str) -> Optional[Path]:
+        """Shortest parent/child/spouse path (bidirectional BFS)."""
+        if a == b:
+            return [a], []
+        prev_a: Dict[str, Optional[Tuple[str, str]]] = {a: None}
+        prev_b: Dict[str, Optional[Tuple[str, str]]] = {b: None}
+        dist_a, dist_b = {a: 0}, {b: 0}
+        qa, qb = deque([a]), deque([b])
+        while qa and qb:
+            # expand the smaller frontier one full level; the best meeting point of
+            # that level (not the first one found) gives the shortest path
+            forward = len(qa) <= len(qb)
+            q, seen, dist, other = (qa, prev_a, dist_a, dist_b) if forward else (qb, prev_b, dist_b, dist_a)
+            meet, best = None, None
+            for _ in range(len(q)):
+                cur = q.popleft()
+                for nxt, kind in self._neighbours(cur):
+                    if nxt in seen:
+                        continue
+                    seen[nxt] = (cur, kind)
+                    dist[nxt] = dist[cur] + 1
+                    q.append(nxt)
+                    if nxt in other and (best is None or dist[nxt] + other[nxt] < best):
+                        meet, best = nxt, dist[nxt] + other[nxt]
+            if meet is not None:
+                return self._join(meet, prev_a, prev_b)
+        return None
+
+    @staticmethod
+    def _join(meet, prev_a, prev_b) -> Path:
+        left, kinds_l = [meet], []
+        while prev_a[left[-1]] is not None:
+            p, k = prev_a[left[-1]]
+            left.append(p)
+            kinds_l.append(k)
+        left.reverse()
+        kinds_l.reverse()
+        right, kinds_r = [], []
+        cur = meet
+        while prev_b[cur] is not None:
+            p, k = prev_b[cur]
+            right.append(p)
+            kinds_r.append(_REVERSE[k])
+            cur = p
+        return left + right, kinds_l + kinds_r
+
+    def _bfs_from(self, a: str) -> Tuple[Dict[str, Optional[Tuple[str, str]]], Dict[str, int]]:
+        prev: Dict[str, Optional[Tuple[str, str]]] = {a: None}
+        dist = {a: 0}
+        q = deque([a])
+        while q:
+            cur = q.popleft()
+            for nxt, kind in self._neighbours(cur):
+                if nxt not in prev:
+                    prev[nxt] = (cur, kind)
+                    dist[nxt] = dist[cur] + 1
+                    q.append(nxt)
+        return prev, dist
+
+    def _row_chain(self, prev, b: str, words: Dict[str, str]) -> str:
+        # chain description along the BFS tree, reusing the prefixes already built for this row
+        todo = []
+        cur = b
+        while cur not in words:
+            todo.append(cur)
+            cur = prev[cur][0]
+        for node in reversed(todo):
+            p, kind = prev[node]
+            w = self._step_word(p, node, kind)
+            words[node] = f"{words[p]}的{w}" if words[p] else w
+        return words[b]
+
+    @staticmethod
+    def _path_from(prev, b: str) -> Optional[Path]:
+        if b not in prev:
+            return None
+        nodes, kinds = [b], []
+        while prev[nodes[-1]] is not None:
+            p, k = prev[nodes[-1]]
+            nodes.append(p)
+            kinds.append(k)
+        return nodes[::-1], kinds[::-1]
+
+    # ---------- public ----------
+    def relation(self, a: str, b: str) -> Tuple[Optional[Path], str]:
+        """(path, term) for "B is A's ___"; blood relations take precedence."""
+        path = self.blood_path(a, b) or self.shortest_path(a, b)
+        if path is None:
+            return None, "無親屬關係"
+        return path, self.term(path)
+
+    def table(self, pids: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, str]]:
+        """(A, B, term) for every ordered pair of `pids` (default: everyone)."""
+        pids = list(self.g.persons if pids is None else pids)
+        for a in pids:
+            prev = dist = words = None
+            for b in pids:
+                if a == b:
+                    continue
+                common = self._common(a, b)
+                if common is not None:
+                    up, down, x = common
+                    if up + down > MAX_BLOOD_TERM_STEPS:
+                        yield a, b, self._degree_term(up, down)
+                    else:
+                        yield a, b, self.term(self.blood_path(a, b))
+                    continue
+                if prev is None:
+                    # once per row, shared by all affinal pairs of the row
+                    prev, dist = self._bfs_from(a)
+                    words = {a: ""}
+                if b not in prev:
+                    yield a, b, "無親屬關係"
+                elif dist[b] > MAX_TERM_STEPS:
+                    yield a, b, self._row_chain(prev, b, words)
+                else:
+                    yield a, b, self.term(self._path_from(prev, b))
+
+    # ---------- terms ----------
+    def _sex(self, pid: str) -> Optional[str]:
+        try:
+            return self._sexes[pid]
+        except KeyError:
+            g = (self.g.persons.get(pid, {}).get("gender") or "").strip()
+            sex = self._sexes[pid] = "M" if g == "男" else ("F" if g == "女" else None)
+            return sex
+
+    def _older(self, x: str, y: str) -> Optional[bool]:
+        """Is x older than y? None when unknown."""
+        bx = self.g.persons.get(x, {}).get("birth")
+        by = self.g.persons.get(y, {}).get("birth")
+        if bx and by and str(bx) != str(by):
+            return str(bx) < str(by)
+        for mid in self.g.parent_marriages_of(x):
+            kids = self.g.marriages[mid].get("children", [])
+            if y in kids:
+                return kids.index(x) < kids.index(y)
+        return None
+
+    def _pick(self, pid: str, male: str, female: str, either: str) -> str:
+        s = self._sex(pid)
+        return male if s == "M" else (female if s == "F" else either)
+
+    def _spouse_word(self, a: str, b: str) -> str:
+        mid = self.g.find_marriage(a, b)
+        divorced = bool(mid and self.g.marriages[mid].get("divorced"))
+        return self._pick(b, "前夫" if divorced else "丈夫", "前妻" if divorced else "妻子", "配偶")
+
+    @staticmethod
+    def _degree_term(up: int, down: int) -> str:
+        # 民法第 968 條: lineal = generations apart; collateral = up to the common ancestor plus down
+        if down == 0:
+            return f"直系血親尊親屬（第 {up} 親等）"
+        if up == 0:
+            return f"直系血親卑親屬（第 {down} 親等）"
+        return f"旁系血親（第 {up + down} 親等）"
+
+    def _step_word(self, cur: str, nxt: str, kind: str) -> str:
+        if kind == UP:
+            return self._pick(nxt, "父親", "母親", "父母")
+        if kind == DOWN:
+            return self._pick(nxt, "兒子", "女兒", "子女")
+        return self._spouse_word(cur, nxt)
+
+    def _chain_words(self, nodes: List[str], kinds: List[str]) -> str:
+        return "的".join(self._step_word(nodes[i], nodes[i + 1], k) for i, k in enumerate(kinds))
+
+    def term(self, path: Path) -> str:
+        nodes, kinds = path
+        if not kinds:
+            return "本人"
+        if SPOUSE not in kinds:
+            shape = self._shape(kinds)
+            return self._blood_term(nodes, kinds) or self._degree_term(*shape)
+        if kinds == [SPOUSE]:
+            return self._spouse_word(nodes[0], nodes[1])
+        if kinds[0] == SPOUSE and SPOUSE not in kinds[1:]:
+            t = self._in_law_of_spouse(nodes, kinds)
+            if t:
+                return t
+            inner = self._blood_term(nodes[1:], kinds[1:])
+            if inner:
+                return f"{self._spouse_word(nodes[0], nodes[1])}的{inner}"
+        if kinds[-1] == SPOUSE and SPOUSE not in kinds[:-1]:
+            t = self._spouse_of_relative(nodes, kinds)
+            if t:
+                return t
+            inner = self._blood_term(nodes[:-1], kinds[:-1])
+            if inner:
+                return f"{inner}的{self._spouse_word(nodes[-2], nodes[-1])}"
+        return self._chain_words(nodes, kinds)
+
+    def _shape(self, kinds: List[str]) -> Optional[Tuple[int, int]]:
+        a = 0
+        while a < len(kinds) and kinds[a] == UP:
+            a += 1
+        if any(k != DOWN for k in kinds[a:]):
+            return None
+        return a, len(kinds) - a
+
+    def _blood_term(self, nodes: List[str], kinds: List[str]) -> Optional[str]:
+        shape = self._shape(kinds)
+        if shape is None:
+            return None
+        a, b = shape
+        A, B = nodes[0], nodes[-1]
+        up1 = nodes[1] if a >= 1 else None          # A's parent on the path
+        down1 = nodes[a + 1] if b >= 1 else None    # the common ancestor's child towards B
+        pick = lambda m, f, e: self._pick(B, m, f, e)
+
+        if b == 0:
+            if a == 1:
+                return pick("父親", "母親", "父母")
+            side = "外" if self._sex(up1) == "F" else ""
+            names = {2: ("祖父", "祖母", "祖父母"), 3: ("曾祖父", "曾祖母", "曾祖父母"),
+                     4: ("高祖父", "高祖母", "高祖父母")}
+            return side + pick(*names[a]) if a in names else None
+        if a == 0:
+            if b == 1:
+                return pick("兒子", "女兒", "子女")
+            if self._sex(down1) == "F":   # through a daughter: 外孫 line
+                names = {2: ("外孫", "外孫女", "外孫"), 3: ("外曾孫", "外曾孫女", "外曾孫"),
+                         4: ("外玄孫", "外玄孫女", "外玄孫")}
+            else:
+                names = {2: ("孫子", "孫女", "孫"), 3: ("曾孫", "曾孫女", "曾孫"), 4: ("玄孫", "玄孫女", "玄孫")}
+            return pick(*names[b]) if b in names else None
+
+        sa = nodes[a - 1]   # the common ancestor's child towards A (A's side sibling)
+        if a == 1 and b == 1:
+            older = self._older(B, A)
+            word = pick({True: "哥哥", False: "弟弟"}.get(older, "兄弟"),
+                        {True: "姊姊", False: "妹妹"}.get(older, "姊妹"), "手足")
+            if set(self.parents(A)) != set(self.parents(B)):
+                shared = nodes[1]
+                word = ("同父異母的" if self._sex(shared) == "M" else
+                        "同母異父的" if self._sex(shared) == "F" else "半血緣") + word
+            return word
+        if a == 1:
+            nephew = self._sex(down1) != "F"
+            names = {2: ("姪子", "姪女", "姪") if nephew else ("外甥", "外甥女", "外甥"),
+                     3: ("姪孫", "姪孫女", "姪孫") if nephew else ("外甥孫", "外甥孫女", "外甥孫")}
+            return pick(*names[b]) if b in names else None
+        if a == 2 and b == 1:
+            if self._sex(up1) == "M":
+                older = self._older(B, up1)
+                return pick({True: "伯父", False: "叔叔"}.get(older, "伯叔"), "姑姑", "伯叔姑")
+            if self._sex(up1) == "F":
+                return pick("舅舅", "阿姨", "舅姨")
+            return None
+        if a == 3 and b == 1:
+            paternal = self._sex(up1) == "M"
+            if self._sex(sa) == "M":
+                older = self._older(B, sa)
+                male = {True: "伯公", False: "叔公"}.get(older, "伯叔公")
+                return ("" if paternal else "外") + pick(male, "姑婆", male + "/姑婆")
+            return pick("舅公", "姨婆", "舅公/姨婆")
+        tang = self._sex(up1 if a == 2 else nodes[2]) == "M" and self._sex(down1) == "M"
+        prefix = "堂" if tang else "表"
+        if a == 2 and b == 2:
+            older = self._older(B, A)
+            return prefix + pick({True: "兄", False: "弟"}.get(older, "兄弟"),
+                                 {True: "姊", False: "妹"}.get(older, "姊妹"), "手足")
+        if a == 2 and b == 3:
+            return prefix + pick("姪", "姪女", "姪")
+        if a == 3 and b == 2:
+            if self._sex(up1) == "M":
+                older = self._older(B, up1)
+                return prefix + pick({True: "伯", False: "叔"}.get(older, "伯叔"), "姑", "伯叔姑")
+            return "表" + pick("舅", "姨", "舅姨")
+        return None
+
+    def _in_law_of_spouse(self, nodes: List[str], kinds: List[str]) -> Optional[str]:
+        # B is a blood relative of A's spouse S
+        S, B = nodes[1], nodes[-1]
+        shape = self._shape(kinds[1:])
+        husband = self._sex(S) == "M"
+        wife = self._sex(S) == "F"
+        if shape == (1, 0):
+            if husband:
+                return self._pick(B, "公公", "婆婆", "公婆")
+            if wife:
+                return self._pick(B, "岳父", "岳母", "岳父母")
+        if shape == (0, 1):
+            return self._pick(B, "繼子", "繼女", "繼子女")
+        if shape == (1, 1) and (husband or wife):
+            older = self._older(B, S)
+            big = {True: "大", False: "小"}.get(older, "")
+            if husband:
+                return big + self._pick(B, "伯" if older else ("叔" if older is False else "伯叔"), "姑", "伯叔姑")
+            return big + self._pick(B, "舅子", "姨子", "舅子/姨子")
+        return None
+
+    def _spouse_of_relative(self, nodes: List[str], kinds: List[str]) -> Optional[str]:
+        # B is the spouse of A's blood relative R
+        R, B = nodes[-2], nodes[-1]
+        shape = self._shape(kinds[:-1])
+        r_male, r_female = self._sex(R) == "M", self._sex(R) == "F"
+        if shape == (1, 0):
+            return "繼母" if r_male else ("繼父" if r_female else None)
+        if shape == (0, 1):
+            return "媳婦" if r_male else ("女婿" if r_female else None)
+        if shape == (0, 2):
+            return "孫媳婦" if r_male else ("孫女婿" if r_female else None)
+        if shape == (1, 1):
+            older = self._older(R, nodes[0])
+            if r_male:
+                return {True: "嫂嫂", False: "弟媳"}.get(older)
+            if r_female:
+                return {True: "姊夫", False: "妹夫"}.get(older)
+        if shape == (2, 1):
+            parent = nodes[1]
+            if self._sex(parent) == "M":
+                if r_male:
+                    older = self._older(R, parent)
+                    return {True: "伯母", False: "嬸嬸"}.get(older, "伯母/嬸嬸")
+                if r_female:
+                    return "姑丈"
+            if self._sex(parent) == "F":
+                return "舅媽" if r_male else ("姨丈" if r_female else None)
+        if shape == (1, 2):
+            nephew_line = self._sex(nodes[2]) == "M"
+            if r_male:
+                return "姪媳" if nephew_line else "外甥媳婦"
+            if r_female:
+                return "姪女婿" if nephew_line else "外甥女婿"
+        return None
@@ -0,0 +1,485 @@
+# familytree/layered.py — built-in layered (Sugiyama-style) layout + direct SVG output
+#
+# Made for this family model rather than general graphs:
+#   1. ranks      spouses are unioned into one "couple block" that shares a rank; a
+#                 marriage is the rank anchor for its children (block -> child block
+#                 edges, longest path + pull-down so in-law roots sit just above).
+#   2. ordering   NumPy barycenter sweeps (down over parent marriages, up over
+#                 children), blocks keep their internal spouse order.
+#   3. x coords   vectorized: desired centres from parents/children, then an
+#                 order-preserving compaction (cumulative max/min) per rank.
+#   4. drawing    boxes + straight spouse line + marriage dot + orthogonal child bus.
+#
+# No Graphviz needed, so it doubles as the fallback when `dot` is not installed.
+
+from collections import defaultdict
+from html import escape
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import unicodedata
+
+import numpy as np
+
+FONT_PX = 12
+CHAR_W = {True: 12.0, False: 7.0}  # wide / narrow glyph advance at FONT_PX
+LINE_H = 15
+PAD_X, PAD_Y = 10, 7
+SPOUSE_GAP = 28   # room for the marriage dot between spouses
+BLOCK_GAP = 26
+RANK_SEP = 56
+MARGIN = 20
+
+
+def _text_w(s: str) -> float:
+    return sum(CHAR_W[unicodedata.east_asian_width(ch) in ("W", "F")] for ch in s)
+
+
+def _label_lines(p: Dict[str, Any], pid: str) -> List[str]:
+    name = p.get("name", pid)
+    return [name] + ([p["note"]] if p.get("note") else [])
+
+
+class _DSU:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, a: int) -> int:
+        parent = self.parent
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+class LayeredLayout:
+    """Result of `layered_layout`: boxes, marriage points and the canvas size (px)."""
+
+    def __init__(self):
+        self.boxes: Dict[str, Tuple[float, float, float, float]] = {}   # pid -> (cx, cy, w, h)
+        self.points: Dict[str, Tuple[float, float]] = {}                # mid -> (x, y)
+        self.ranks: Dict[str, int] = {}                                 # pid -> rank
+        self.width = 0.0
+        self.height = 0.0
+        self.rank_tops = np.zeros(0)
+        self.rank_heights = np.zeros(0)
+
+
+def assign_ranks(persons: Dict[str, Any], marriages: Dict[str, Any]):
+    """Spouse blocks and their ranks.
+
+    Returns (pids, group_of_person ndarray, group_rank ndarray, n_groups).
+    Cycles in bad data are tolerated: edges closing a cycle are ignored.
+    """
+    pids = list(persons.keys())
+    pidx = {p: i for i, p in enumerate(pids)}
+    dsu = _DSU(len(pids))
+    for m in marriages.values():
+        sp = [pidx[s] for s in m.get("spouses", []) if s in pidx]
+        for s in sp[1:]:
+            dsu.union(sp[0], s)
+    roots = np.fromiter((dsu.find(i) for i in range(len(pids))), dtype=np.int64, count=len(pids))
+    _, gop = np.unique(roots, return_inverse=True)
+    gop = gop.astype(np.int64)
+    n_groups = int(gop.max()) + 1 if len(pids) else 0
+
+    succ: Dict[int, set] = defaultdict(set)
+    indeg = np.zeros(n_groups, dtype=np.int64)
+    for m in marriages.values():
+        sp = [pidx[s] for s in m.get("spouses", []) if s in pidx]
+        if not sp:
+            continue
+        gm = gop[sp[0]]
+        for c in m.get("children", []):
+            if c in pidx:
+                gc = gop[pidx[c]]
+                if gc != gm and gc not in succ[gm]:
+                    succ[gm].add(gc)
+                    indeg[gc] += 1
+
+    # Kahn longest path
+    rank = np.zeros(n_groups, dtype=np.int64)
+    queue = list(np.flatnonzero(indeg == 0))
+    topo: List[int] = []
+    seen = np.zeros(n_groups, dtype=bool)
+    while True:
+        while queue:
+            g = int(queue.pop())
+            if seen[g]:
+                continue
+            seen[g] = True
+            topo.append(g)
+            for c in succ.get(g, ()):
+                if rank[c] < rank[g] + 1:
+                    rank[c] = rank[g] + 1
+                indeg[c] -= 1
+                if indeg[c] == 0:
+                    queue.append(c)
+        left = np.flatnonzero(~seen)
+        if not len(left):
+            break
+        # break a cycle: release the lowest-ranked unfinished group
+        g = int(left[np.argmin(rank[left])])
+        indeg[g] = 0
+        queue.append(g)
+
+    # pull parents down to just above their nearest child (shortens in-law edges)
+    order_ix = {g: i for i, g in enumerate(topo)}
+    for g in reversed(topo):
+        kids = [c for c in succ.get(g, ()) if order_ix[c] > order_ix[g]]
+        if kids:
+            rank[g] = max(rank[g], min(rank[c] for c in kids) - 1)
+    if n_groups:
+        rank -= rank.min()
+    return pids, gop, rank, n_groups
+
+
+def layered_layout(tree: dict, sweeps: int = 6, coord_rounds: int = 6) -> LayeredLayout:
+    persons: Dict[str, Dict[str, Any]] = tree.get("persons", {})
+    marriages: Dict[str, Dict[str, Any]] = tree.get("marriages", {})
+    out = LayeredLayout()
+    if not persons:
+        return out
+
+    pids, gop, grank, G = assign_ranks(persons, marriages)
+    pidx = {p: i for i, p in enumerate(pids)}
+    N = len(pids)
+
+    # ---- person sizes ----
+    pw = np.empty(N)
+    ph = np.empty(N)
+    for i, pid in enumerate(pids):
+        lines = _label_lines(persons[pid], pid)
+        pw[i] = max(48.0, max(_text_w(s) for s in lines) + 2 * PAD_X)
+        ph[i] = LINE_H * len(lines) + 2 * PAD_Y
+
+    # ---- marriages (only those with a spouse on the canvas get a point) ----
+    mids: List[str] = []
+    m_sp: List[List[int]] = []
+    m_kids: List[List[int]] = []
+    for mid, m in marriages.items():
+        order = m.get("order") or m.get("spouses", [])
+        sp = [pidx[s] for s in order if s in pidx][:2]
+        kids = [pidx[c] for c in m.get("children", []) if c in pidx]
+        if not sp and not kids:
+            continue
+        mids.append(mid)
+        m_sp.append(sp)
+        m_kids.append(kids)
+    M = len(mids)
+
+    # ---- block membership: spouse chain order inside each block ----
+    adj: Dict[int, List[int]] = defaultdict(list)
+    for sp in m_sp:
+        if len(sp) == 2:
+            adj[sp[0]].append(sp[1])
+            adj[sp[1]].append(sp[0])
+    members: List[List[int]] = [[] for _ in range(G)]
+    placed = np.zeros(N, dtype=bool)
+    # start chains at low-degree members so A–B–C chains come out in order
+    for i in sorted(range(N), key=lambda i: (len(adj.get(i, ())) > 1, i)):
+        if placed[i]:
+            continue
+        stack = [i]
+        while stack:
+            v = stack.pop()
+            if placed[v]:
+                continue
+            placed[v] = True
+            members[gop[v]].append(v)
+            stack.extend(u for u in reversed(adj.get(v, ())) if not placed[u])
+
+    # person offset from block centre; block widths
+    poff = np.zeros(N)
+    bw = np.zeros(G)
+    for g, mem in enumerate(members):
+        if not mem:
+            continue
+        w = pw[mem]
+        lefts = np.concatenate(([0.0], np.cumsum(w + SPOUSE_GAP)[:-1]))
+        total = lefts[-1] + w[-1]
+        poff[mem] = lefts + w / 2 - total / 2
+        bw[g] = total
+
+    # marriage -> (block, offset within block)
+    m_blk = np.full(M, -1, dtype=np.int64)
+    moff = np.zeros(M)
+    for k, sp in enumerate(m_sp):
+        if len(sp) == 2:
+            m_blk[k] = gop[sp[0]]
+            moff[k] = (poff[sp[0]] + poff[sp[1]]) / 2
+        elif len(sp) == 1:
+            m_blk[k] = gop[sp[0]]
+            moff[k] = poff[sp[0]] + pw[sp[0]] / 2 + SPOUSE_GAP / 2
+            bw[m_blk[k]] = max(bw[m_blk[k]], 2 * abs(moff[k]) + 8)
+
+    # child edges at block level (marriage k -> child person c)
+    e_m = np.array([k for k, kids in enumerate(m_kids) for _ in kids], dtype=np.int64)
+    e_c = np.array([c for kids in m_kids for c in kids], dtype=np.int64)
+    keep = (m_blk[e_m] >= 0) if len(e_m) else np.zeros(0, dtype=bool)
+    e_m, e_c = e_m[keep], e_c[keep]
+    e_pb = m_blk[e_m]           # parent block
+    e_cb = gop[e_c]             # child block
+    fwd = grank[e_pb] < grank[e_cb]
+    e_m, e_c, e_pb, e_cb = e_m[fwd], e_c[fwd], e_pb[fwd], e_cb[fwd]
+
+    R = int(grank.max()) + 1
+    by_rank_child = [np.flatnonzero(grank[e_cb] == r) for r in range(R)]
+    by_rank_parent = [np.flatnonzero(grank[e_pb] == r) for r in range(R)]
+
+    # ---- initial order: DFS from top-rank blocks along child edges ----
+    succ: Dict[int, List[int]] = defaultdict(list)
+    for pb, cb in zip(e_pb.tolist(), e_cb.tolist()):
+        succ[pb].append(cb)
+    visit_ix = np.full(G, -1, dtype=np.int64)
+    counter = 0
+    for g0 in np.argsort(grank, kind="stable"):
+        if visit_ix[g0] >= 0:
+            continue
+        stack = [int(g0)]
+        while stack:
+            g = stack.pop()
+            if visit_ix[g] >= 0:
+                continue
+            visit_ix[g] = counter
+            counter += 1
+            stack.extend(reversed(succ.get(g, ())))
+    ranks: List[np.ndarray] = []
+    bpos = np.zeros(G)   # order index within its rank
+    for r in range(R):
+        blk = np.flatnonzero(grank == r)
+        blk = blk[np.argsort(visit_ix[blk], kind="stable")]
+        ranks.append(blk)
+        bpos[blk] = np.arange(len(blk))
+
+    # fractional slot of a marriage / person inside its block, for barycenters
+    width_norm = np.maximum(bw, 1.0)
+    mfrac = moff / width_norm[np.maximum(m_blk, 0)]
+    pfrac = poff / width_norm[gop]
+
+    def _sort_rank(r: int, own: np.ndarray, other_val: np.ndarray):
+        blk = ranks[r]            # kept sorted by bpos
+        if len(blk) < 2 or not len(own):
+            return
+        loc = bpos[own].astype(np.int64)
+        sums = np.bincount(loc, weights=other_val, minlength=len(blk))
+        cnt = np.bincount(loc, minlength=len(blk))
+        bary = np.where(cnt > 0, sums / np.maximum(cnt, 1), np.arange(len(blk), dtype=float))
+        new = blk[np.argsort(bary, kind="stable")]
+        ranks[r] = new
+        bpos[new] = np.arange(len(new))
+
+    for _ in range(sweeps):
+        for r in range(1, R):
+            ix = by_rank_child[r]
+            _sort_rank(r, e_cb[ix], bpos[e_pb[ix]] + mfrac[e_m[ix]] - pfrac[e_c[ix]])
+        for r in range(R - 2, -1, -1):
+            ix = by_rank_parent[r]
+            _sort_rank(r, e_pb[ix], bpos[e_cb[ix]] + pfrac[e_c[ix]] - mfrac[e_m[ix]])
+
+    # ---- x coordinates ----
+    cx = np.zeros(G)
+    for blk in ranks:
+        if len(blk):
+            w = bw[blk]
+            lefts = np.concatenate(([0.0], np.cumsum(w + BLOCK_GAP)[:-1]))
+            cx[blk] = lefts + w / 2
+
+    def _compact(blk: np.ndarray, want: np.ndarray):
+        """Closest order-preserving non-overlapping placement to `want` (centres)."""
+        w = bw[blk]
+        L = want - w / 2
+        c = np.concatenate(([0.0], np.cumsum(w + BLOCK_GAP)[:-1]))
+        fwd_l = c + np.maximum.accumulate(L - c)
+        bwd_l = c + np.minimum.accumulate((L - c)[::-1])[::-1]
+        # the average of the left- and right-anchored packings is still feasible
+        cx[blk] = (fwd_l + bwd_l) / 2 + w / 2
+
+    def _pass(r: int, idx: np.ndarray, own: np.ndarray, target: np.ndarray):
+        blk = ranks[r]
+        if not len(blk):
+            return
+        n = len(blk)
+        if len(idx):
+            loc = bpos[own].astype(np.int64)
+            sums = np.bincount(loc, weights=target, minlength=n)
+            cnt = np.bincount(loc, minlength=n)
+            want = np.where(cnt > 0, sums / np.maximum(cnt, 1), cx[blk])
+        else:
+            want = cx[blk].copy()
+        _compact(blk, want)
+
+    for _ in range(coord_rounds):
+        for r in range(1, R):
+            ix = by_rank_child[r]
+            _pass(r, ix, e_cb[ix], cx[e_pb[ix]] + moff[e_m[ix]] - poff[e_c[ix]])
+        for r in range(R - 2, -1, -1):
+            ix = by_rank_parent[r]
+            _pass(r, ix, e_pb[ix], cx[e_cb[ix]] + poff[e_c[ix]] - moff[e_m[ix]])
+
+    # ---- y coordinates ----
+    rank_h = np.zeros(R)
+    np.maximum.at(rank_h, grank[gop], ph)
+    tops = MARGIN + np.concatenate(([0.0], np.cumsum(rank_h + RANK_SEP)[:-1]))
+    xs = cx[gop] + poff
+    shift = MARGIN - float((xs - pw / 2).min())
+    xs += shift
+    ys = tops[grank[gop]] + rank_h[grank[gop]] / 2
+
+    for i, pid in enumerate(pids):
+        out.boxes[pid] = (float(xs[i]), float(ys[i]), float(pw[i]), float(ph[i]))
+        out.ranks[pid] = int(grank[gop[i]])
+    for k, mid in enumerate(mids):
+        if m_blk[k] >= 0:
+            r = int(grank[m_blk[k]])
+            out.points[mid] = (float(cx[m_blk[k]] + moff[k] + shift), float(tops[r] + rank_h[r] / 2))
+        elif m_kids[k]:
+            kx = xs[m_kids[k]]
+            r = int(grank[gop[m_kids[k][0]]])
+            out.points[mid] = (float(kx.mean()), float(tops[r] - RANK_SEP / 2))
+    out.width = float((xs + pw / 2).max()) + MARGIN
+    out.height = float(tops[-1] + rank_h[-1]) + MARGIN
+    out.rank_tops = tops
+    out.rank_heights = rank_h
+    return out
+
+
+def _fill(p: Dict[str, Any]) -> Tuple[str, bool, bool]:
+    """(fill colour, rounded?, dashed?) using the same palette as render_graph."""
+    gender = p.get("gender", "")
+    if gender == "男":
+        fill, rounded = "#E6F2FF", False
+    elif gender == "女":
+        fill, rounded = "#FFE6E6", True
+    else:
+        fill, rounded = "white", True
+    if p.get("deceased", False):
+        fill = "#E0E0E0"
+    dashed = False
+    if p.get("summary") is not None:
+        fill, rounded, dashed = "white", True, True
+    return fill, rounded, dashed
+
+
+def tree_primitives(tree: dict, lay: LayeredLayout) -> Iterator[tuple]:
+    """Drawing ops in layout px (y down), shared by the SVG, PDF and PNG writers.
+
+    ("line", x1, y1, x2, y2, dashed)              — all lines come first
+    ("dot", x, y)
+    ("box", x0, y0, w, h, rounded, fill, stroke_w, dashed)
+    ("text", x, baseline_y, text, color)          — horizontally centred
+    """
+    persons = tree.get("persons", {})
+    marriages = tree.get("marriages", {})
+
+    # spouse lines and child buses
+    bus_slot: Dict[int, int] = defaultdict(int)
+    for mid, m in marriages.items():
+        pt = lay.points.get(mid)
+        if pt is None:
+            continue
+        mx, my = pt
+        order = [s for s in (m.get("order") or m.get("spouses", [])) if s in lay.boxes][:2]
+        divorced = bool(m.get("divorced", False))
+        if len(order) == 2:
+            (ax, ay, aw, _), (bx, _, bw_, _) = lay.boxes[order[0]], lay.boxes[order[1]]
+            if ax > bx:
+                ax, aw, bx, bw_ = bx, bw_, ax, aw
+            yield ("line", ax + aw / 2, ay, bx - bw_ / 2, ay, divorced)
+        elif len(order) == 1:
+            ax, ay, aw, _ = lay.boxes[order[0]]
+            yield ("line", ax + aw / 2, ay, mx, my, False)
+        kids = [lay.boxes[c] for c in m.get("children", []) if c in lay.boxes]
+        kids = [k for k in kids if k[1] > my]
+        if not kids:
+            continue
+        r = lay.ranks.get(order[0]) if order else None
+        top_kid = min(k[1] - k[3] / 2 for k in kids)
+        slot = bus_slot[r] if r is not None else 0
+        if r is not None:
+            bus_slot[r] += 1
+        bus_y = top_kid - RANK_SEP / 2 + (slot % 5 - 2) * 4
+        xs = [k[0] for k in kids]
+        yield ("line", mx, my, mx, bus_y, False)
+        lo, hi = min(xs + [mx]), max(xs + [mx])
+        if hi > lo:
+            yield ("line", lo, bus_y, hi, bus_y, False)
+        for kx, ky, _, kh in kids:
+            yield ("line", kx, bus_y, kx, ky - kh / 2, False)
+
+    for mx, my in lay.points.values():
+        yield ("dot", mx, my)
+
+    for pid, (x, y, w, h) in lay.boxes.items():
+        p = persons[pid]
+        fill, rounded, dashed = _fill(p)
+        yield ("box", x - w / 2, y - h / 2, w, h, rounded, fill, 2.5 if p.get("focus") else 1, dashed)
+        lines = _label_lines(p, pid)
+        y0 = y - LINE_H * (len(lines) - 1) / 2 + FONT_PX * 0.35
+        color = "#6b7280" if p.get("summary") is not None else "black"
+        for i, line in enumerate(lines):
+            yield ("text", x, y0 + i * LINE_H, line, color)
+
+
+def primitive_bbox(op: tuple) -> Tuple[float, float, float, float]:
+    """(x0, y0, x1, y1) of a drawing op, generous for text."""
+    kind = op[0]
+    if kind == "line":
+        _, x1, y1, x2, y2, _ = op
+        return min(x1, x2) - 2, min(y1, y2) - 2, max(x1, x2) + 2, max(y1, y2) + 2
+    if kind == "dot":
+        return op[1] - 3, op[2] - 3, op[1] + 3, op[2] + 3
+    if kind == "box":
+        return op[1] - 2, op[2] - 2, op[1] + op[3] + 2, op[2] + op[4] + 2
+    half = _text_w(op[3]) / 2
+    return op[1] - half, op[2] - FONT_PX, op[1] + half, op[2] + 4
+
+
+def svg_element(op: tuple) -> str:
+    kind = op[0]
+    if kind == "line":
+        _, x1, y1, x2, y2, dashed = op
+        dash = ' stroke-dasharray="6,4"' if dashed else ""
+        return f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}"{dash}/>'
+    if kind == "dot":
+        return f'<circle cx="{op[1]:.1f}" cy="{op[2]:.1f}" r="2.5" fill="black"/>'
+    if kind == "box":
+        _, x0, y0, w, h, rounded, fill, sw, dashed = op
+        rx = ' rx="8"' if rounded else ""
+        dash = ' stroke-dasharray="4,3"' if dashed else ""
+        return (f'<rect x="{x0:.1f}" y="{y0:.1f}" width="{w:.1f}" height="{h:.1f}"{rx} '
+                f'fill="{fill}" stroke="black" stroke-width="{sw}"{dash}/>')
+    _, x, y, text, color = op
+    fill = f' fill="{color}"' if color != "black" else ""
+    return f'<text x="{x:.1f}" y="{y:.1f}" text-anchor="middle"{fill}>{escape(text)}</text>'
+
+
+def svg_document(ops: Iterable[tuple], width: float, height: float,
+                 view: Optional[Tuple[float, float, float, float]] = None) -> bytes:
+    """Serialize ops; `view` = (x, y, w, h) crops to a region (used for page tiles)."""
+    vx, vy, vw, vh = view or (0.0, 0.0, width, height)
+    parts: List[str] = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{vw:.0f}" height="{vh:.0f}" '
+        f'viewBox="{vx:.1f} {vy:.1f} {vw:.1f} {vh:.1f}" font-family="Noto Sans TC, PingFang TC, '
+        f'Microsoft JhengHei, sans-serif" font-size="{FONT_PX}">',
+        '<g stroke="black" stroke-width="2" fill="none">',
+    ]
+    in_lines = True
+    for op in ops:
+        if in_lines and op[0] != "line":
+            parts.append("</g>")
+            in_lines = False
+        parts.append(svg_element(op))
+    if in_lines:
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "\n".join(parts).encode("utf-8")
+
+
+def layered_svg(tree: dict, layout: Optional[LayeredLayout] = None) -> bytes:
+    """Draw `tree` with the built-in layout; returns UTF-8 SVG bytes."""
+    lay = layout or layered_layout(tree)
+    return svg_document(tree_primitives(tree, lay), lay.width, lay.height)
@@ -0,0 +1,111 @@
+# familytree/layout_reuse.py — reuse node coordinates across style-only edits
+#
+# A full `dot` layout runs only when the *structure* of the tree changes (who exists,
+# who is married to whom, who is whose child, and the rough size of each label).
+# Toggling deceased/divorced or editing a short note keeps the structure key, so the
+# cached coordinates are pinned onto the restyled graph and drawn with `neato -n`,
+# which skips layout entirely.
+
+import hashlib
+import json
+import math
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from familytree.gv_pool import get_pool
+from familytree.render import Positions, render_graph
+from familytree.render_cache import render_svg
+
+
+def _label_width(text: str) -> int:
+    # East-Asian wide chars take two columns in the rendered label
+    return sum(2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in text)
+
+
+def _size_bucket(p: Dict[str, Any], pid: str) -> str:
+    lines = [p.get("name", pid)] + ([p["note"]] if p.get("note") else [])
+    w = max(_label_width(x) for x in lines)
+    # coarse buckets: a few characters more or less does not force a relayout
+    return f"{len(lines)}x{math.ceil(w / 6)}"
+
+
+def structure_key(tree: dict) -> str:
+    """Hash of everything that affects node placement, and nothing that only affects style."""
+    persons = tree.get("persons", {})
+    marriages = tree.get("marriages", {})
+    h = hashlib.sha1()
+    for pid, p in persons.items():
+        h.update(f"P{pid}:{_size_bucket(p, pid)};".encode("utf-8"))
+    for mid, m in marriages.items():
+        order = m.get("order") or m.get("spouses", [])
+        if len(order) != 2:
+            order = m.get("spouses", [])[:2]
+        kids = [c for c in m.get("children", []) if c in persons]
+        h.update(f"M{mid}:{','.join(order)}>{','.join(kids)};".encode("utf-8"))
+    return h.hexdigest()
+
+
+def parse_positions(layout_json: bytes) -> Positions:
+    """Node name -> (x, y) in points from Graphviz `-Tjson0` output."""
+    data = json.loads(layout_json)
+    out: Positions = {}
+    for obj in data.get("objects", []):
+        pos = obj.get("pos")
+        if pos and "name" in obj:
+            x, y = pos.split(",")[:2]
+            out[obj["name"]] = (float(x), float(y))
+    return out
+
+
+class LayoutStore:
+    """Process-wide LRU: structure key -> node positions of the last full layout."""
+
+    def __init__(self, max_items: int = 64):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, Positions]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.full_layouts = 0
+        self.restyles = 0
+
+    def get(self, key: str) -> Optional[Positions]:
+        with self._lock:
+            pos = self._data.get(key)
+            if pos is not None:
+                self._data.move_to_end(key)
+            return pos
+
+    def put(self, key: str, positions: Positions):
+        with self._lock:
+            self._data[key] = positions
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+
+_STORE = LayoutStore()
+
+
+def get_store() -> LayoutStore:
+    return _STORE
+
+
+def full_layout(tree: dict, lean: bool = False) -> Positions:
+    """Run `dot` once and return the coordinates of every node."""
+    return parse_positions(get_pool().run(render_graph(tree, lean=lean).source, fmt="json0"))
+
+
+def render_tree_svg(tree: dict, store: Optional[LayoutStore] = None, lean: bool = False) -> bytes:
+    """SVG for `tree`, running `dot` only when its structure key is new."""
+    store = store or _STORE
+    key = ("lean:" if lean else "") + structure_key(tree)
+    positions = store.get(key)
+    if positions is None:
+        positions = full_layout(tree, lean)
+        store.put(key, positions)
+        store.full_layouts += 1
+    else:
+        store.restyles += 1
+    g = render_graph(tree, positions=positions, lean=lean)
+    return render_svg(g.source, engine="neato", neato_no_op=1)
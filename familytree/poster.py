@@ -0,0 +1,257 @@
+# familytree/poster.py — multi-page tiled export of the family tree for poster printing
+#
+# The tree is laid out once (built-in layered engine), turned into drawing ops, and
+# each op is bucketed into the page tiles it touches. Pages are then written one at a
+# time — PDF pages as vector paths/text under the branded header/footer, SVG/PNG
+# tiles as separate files streamed into a zip — so per-page work only touches that
+# page's ops. Adjacent tiles overlap by `overlap_mm`; registration marks at the
+# content corners and dashed trim lines at the overlap edges help align the prints.
+
+import io
+import math
+import os
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A3, A4, landscape as _landscape
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from familytree.layered import (FONT_PX, LayeredLayout, layered_layout, primitive_bbox,
+                                svg_document, tree_primitives)
+from utils.pdf_utils import FONT_NAME, _FONT_PATH, _draw_header_footer
+
+PAPERS = {"A4": A4, "A3": A3}
+HEADER_MM, FOOTER_MM, SIDE_MM = 24, 16, 10   # keep clear of the branded bands
+
+
+class _Page:
+    """Stand-in for a doc template: _draw_header_footer only reads `pagesize`."""
+
+    def __init__(self, pagesize):
+        self.pagesize = pagesize
+
+
+class TileGrid:
+    """Page tiles over a layout, in layout px, with overlap between neighbours."""
+
+    def __init__(self, width_px: float, height_px: float, tile_w_px: float, tile_h_px: float,
+                 overlap_px: float):
+        self.tile_w, self.tile_h = tile_w_px, tile_h_px
+        self.step_x = max(1.0, tile_w_px - overlap_px)
+        self.step_y = max(1.0, tile_h_px - overlap_px)
+        self.overlap = overlap_px
+        self.cols = max(1, math.ceil((width_px - overlap_px) / self.step_x))
+        self.rows = max(1, math.ceil((height_px - overlap_px) / self.step_y))
+
+    def __len__(self) -> int:
+        return self.rows * self.cols
+
+    def origin(self, r: int, c: int) -> Tuple[float, float]:
+        return c * self.step_x, r * self.step_y
+
+    def bucket(self, ops: List[tuple]) -> Dict[Tuple[int, int], List[int]]:
+        """Indices of the ops touching each tile (one pass over the ops)."""
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, op in enumerate(ops):
+            x0, y0, x1, y1 = primitive_bbox(op)
+            c_lo = max(0, math.ceil((x0 - self.tile_w) / self.step_x))
+            c_hi = min(self.cols - 1, math.floor(x1 / self.step_x))
+            r_lo = max(0, math.ceil((y0 - self.tile_h) / self.step_y))
+            r_hi = min(self.rows - 1, math.floor(y1 / self.step_y))
+            for r in range(r_lo, r_hi + 1):
+                for c in range(c_lo, c_hi + 1):
+                    buckets.setdefault((r, c), []).append(i)
+        return buckets
+
+
+def _prepare(tree: dict, layout: Optional[LayeredLayout]) -> Tuple[LayeredLayout, List[tuple]]:
+    lay = layout or layered_layout(tree)
+    return lay, list(tree_primitives(tree, lay))
+
+
+def _content_box(pagesize) -> Tuple[float, float, float, float]:
+    pw, ph = pagesize
+    return SIDE_MM * mm, FOOTER_MM * mm, pw - 2 * SIDE_MM * mm, ph - (HEADER_MM + FOOTER_MM) * mm
+
+
+# ----------------------------- PDF -----------------------------
+
+def _registration_mark(c: canvas.Canvas, x: float, y: float, r: float = 3 * mm):
+    c.circle(x, y, r * 0.6, stroke=1, fill=0)
+    c.line(x - r, y, x + r, y)
+    c.line(x, y - r, x, y + r)
+
+
+def _draw_op_pdf(c: canvas.Canvas, op: tuple, font_size: float):
+    kind = op[0]
+    if kind == "line":
+        _, x1, y1, x2, y2, dashed = op
+        c.setDash(6, 4) if dashed else c.setDash()
+        c.line(x1, y1, x2, y2)
+    elif kind == "dot":
+        c.setDash()
+        c.circle(op[1], op[2], 2.5, stroke=0, fill=1)
+    elif kind == "box":
+        _, x0, y0, w, h, rounded, fill, sw, dashed = op
+        c.saveState()
+        c.setLineWidth(sw)
+        c.setDash(4, 3) if dashed else c.setDash()
+        c.setFillColor(colors.white if fill == "white" else colors.HexColor(fill))
+        if rounded:
+            c.roundRect(x0, y0, w, h, 8, stroke=1, fill=1)
+        else:
+            c.rect(x0, y0, w, h, stroke=1, fill=1)
+        c.restoreState()
+    else:
+        _, x, y, text, color = op
+        c.saveState()
+        c.setFillColor(colors.black if color == "black" else colors.HexColor(color))
+        c.translate(x, y)
+        c.scale(1, -1)   # the page transform flips y; keep glyphs upright
+        c.setFont(FONT_NAME, font_size)
+        c.drawCentredString(0, 0, text)
+        c.restoreState()
+
+
+def export_pdf(tree: dict, out: BinaryIO, paper: str = "A3", landscape: bool = True,
+               scale: float = 0.75, overlap_mm: float = 10, title: str = "家族樹",
+               layout: Optional[LayeredLayout] = None) -> int:
+    """Write a tiled vector PDF to `out`; returns the page count.
+
+    `scale` is PDF points per layout px (0.75 → 12px labels print at 9pt).
+    """
+    pagesize = PAPERS[paper]
+    pagesize = _landscape(pagesize) if landscape else pagesize
+    cx, cy, cw, ch = _content_box(pagesize)
+    lay, ops = _prepare(tree, layout)
+    grid = TileGrid(lay.width, lay.height, cw / scale, ch / scale, overlap_mm * mm / scale)
+    buckets = grid.bucket(ops)
+    page = _Page(pagesize)
+
+    c = canvas.Canvas(out, pagesize=pagesize, pageCompression=1)
+    c.setTitle(title)
+    n = len(grid)
+    for r in range(grid.rows):
+        for col in range(grid.cols):
+            _draw_header_footer(c, page)
+            tx, ty = grid.origin(r, col)
+            c.saveState()
+            clip = c.beginPath()
+            clip.rect(cx, cy, cw, ch)
+            c.clipPath(clip, stroke=0, fill=0)
+            # layout px (y down) -> page points (y up) for this tile
+            c.translate(cx - tx * scale, cy + ch + ty * scale)
+            c.scale(scale, -scale)
+            c.setStrokeColor(colors.black)
+            c.setFillColor(colors.black)
+            c.setLineWidth(2)
+            for i in buckets.get((r, col), ()):
+                _draw_op_pdf(c, ops[i], FONT_PX)
+            c.restoreState()
+
+            # trim lines where the neighbours' content starts, and corner marks
+            ov = overlap_mm * mm
+            c.saveState()
+            c.setStrokeColor(colors.HexColor("#9ca3af"))
+            c.setLineWidth(0.4)
+            c.setDash(2, 2)
+            if col > 0:
+                c.line(cx + ov, cy, cx + ov, cy + ch)
+            if r > 0:
+                c.line(cx, cy + ch - ov, cx + cw, cy + ch - ov)
+            c.setDash()
+            for mx_, my_ in ((cx, cy), (cx + cw, cy), (cx, cy + ch), (cx + cw, cy + ch)):
+                _registration_mark(c, mx_, my_)
+            c.setFont(FONT_NAME, 8)
+            c.setFillColor(colors.HexColor("#6b7280"))
+            c.drawRightString(cx + cw, cy - 5 * mm,
+                              f"{title}｜第 {r + 1} 列・第 {col + 1} 欄（{r * grid.cols + col + 1}/{n}）")
+            c.restoreState()
+            c.showPage()
+    c.save()
+    return n
+
+
+def export_pdf_bytes(tree: dict, **kw) -> bytes:
+    buf = io.BytesIO()
+    export_pdf(tree, buf, **kw)
+    return buf.getvalue()
+
+
+# ----------------------------- SVG / PNG tiles -----------------------------
+
+def _tiles(tree: dict, tile_w: float, tile_h: float, overlap: float,
+           layout: Optional[LayeredLayout]) -> Iterator[Tuple[int, int, float, float, List[tuple]]]:
+    lay, ops = _prepare(tree, layout)
+    grid = TileGrid(lay.width, lay.height, tile_w, tile_h, overlap)
+    buckets = grid.bucket(ops)
+    for r in range(grid.rows):
+        for c in range(grid.cols):
+            tx, ty = grid.origin(r, c)
+            yield r, c, tx, ty, [ops[i] for i in buckets.get((r, c), ())]
+
+
+def export_svg_tiles(tree: dict, out: BinaryIO, tile_w: float = 1600, tile_h: float = 1100,
+                     overlap: float = 40, layout: Optional[LayeredLayout] = None) -> int:
+    """Zip of vector SVG tiles (tile size in layout px); returns the tile count."""
+    n = 0
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for r, c, tx, ty, ops in _tiles(tree, tile_w, tile_h, overlap, layout):
+            svg = svg_document(ops, tile_w, tile_h, view=(tx, ty, tile_w, tile_h))
+            zf.writestr(f"family_tree_r{r + 1:02d}_c{c + 1:02d}.svg", svg)
+            n += 1
+    return n
+
+
+def _png_font(size: int):
+    from PIL import ImageFont
+    try:
+        if os.path.isfile(_FONT_PATH):
+            return ImageFont.truetype(_FONT_PATH, size)
+    except OSError:
+        pass
+    return ImageFont.load_default()
+
+
+def export_png_tiles(tree: dict, out: BinaryIO, tile_w: float = 1600, tile_h: float = 1100,
+                     overlap: float = 40, dpi_scale: float = 2.0,
+                     layout: Optional[LayeredLayout] = None) -> int:
+    """Zip of raster PNG tiles at `dpi_scale` × layout px; returns the tile count."""
+    from PIL import Image, ImageDraw
+
+    s = dpi_scale
+    font = _png_font(int(FONT_PX * s))
+    n = 0
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+        for r, c, tx, ty, ops in _tiles(tree, tile_w, tile_h, overlap, layout):
+            img = Image.new("RGB", (int(tile_w * s), int(tile_h * s)), "white")
+            d = ImageDraw.Draw(img)
+
+            def P(x, y):
+                return (x - tx) * s, (y - ty) * s
+
+            for op in ops:
+                kind = op[0]
+                if kind == "line":
+                    d.line([P(op[1], op[2]), P(op[3], op[4])], fill="black", width=max(1, int(2 * s)))
+                elif kind == "dot":
+                    x, y = P(op[1], op[2])
+                    d.ellipse([x - 2.5 * s, y - 2.5 * s, x + 2.5 * s, y + 2.5 * s], fill="black")
+                elif kind == "box":
+                    _, x0, y0, w, h, rounded, fill, sw, _ = op
+                    box = [P(x0, y0), P(x0 + w, y0 + h)]
+                    width = max(1, int(sw * s))
+                    if rounded:
+                        d.rounded_rectangle(box, radius=8 * s, fill=fill, outline="black", width=width)
+                    else:
+                        d.rectangle(box, fill=fill, outline="black", width=width)
+                else:
+                    _, x, y, text, color = op
+                    d.text(P(x, y), text, fill=color, font=font, anchor="ms")
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", optimize=True)
+            zf.writestr(f"family_tree_r{r + 1:02d}_c{c + 1:02d}.png", buf.getvalue())
+            n += 1
+    return n
@@ -0,0 +1,189 @@
+# familytree/render.py — DOT emission for the family tree (straight spouse line,
+# centred child junction, deceased/gender styling)
+
+from typing import Any, Dict, Optional, Tuple
+import graphviz
+
+Positions = Dict[str, Tuple[float, float]]
+
+def _pin(positions: Optional[Positions], name: str) -> Dict[str, str]:
+    # pos in points, consumed by `neato -n` (see familytree.layout_reuse)
+    if not positions or name not in positions:
+        return {}
+    x, y = positions[name]
+    return {"pos": f"{x:.2f},{y:.2f}"}
+
+# version comparison: status -> (fill, or None = keep, border)
+_HIGHLIGHT = {"added": ("#DCFCE7", "#16A34A"), "removed": ("#FEE2E2", "#DC2626"),
+              "modified": (None, "#D97706")}
+
+def render_graph(tree: dict, positions: Optional[Positions] = None, lean: bool = False,
+                 degraded: bool = False, generations: Optional[Dict[str, int]] = None,
+                 highlight: Optional[Dict[str, str]] = None) -> graphviz.Digraph:
+    """Build the tree Digraph. With `positions`, every node carries a pinned `pos`.
+
+    `lean=True` uses the low-constraint emitter (see _emit_lean); default is the
+    original cluster-per-marriage emitter. `degraded=True` is the fallback used when
+    a layout ran out of time: lean emitter plus capped dot iterations.
+    `generations` (pid -> generation, familytree.generations) adds one rank=same
+    group per generation, so dot starts from the final ranking instead of searching
+    for it. `highlight` (pid -> "added" / "removed" / "modified", see
+    familytree.versions.highlight_map) colours those persons for version comparison.
+    """
+    g = graphviz.Digraph("G", engine="dot")
+    g.attr(rankdir="TB", splines="line", nodesep="0.5", ranksep="0.9")
+    if generations:
+        g.attr(newrank="true")
+    if degraded:
+        lean = True
+        g.attr(nslimit="2", nslimit1="2", mclimit="0.2", searchsize="10", remincross="false")
+    g.attr("edge", dir="none", penwidth="2")
+
+    persons: Dict[str, Dict[str, Any]] = tree.get("persons", {})
+    marriages = tree.get("marriages", {})
+
+    # Person nodes with color/shape logic (deceased overrides only the fillcolor)
+    for pid, p in persons.items():
+        name = p.get("name", pid)
+        note = p.get("note")
+        deceased = p.get("deceased", False)
+        gender = p.get("gender", "")
+        label = name + (f"\n{note}" if note else "")
+
+        # base style by gender
+        if gender == "男":
+            shape = "box";         style = "filled";          fillcolor = "#E6F2FF"
+        elif gender == "女":
+            shape = "box";         style = "rounded,filled";  fillcolor = "#FFE6E6"
+        else:
+            shape = "box";         style = "rounded,filled";  fillcolor = "white"
+
+        # deceased: keep shape/style (so females stay rounded), just change fill
+        if deceased:
+            fillcolor = "#E0E0E0"
+
+        extra = {}
+        if p.get("summary") is not None:
+            # "+N" node standing in for a folded branch (familytree.viewport)
+            style = "rounded,dashed"; fillcolor = "white"; extra = {"fontcolor": "#6b7280"}
+        elif p.get("focus"):
+            extra = {"penwidth": "2.5"}
+        mark = highlight.get(pid) if highlight else None
+        if mark in _HIGHLIGHT:
+            fill, color = _HIGHLIGHT[mark]
+            fillcolor = fill or fillcolor
+            extra = {"color": color, "penwidth": "2.5"}
+            if mark == "removed":
+                style += ",dashed"
+
+        g.node(pid, label=label, shape=shape, style=style,
+               fillcolor=fillcolor, fontsize="11", **extra, **_pin(positions, pid))
+
+    gens = {pid: generations[pid] for pid in persons if pid in generations} if generations else None
+    (_emit_lean if lean else _emit_classic)(g, persons, marriages, positions, gens)
+    if gens:
+        _emit_generation_ranks(g, persons, marriages, gens, lean)
+    return g
+
+def _generation_of_marriage(m: Dict[str, Any], gens: Dict[str, int]) -> Optional[int]:
+    levels = [gens[s] for s in m.get("spouses", []) if s in gens]
+    return max(levels) if levels else None
+
+def _emit_generation_ranks(g: graphviz.Digraph, persons: Dict[str, Any], marriages: Dict[str, Any],
+                           gens: Dict[str, int], lean: bool):
+    """One rank=same group per generation (persons, plus marriage points in lean mode)."""
+    levels: Dict[int, list] = {}
+    for pid in persons:
+        if pid in gens:
+            levels.setdefault(gens[pid], []).append(pid)
+    if lean:
+        # the lean emitter's per-marriage groups are folded into these
+        for mid, m in marriages.items():
+            lv = _generation_of_marriage(m, gens)
+            if lv is not None:
+                levels[lv].append(mid)
+    for lv in sorted(levels):
+        with g.subgraph(name=f"gen_{lv}") as sg:
+            sg.attr(rank="same")
+            for x in levels[lv]:
+                sg.node(x)
+
+def _emit_classic(g: graphviz.Digraph, persons: Dict[str, Any], marriages: Dict[str, Any],
+                  positions: Optional[Positions], gens: Optional[Dict[str, int]] = None):
+    """Original emitter: invisible cluster + high-weight edges per marriage, junction per family."""
+    # Marriage mid points — tiny visible dot
+    for mid in marriages.keys():
+        g.node(mid, label="", shape="point", width="0.03", color="black", **_pin(positions, mid))
+
+    # Spouse line (one straight segment), with mid centered by invisible constraints
+    for mid, m in marriages.items():
+        order = m.get("order") or m.get("spouses", [])
+        if len(order) != 2:
+            order = m.get("spouses", [])[:2]
+        divorced = m.get("divorced", False)
+
+        if len(order) == 2:
+            s1, s2 = order
+            with g.subgraph(name=f"cluster_{mid}") as sg:
+                sg.attr(rank="same", color="invis", style="invis", newrank="true")
+                sg.node(s1); sg.node(mid); sg.node(s2)
+                sg.edge(s1, mid, style="invis", constraint="true", weight="50000", minlen="0")
+                sg.edge(mid, s2, style="invis", constraint="true", weight="50000", minlen="0")
+            ls = "dashed" if divorced else "solid"
+            g.edge(s1, s2, style=ls, constraint="true", weight="1800", minlen="0")
+
+        elif len(order) == 1:
+            s1 = order[0]
+            with g.subgraph(name=f"cluster_{mid}") as sg:
+                sg.attr(rank="same", color="invis", style="invis", newrank="true")
+                sg.node(s1); sg.node(mid)
+                sg.edge(s1, mid, style="invis", constraint="true", weight="40000", minlen="0")
+            g.edge(s1, mid, style="solid", constraint="true", weight="1800", minlen="0")
+
+    # Children downward
+    for mid, m in marriages.items():
+        children = [c for c in m.get("children", []) if c in persons]
+        if not children:
+            continue
+        jn = f"{mid}_d"
+        g.node(jn, label="", shape="point", width="0.04", color="black", **_pin(positions, jn))
+        g.edge(mid, jn, style="solid", weight="1200", minlen="1", constraint="true")
+        for c in children:
+            g.edge(jn, c, style="solid", weight="900", minlen="1", constraint="true")
+
+def _emit_lean(g: graphviz.Digraph, persons: Dict[str, Any], marriages: Dict[str, Any],
+               positions: Optional[Positions], gens: Optional[Dict[str, int]] = None):
+    """Same picture with far fewer constraints for dot's network simplex.
+
+    Per marriage: one anonymous rank=same group (no cluster), the spouse line drawn as
+    two flat edges through the marriage point (which keeps it centred), and `group`
+    on the point/junction so the child stem stays vertical. Single children hang off
+    the point directly; the junction node is only emitted for two or more children.
+    """
+    for mid, m in marriages.items():
+        order = m.get("order") or m.get("spouses", [])
+        if len(order) != 2:
+            order = m.get("spouses", [])[:2]
+        ls = "dashed" if m.get("divorced", False) else "solid"
+        g.node(mid, label="", shape="point", width="0.03", color="black", group=mid,
+               **_pin(positions, mid))
+        if order and (gens is None or _generation_of_marriage(m, gens) is None):
+            with g.subgraph() as sg:
+                sg.attr(rank="same")
+                for x in [order[0], mid] + order[1:]:
+                    sg.node(x)
+            g.edge(order[0], mid, style=ls if len(order) == 2 else "solid", weight="100")
+            if len(order) == 2:
+                g.edge(mid, order[1], style=ls, weight="100")
+
+        children = [c for c in m.get("children", []) if c in persons]
+        if len(children) == 1:
+            g.edge(mid, children[0], minlen="2", weight="10")
+        elif children:
+            jn = f"{mid}_d"
+            g.node(jn, label="", shape="point", width="0.04", color="black", group=mid,
+                   **_pin(positions, jn))
+            g.edge(mid, jn, minlen="1")
+            for c in children:
+                g.edge(jn, c, minlen="1")
+
@@ -0,0 +1,196 @@
+# familytree/render_cache.py — server-side Graphviz rendering with a content-addressed SVG cache
+#
+# Key = sha256(engine + format + DOT source). Hits are served from an in-process LRU
+# (shared by all sessions); misses fall back to the on-disk copy, and only then run
+# Graphviz. Disk entries survive restarts, so a redeploy does not re-layout every tree.
+# The disk tier is opt-in (SVG_DISK_CACHE=1): the drawings carry member names, and
+# by default nothing a user enters outlives the server process.
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from familytree.gv_pool import get_pool
+
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+CACHE_DIR = os.path.join(DATA_DIR, "tree_svg") if os.environ.get("SVG_DISK_CACHE") == "1" else None
+
+
+def dot_digest(source: str, engine: str = "dot", fmt: str = "svg") -> str:
+    h = hashlib.sha256()
+    h.update(f"{engine}\0{fmt}\0".encode("utf-8"))
+    h.update(source.encode("utf-8"))
+    return h.hexdigest()
+
+
+class SvgCache:
+    """Thread-safe LRU (bounded by item count and bytes) with a disk tier."""
+
+    def __init__(self, max_items: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = CACHE_DIR, disk_max_files: int = 2000):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_files = disk_max_files
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        self._disk_files: Optional[int] = None   # counted on the first write (the directory is made lazily)
+
+    # ---------- memory tier ----------
+    def _mem_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+            return data
+
+    def _mem_put(self, key: str, data: bytes):
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._mem[key] = data
+            self._bytes += len(data)
+            while self._mem and (len(self._mem) > self.max_items or self._bytes > self.max_bytes):
+                _, ev = self._mem.popitem(last=False)
+                self._bytes -= len(ev)
+
+    # ---------- disk tier ----------
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.disk_dir, f"{key[:2]}", f"{key}.{fmt}")
+
+    def _disk_get(self, key: str, fmt: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key, fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # keep recently used files out of pruning
+            return data
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, fmt: str, data: bytes):
+        if not self.disk_dir:
+            return
+        path = self._path(key, fmt)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            new = not os.path.exists(path)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)  # atomic: concurrent readers never see half a file
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_files is None:
+                self._disk_files = len(self._scan_disk())
+            elif new:
+                self._disk_files += 1
+            if self._disk_files <= self.disk_max_files:
+                return
+        self._prune_disk()
+
+    def _scan_disk(self) -> List[Tuple[float, str]]:
+        # (mtime, path); files another session removes mid-scan are skipped
+        out: List[Tuple[float, str]] = []
+        try:
+            subdirs = [e.path for e in os.scandir(self.disk_dir) if e.is_dir()]
+        except OSError:
+            return out
+        for d in subdirs:
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.name.endswith(".tmp"):
+                            continue
+                        try:
+                            out.append((e.stat().st_mtime, e.path))
+                        except OSError:
+                            pass
+            except OSError:
+                pass
+        return out
+
+    def _prune_disk(self):
+        # down to 90% of the cap, so the next few writes don't each rescan the directory
+        files = sorted(self._scan_disk())
+        excess = len(files) - self.disk_max_files * 9 // 10
+        for _, p in files[:max(0, excess)]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_files = min(len(files), self.disk_max_files * 9 // 10)
+
+    # ---------- public ----------
+    def get(self, key: str, fmt: str = "svg") -> Optional[bytes]:
+        data = self._mem_get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        data = self._disk_get(key, fmt)
+        if data is not None:
+            self.disk_hits += 1
+            self._mem_put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes, fmt: str = "svg"):
+        self._mem_put(key, data)
+        self._disk_put(key, fmt, data)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+
+
+_CACHE = SvgCache()
+_INFLIGHT: dict = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def get_cache() -> SvgCache:
+    return _CACHE
+
+
+def render_svg(source: str, engine: str = "dot", cache: Optional[SvgCache] = None,
+               neato_no_op: int = 0, timeout: Optional[float] = None,
+               owner: Optional[str] = None) -> bytes:
+    """Render DOT source to SVG once per distinct (engine, source).
+
+    `neato_no_op=1` runs `neato -n`, i.e. draws pinned `pos` coordinates without layout.
+
+    Concurrent sessions asking for the same digest wait on a single Graphviz run,
+    which goes through the shared worker pool (familytree.gv_pool). Raises
+    graphviz.ExecutableNotFound when the binary is missing, and LayoutTimeout /
+    PoolBusy / CancelledError from the pool.
+    """
+    cache = cache or _CACHE
+    key = dot_digest(source, f"{engine}-n{neato_no_op}" if neato_no_op else engine, "svg")
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    with _INFLIGHT_LOCK:
+        lock = _INFLIGHT.setdefault(key, threading.Lock())
+    with lock:
+        data = cache.get(key)
+        if data is None:
+            cache.misses += 1
+            try:
+                data = get_pool().run(source, engine=engine, fmt="svg", neato_no_op=neato_no_op,
+                                      timeout=timeout, owner=owner)
+            finally:
+                with _INFLIGHT_LOCK:
+                    _INFLIGHT.pop(key, None)
+            cache.put(key, data)
+    return data
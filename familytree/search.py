@@ -0,0 +1,197 @@
+# familytree/search.py — typeahead person search over a live FamilyGraph
+#
+# Selectors that list every person send thousands of options to the browser on each
+# rerun. SearchIndex answers a typed query with a ranked page of pids instead:
+#   trie      prefixes of each person's keys: folded name (see dedupe.fold_name, so
+#             simplified / traditional and stray spaces match), and when pypinyin is
+#             installed the toneless pinyin ("wangdaming"), its initials ("wdm")
+#             and zhuyin without tone marks ("ㄨㄤㄉㄚㄇㄧㄥ")
+#   n-grams   character bigrams (and single characters) of the folded name and
+#             note, for matches in the middle of a name or in a note
+# Ranking: exact name, name prefix, pinyin / zhuyin prefix, name substring, note
+# substring; then shorter names, then insertion order.
+#
+# Like Generations, edits only mark the touched persons dirty (FamilyGraph
+# listener); they are re-indexed on the next query, so nothing is rebuilt per rerun.
+
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from familytree.dedupe import fold_name
+from familytree.graph import FamilyGraph
+
+try:  # pinyin / zhuyin keys when available; Han and Latin text work without it
+    from pypinyin import Style, lazy_pinyin
+except Exception:
+    lazy_pinyin = None
+
+MAX_RESULTS = 500
+_TONES = str.maketrans("", "", "ˉˊˇˋ˙")
+
+# rank of a match kind (lower first)
+EXACT, PREFIX, PHONETIC, SUBSTRING, NOTE = range(5)
+
+
+@lru_cache(maxsize=None)
+def _char_phonetic(ch: str) -> Tuple[str, str]:
+    # per character: names draw on a few thousand characters, so this is a small cache
+    py = lazy_pinyin(ch, errors="ignore")
+    zy = lazy_pinyin(ch, style=Style.BOPOMOFO, errors="ignore")
+    return (py[0].casefold() if py else ""), ("".join(zy).translate(_TONES))
+
+
+def phonetic_keys(name: str) -> Tuple[str, ...]:
+    """Toneless pinyin, pinyin initials and zhuyin of the Han characters in `name`."""
+    if lazy_pinyin is None:
+        return ()
+    parts = [_char_phonetic(ch) for ch in name if "㐀" <= ch <= "鿿"]
+    syll = [py for py, _ in parts if py]
+    if not syll:
+        return ()
+    return ("".join(syll), "".join(s[0] for s in syll), "".join(zy for _, zy in parts))
+
+
+def _fold_query(q: str) -> str:
+    # zhuyin typed with tone marks still matches
+    return fold_name(q).translate(_TONES)
+
+
+def _grams(text: str) -> Set[str]:
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class _Trie:
+    """Prefix trie; every node keeps the set of ids whose key passes through it."""
+
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root: Dict = {}
+
+    def add(self, key: str, pid: str):
+        node = self.root
+        for ch in key:
+            node = node.setdefault(ch, {})
+            node.setdefault("", set()).add(pid)
+
+    def remove(self, key: str, pid: str):
+        path, node = [], self.root
+        for ch in key:
+            nxt = node.get(ch)
+            if nxt is None:
+                return
+            path.append((node, ch))
+            node = nxt
+        for parent, ch in reversed(path):
+            child = parent[ch]
+            child[""].discard(pid)
+            if not child[""] and len(child) == 1:
+                del parent[ch]
+
+    def prefix(self, key: str) -> Set[str]:
+        node = self.root
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                return set()
+        return node.get("", set())
+
+
+class SearchIndex:
+    """Name / pinyin / zhuyin / note search over the persons of a live FamilyGraph."""
+
+    def __init__(self, graph: FamilyGraph):
+        self.g = graph
+        self._trie = _Trie()
+        self._grams: Dict[str, Set[str]] = {}
+        self._entry: Dict[str, Tuple[str, Tuple[str, ...], str, Set[str]]] = {}   # pid -> name, phonetic, note, grams
+        self._dirty: Set[str] = set(graph.persons)
+        self.reindexed = 0   # persons (re-)indexed so far (for benchmarks)
+        graph.add_listener(self._on_touch)
+
+    def _on_touch(self, kind: str, key: str):
+        if kind == "p":
+            self._dirty.add(key)
+
+    def _unindex(self, pid: str):
+        old = self._entry.pop(pid, None)
+        if old is None:
+            return
+        name, phon, _, grams = old
+        for k in (name, *phon):
+            self._trie.remove(k, pid)
+        for gr in grams:
+            s = self._grams.get(gr)
+            if s is not None:
+                s.discard(pid)
+                if not s:
+                    del self._grams[gr]
+
+    def _index(self, pid: str):
+        p = self.g.persons[pid]
+        name = fold_name(p.get("name", ""))
+        note = fold_name(p.get("note", ""))
+        phon = phonetic_keys(p.get("name", ""))
+        grams = _grams(name) | _grams(note)
+        for k in (name, *phon):
+            self._trie.add(k, pid)
+        for gr in grams:
+            self._grams.setdefault(gr, set()).add(pid)
+        self._entry[pid] = (name, phon, note, grams)
+
+    def _refresh(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        for pid in dirty:
+            self._unindex(pid)
+            if pid in self.g.persons:
+                self._index(pid)
+                self.reindexed += 1
+
+    def _substring(self, q: str) -> Set[str]:
+        grams = sorted((self._grams.get(gr, set()) for gr in _grams(q) if len(gr) == min(2, len(q))), key=len)
+        if not grams:
+            return set()
+        out = set(grams[0])
+        for s in grams[1:]:
+            out &= s
+            if not out:
+                break
+        return out
+
+    def search(self, query: str, limit: int = MAX_RESULTS, exclude: Iterable[str] = ()) -> List[str]:
+        """Ranked pids matching `query` (all persons, in insertion order, for an empty query)."""
+        self._refresh()
+        q = _fold_query(query)
+        skip = set(exclude)
+        if not q:
+            out = []
+            for pid in self.g.persons:
+                if pid not in skip:
+                    out.append(pid)
+                    if len(out) >= limit:
+                        break
+            return out
+        rank: Dict[str, int] = {}
+        for pid in self._trie.prefix(q):
+            name, phon, _, _ = self._entry[pid]
+            rank[pid] = EXACT if name == q else (PREFIX if name.startswith(q) else PHONETIC)
+        for pid in self._substring(q):
+            if pid in rank:
+                continue
+            name, _, note, _ = self._entry[pid]
+            if q in name:
+                rank[pid] = SUBSTRING
+            elif q in note:
+                rank[pid] = NOTE
+        ix = self.g.pid_index
+        hits = sorted((pid for pid in rank if pid not in skip),
+                      key=lambda pid: (rank[pid], len(self._entry[pid][0]), ix(pid) or 0))
+        return hits[:limit]
+
+    def page(self, query: str, page: int = 0, size: int = 20,
+             exclude: Iterable[str] = ()) -> Tuple[List[str], int]:
+        """One page of search() and the total number of matches (capped at MAX_RESULTS)."""
+        hits = self.search(query, exclude=exclude)
+        return hits[page * size:(page + 1) * size], len(hits)
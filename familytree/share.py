@@ -0,0 +1,158 @@
+# familytree/share.py — static, read-only HTML snapshot of a tree for family members
+#
+# One self-contained file: the pre-rendered SVG, the person and marriage tables and
+# (optionally) the estate summary from the tax page. Nothing in it talks to the
+# server, so viewing it costs no Streamlit session. Snapshots are built on a small
+# background executor and keyed by a hash of their content: exporting an unchanged
+# tree again returns the finished (or in-flight) result without re-rendering. They
+# are kept in memory only (the last MAX_MEM_ITEMS), never written to disk: each one
+# holds names, notes and possibly the estate summary.
+
+import hashlib
+import html
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from familytree.components import render_within_budget
+from tax import estate_summary
+
+MAX_MEM_ITEMS = 32
+
+_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix="share")
+_LOCK = threading.Lock()
+_MEM: "OrderedDict[str, Future]" = OrderedDict()
+
+
+# ---------- tables (also used by the marriage manager) ----------
+
+def person_rows(tree: dict) -> List[Dict[str, str]]:
+    return [{"pid": pid, "姓名": p.get("name", ""), "性別": p.get("gender", ""),
+             "狀態": "已故" if p.get("deceased") else "", "備註": p.get("note", "")}
+            for pid, p in tree.get("persons", {}).items()]
+
+
+def marriage_rows(tree: dict) -> List[Dict[str, str]]:
+    persons = tree.get("persons", {})
+    rows = []
+    for mid, mm in tree.get("marriages", {}).items():
+        order = mm.get("order") or mm.get("spouses", [])
+        sp_names = [persons.get(x, {}).get("name", x) for x in order]
+        ch = [persons.get(x, {}).get("name", x) for x in mm.get("children", [])]
+        rows.append({"mid": mid, "配偶": "、".join(sp_names),
+                     "子女": "、".join(ch), "離婚": "是" if mm.get("divorced", False) else "否"})
+    return rows
+
+
+# ---------- HTML ----------
+
+_CSS = """
+body{font-family:"Noto Sans TC","PingFang TC","Microsoft JhengHei",sans-serif;margin:0;color:#111827;background:#f7f9fb}
+header{background:#1F4A7A;color:#fff;padding:14px 24px}
+header h1{margin:0;font-size:1.3rem}
+header small{opacity:.8}
+main{padding:16px 24px;max-width:1400px;margin:auto}
+section{background:#fff;border:1px solid #e5e7eb;border-radius:12px;padding:12px 16px;margin-bottom:16px}
+.tree{overflow:auto;max-height:80vh;text-align:center}
+.tree svg{max-width:100%;height:auto}
+table{border-collapse:collapse;width:100%;font-size:.9rem}
+th,td{border-bottom:1px solid #e5e7eb;padding:4px 8px;text-align:left}
+th{background:#f3f4f6}
+.cards{display:flex;gap:12px;flex-wrap:wrap}
+.card{flex:1;min-width:160px;border:1px solid #e5e7eb;border-radius:12px;padding:10px 12px}
+.card b{display:block;font-size:1.1rem}
+footer{color:#6b7280;text-align:center;font-size:.8rem;padding:12px}
+"""
+
+
+def _table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "<p>（無資料）</p>"
+    head = "".join(f"<th>{html.escape(str(k))}</th>" for k in rows[0])
+    body = "".join("<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in r.values()) + "</tr>"
+                   for r in rows)
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def _wan(n) -> str:
+    return f"{int(round(n / 10000.0)):,} 萬元"
+
+
+def _estate_section(estate: Dict[str, Any]) -> str:
+    s = estate_summary(**estate)
+    shares = "｜".join(f"{k} {v * 100:.4g}%" for k, v in s["shares"].items()) or "N/A"
+    cards = [("可扣除總額", _wan(s["total_deductions"])), ("課稅基礎", _wan(s["taxable"])),
+             ("適用稅率", f"{s['result']['rate']}%"), ("預估應納稅額", _wan(s["result"]["tax"]))]
+    labels = {"funeral": "喪葬費", "spouse": "配偶扣除", "basic": "基本免稅",
+              "children": "直系卑親屬", "ascendants": "直系尊親屬"}
+    rows = [{"項目": labels[k], "金額": _wan(v)} for k, v in s["deductions"].items() if v]
+    return ("<section><h2>遺產稅試算摘要</h2>"
+            f"<p>法定繼承順序：{html.escape(s['order'])}</p><p>應繼分：{html.escape(shares)}</p>"
+            "<div class='cards'>" + "".join(f"<div class='card'>{a}<b>{b}</b></div>" for a, b in cards) + "</div>"
+            f"<h3>扣除明細</h3>{_table(rows)}"
+            "<p><small>示意試算，僅供會談討論；正式申報請以主管機關規定與專業人士意見為準。</small></p></section>")
+
+
+def _svg_inline(svg: bytes) -> str:
+    text = svg.decode("utf-8")
+    i = text.find("<svg")
+    return text[i:] if i >= 0 else text
+
+
+def build_html(tree: dict, estate: Optional[Dict[str, Any]] = None, title: str = "家族樹") -> str:
+    """The snapshot document (blocking; renders the tree SVG)."""
+    svg, _ = render_within_budget(tree, lean=len(tree.get("persons", {})) > 300)
+    parts = [
+        "<!DOCTYPE html><html lang='zh-Hant'><head><meta charset='utf-8'>",
+        "<meta name='viewport' content='width=device-width,initial-scale=1'>",
+        f"<title>{html.escape(title)}</title><style>{_CSS}</style></head><body>",
+        f"<header><h1>{html.escape(title)}</h1><small>唯讀分享頁｜產出於 "
+        f"{datetime.now().strftime('%Y/%m/%d %H:%M')}</small></header><main>",
+        f"<section><h2>家族樹</h2><div class='tree'>{_svg_inline(svg)}</div></section>",
+        f"<section><h2>成員（{len(tree.get('persons', {}))} 位）</h2>{_table(person_rows(tree))}</section>",
+        f"<section><h2>婚姻與子女</h2>{_table(marriage_rows(tree))}</section>",
+    ]
+    if estate:
+        parts.append(_estate_section(estate))
+    parts.append("</main><footer>永傳家族辦公室  gracefo.com</footer></body></html>")
+    return "".join(parts)
+
+
+# ---------- cached background builds ----------
+
+def _canonical(tree: dict, estate: Optional[Dict[str, Any]], title: str) -> str:
+    return json.dumps({"tree": tree, "estate": estate, "title": title},
+                      ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def snapshot_key(tree: dict, estate: Optional[Dict[str, Any]] = None, title: str = "家族樹") -> str:
+    return hashlib.sha256(_canonical(tree, estate, title).encode("utf-8")).hexdigest()
+
+
+def _build(payload: str) -> bytes:
+    data = json.loads(payload)
+    return build_html(data["tree"], data["estate"], data["title"]).encode("utf-8")
+
+
+def request_snapshot(tree: dict, estate: Optional[Dict[str, Any]] = None,
+                     title: str = "家族樹") -> Future:
+    """Future of the snapshot HTML bytes; finished at once when the content is cached.
+
+    The tree is serialized here, so later edits in the session don't leak into a
+    snapshot that is still being built.
+    """
+    payload = _canonical(tree, estate, title)
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    with _LOCK:
+        fut = _MEM.get(key)
+        if fut is not None and not (fut.done() and fut.exception() is not None):
+            _MEM.move_to_end(key)
+            return fut
+        fut = _EXEC.submit(_build, payload)
+        _MEM[key] = fut
+        while len(_MEM) > MAX_MEM_ITEMS:
+            _MEM.popitem(last=False)
+        return fut
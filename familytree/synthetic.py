@@ -0,0 +1,61 @@
+# familytree/synthetic.py — deterministic synthetic family trees for benchmarks and demos
+
+import random
+from typing import Any, Dict
+
+from familytree.graph import FamilyGraph
+
+_SURNAMES = "王李張劉陳楊黃趙吳周徐孫馬朱胡郭何林高羅"
+_GIVEN = "明華偉芳秀英玉珍志強美麗俊傑文雅淑惠建國家豪怡君"
+
+
+def _name(rng: random.Random) -> str:
+    return rng.choice(_SURNAMES) + "".join(rng.choice(_GIVEN) for _ in range(rng.choice((1, 2))))
+
+
+def synthetic_graph(n_persons: int, seed: int = 0, clans: int = 1,
+                    max_children: int = 4, marry_rate: float = 0.8) -> FamilyGraph:
+    """Grow `clans` independent lineages breadth-first until `n_persons` exist.
+
+    Each couple gets 0..max_children children; each child marries an outsider
+    with probability `marry_rate`. Ids are deterministic (p_000001, m_000001…).
+    """
+    rng = random.Random(seed)
+    g = FamilyGraph()
+    counter = {"p": 0, "m": 0}
+
+    def new_person(gender: str) -> str:
+        counter["p"] += 1
+        return g.add_person(_name(rng), gender, pid=f"p_{counter['p']:06d}",
+                            deceased=rng.random() < 0.1)
+
+    def new_marriage(a: str, b: str) -> str:
+        counter["m"] += 1
+        mid = g.add_or_get_marriage(a, b, mid=f"m_{counter['m']:06d}")
+        if rng.random() < 0.05:
+            g.toggle_divorce(mid, True)
+        return mid
+
+    frontier = []
+    for _ in range(max(1, clans)):
+        frontier.append(new_marriage(new_person("男"), new_person("女")))
+
+    while frontier and len(g) < n_persons:
+        nxt = []
+        for mid in frontier:
+            for _ in range(rng.randint(0 if len(frontier) > 1 else 1, max_children)):
+                if len(g) >= n_persons:
+                    break
+                gender = rng.choice(("男", "女"))
+                child = new_person(gender)
+                g.add_child(mid, child)
+                if len(g) < n_persons and rng.random() < marry_rate:
+                    spouse = new_person("女" if gender == "男" else "男")
+                    nxt.append(new_marriage(child, spouse))
+        frontier = nxt or frontier[:1]
+    return g
+
+
+def synthetic_tree(n_persons: int, **kw) -> Dict[str, Any]:
+    """Same as synthetic_graph, in the `{"persons", "marriages"}` JSON shape."""
+    return synthetic_graph(n_persons, **kw).tree
@@ -0,0 +1,52 @@
+# familytree/test_generations.py — incremental Generations equals a full recomputation
+
+import json
+import random
+
+import pytest
+
+from familytree.generations import Generations, generations_of
+from familytree.synthetic import synthetic_graph
+from familytree.validate import Validator
+
+
+def _copy(tree):
+    # generations_of indexes the dicts it is given; keep the live tree out of it
+    return json.loads(json.dumps(tree))
+
+
+def _edit(g, gens: Generations, rng: random.Random):
+    pids, mids = list(g.persons), list(g.marriages)
+    v = Validator(g, gens)
+    roll = rng.random()
+    if roll < 0.2:
+        g.add_person("新成員", rng.choice("男女"))
+    elif roll < 0.45 and mids:
+        mid, pid = rng.choice(mids), rng.choice(pids)
+        if not v.check_add_child(mid, pid):
+            g.add_child(mid, pid)
+    elif roll < 0.6 and len(pids) > 1:
+        a, b = rng.sample(pids, 2)
+        if not v.check_marriage(a, b):
+            g.add_or_get_marriage(a, b)
+    elif roll < 0.75 and mids:
+        mid = rng.choice(mids)
+        kids = g.children_of(mid)
+        if kids:
+            g.remove_children(mid, [rng.choice(kids)])
+    elif roll < 0.9 and pids:
+        g.delete_person(rng.choice(pids))
+    elif mids:
+        g.delete_marriage(rng.choice(mids))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_matches_full(seed):
+    rng = random.Random(seed)
+    g = synthetic_graph(80, seed=seed, clans=2)
+    gens = Generations(g)
+    for step in range(120):
+        _edit(g, gens, rng)
+        if step % 3 == 0:   # also let several edits pile up between reads
+            assert gens.mapping() == generations_of(_copy(g.tree)), step
+    assert gens.mapping() == generations_of(_copy(g.tree))
@@ -0,0 +1,62 @@
+# familytree/test_importer.py — read_tree limits and shape checks (python -m pytest)
+
+import io
+import json
+
+import pytest
+
+from familytree.importer import ImportLimits, read_tree
+from familytree.synthetic import synthetic_graph
+from familytree.validate import ValidationError
+
+
+def _bytes(tree) -> bytes:
+    return json.dumps(tree, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _codes(data: bytes, limits: ImportLimits = ImportLimits()):
+    with pytest.raises(ValidationError) as e:
+        read_tree(io.BytesIO(data), limits)
+    return {i.code for i in e.value.issues}
+
+
+def test_round_trip_matches_json_loads():
+    data = _bytes(synthetic_graph(300, seed=4).tree)
+    g, _ = read_tree(io.BytesIO(data), total=len(data))
+    assert g.tree == json.loads(data)
+
+
+@pytest.mark.parametrize("limits", [
+    ImportLimits(max_bytes=1024),
+    ImportLimits(max_persons=10),
+    ImportLimits(max_marriages=5),
+    ImportLimits(max_record_bytes=16),
+])
+def test_limits_reject(limits):
+    assert _codes(_bytes(synthetic_graph(100, seed=1).tree), limits) == {"limit"}
+
+
+def test_limits_reject_deep_record_and_many_children():
+    deep = {"persons": {"a": {"name": "x", "n": [[[[[[[["deep"]]]]]]]]}}}
+    assert _codes(_bytes(deep)) == {"limit"}
+    kids = {f"c{i}": {"name": f"c{i}"} for i in range(3)}
+    tree = {"persons": {"a": {"name": "a"}, **kids},
+            "marriages": {"m": {"spouses": ["a"], "children": list(kids)}}}
+    assert _codes(_bytes(tree), ImportLimits(max_children=2)) == {"limit"}
+
+
+def test_reported_total_over_cap_rejects_before_reading():
+    class Unread(io.BytesIO):
+        def read(self, *a):
+            raise AssertionError("read after the size check")
+
+    with pytest.raises(ValidationError):
+        read_tree(Unread(), ImportLimits(max_bytes=10), total=11)
+
+
+@pytest.mark.parametrize("value", ["[]", "[{\"name\": \"x\"}]", "1", "\"x\"", "null"])
+def test_non_object_persons_is_an_error(value):
+    data = ('{"persons": ' + value + ', "marriages": {}}').encode("utf-8")
+    assert _codes(data) == {"bad_shape"}
+    data = ('{"persons": {}, "marriages": ' + value + '}').encode("utf-8")
+    assert _codes(data) == {"bad_shape"}
@@ -0,0 +1,57 @@
+# familytree/test_validate.py — per-edit Validator agrees with validate_tree on the result
+
+import json
+import random
+
+import pytest
+
+from familytree.generations import Generations
+from familytree.synthetic import synthetic_graph
+from familytree.validate import Validator, errors, validate_tree
+
+
+def _copy(tree):
+    return json.loads(json.dumps(tree))
+
+
+def _child_breaks(tree, mid: str, pid: str) -> bool:
+    t = _copy(tree)
+    kids = t["marriages"][mid]["children"]
+    if pid not in kids:
+        kids.append(pid)
+    return bool(errors(validate_tree(t)))
+
+
+def _marriage_breaks(g, a: str, b: str) -> bool:
+    t = _copy(g.tree)
+    if g.find_marriage(a, b) is None:
+        t["marriages"]["m_new"] = {"spouses": [a, b], "order": [a, b], "children": [], "divorced": False}
+    return bool(errors(validate_tree(t)))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_validator_matches_validate_tree(seed):
+    rng = random.Random(seed)
+    g = synthetic_graph(60, seed=seed, clans=2)
+    gens = Generations(g)
+    v = Validator(g, gens)
+    rejected = 0
+    for step in range(200):
+        pids, mids = list(g.persons), list(g.marriages)
+        if rng.random() < 0.6:
+            mid, pid = rng.choice(mids), rng.choice(pids)
+            bad = bool(errors(v.check_add_child(mid, pid)))
+            assert bad == _child_breaks(g.tree, mid, pid), (step, mid, pid)
+            if not bad:
+                g.add_child(mid, pid)
+        else:
+            a, b = rng.sample(pids, 2)
+            bad = bool(errors(v.check_marriage(a, b)))
+            assert bad == _marriage_breaks(g, a, b), (step, a, b)
+            if not bad:
+                g.add_or_get_marriage(a, b)
+        rejected += bad
+        if rng.random() < 0.2:
+            g.add_person("新成員", rng.choice("男女"))
+    assert 0 < rejected < 200   # both outcomes were exercised
+    assert not errors(validate_tree(g.tree))
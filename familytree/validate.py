@@ -0,0 +1,276 @@
+# familytree/validate.py — structural checks for the family tree
+#
+# Two entry points:
+#   validate_tree(obj)   full check of an imported JSON object, linear in its size
+#                        (shape, dangling ids, duplicate parentage, ancestry cycles)
+#   Validator            per-edit checks against the live FamilyGraph that only walk
+#                        the part of the tree the edit could close a cycle through
+#
+# A cycle here means a spouse group that is its own ancestor — either a person who
+# becomes their own ancestor, or a marriage between an ancestor and a descendant.
+# Both make rank assignment impossible (dot loops or draws garbage), so they are
+# errors; harmless oddities (empty marriages, repeated children) are warnings.
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Set, Tuple
+
+from familytree.graph import FamilyGraph
+
+
+class Issue(NamedTuple):
+    code: str
+    message: str
+    severity: str = "error"            # "error" | "warning"
+    pids: Tuple[str, ...] = ()
+    mids: Tuple[str, ...] = ()
+
+
+class ValidationError(ValueError):
+    """Raised when an edit or import would leave the tree in an invalid state."""
+
+    def __init__(self, issues: Sequence[Issue]):
+        self.issues = list(issues)
+        super().__init__("；".join(i.message for i in self.issues if i.severity == "error")
+                         or "資料不一致")
+
+
+def errors(issues: Iterable[Issue]) -> List[Issue]:
+    return [i for i in issues if i.severity == "error"]
+
+
+# ----------------------------- full check -----------------------------
+
+def _name(persons: Dict[str, Any], pid: str) -> str:
+    p = persons.get(pid)
+    return p.get("name", pid) if isinstance(p, dict) else str(pid)
+
+
+def validate_tree(obj: Any) -> List[Issue]:
+    """Every problem in a `{"persons", "marriages"}` object, in one O(V + E) pass."""
+    if not isinstance(obj, dict):
+        return [Issue("bad_shape", "JSON 最外層必須是物件")]
+    persons = obj.get("persons") or {}
+    marriages = obj.get("marriages") or {}
+    if not isinstance(persons, dict) or not isinstance(marriages, dict):
+        return [Issue("bad_shape", "persons / marriages 必須是物件")]
+
+    issues: List[Issue] = []
+    for pid, p in persons.items():
+        if not isinstance(p, dict):
+            issues.append(Issue("bad_shape", f"成員 {pid} 的資料格式錯誤", pids=(pid,)))
+
+    parent_of: Dict[str, str] = {}
+    pairs: Dict[Tuple[str, str], str] = {}
+    for mid, m in marriages.items():
+        if not isinstance(m, dict):
+            issues.append(Issue("bad_shape", f"婚姻 {mid} 的資料格式錯誤", mids=(mid,)))
+            continue
+        spouses, children = m.get("spouses", []), m.get("children", [])
+        if not isinstance(spouses, list) or not isinstance(children, list):
+            issues.append(Issue("bad_shape", f"婚姻 {mid} 的 spouses / children 必須是陣列", mids=(mid,)))
+            continue
+        for x in spouses + children:
+            if not isinstance(x, str) or x not in persons:
+                issues.append(Issue("missing_person", f"婚姻 {mid} 參照了不存在的成員 {x}", mids=(mid,)))
+        if len(spouses) > 2 or len(set(spouses)) != len(spouses):
+            issues.append(Issue("bad_spouses", f"婚姻 {mid} 的配偶必須是一到兩位不同成員", mids=(mid,)))
+        if len(spouses) == 2 and all(isinstance(s, str) for s in spouses):
+            key = tuple(sorted(spouses))
+            if key in pairs:
+                issues.append(Issue("duplicate_pair",
+                                    f"{_name(persons, key[0])} 與 {_name(persons, key[1])} 有重複的婚姻紀錄",
+                                    "warning", pids=key, mids=(pairs[key], mid)))
+            else:
+                pairs[key] = mid
+        if not spouses and not children:
+            issues.append(Issue("empty_marriage", f"婚姻 {mid} 沒有任何成員", "warning", mids=(mid,)))
+        seen: Set[str] = set()
+        for c in children:
+            if not isinstance(c, str):
+                continue
+            if c in seen:
+                issues.append(Issue("duplicate_child", f"{_name(persons, c)} 在婚姻 {mid} 中重複列為子女",
+                                    "warning", pids=(c,), mids=(mid,)))
+                continue
+            seen.add(c)
+            if c in spouses:
+                issues.append(Issue("self_parent", f"{_name(persons, c)} 不能同時是同一婚姻的配偶與子女",
+                                    pids=(c,), mids=(mid,)))
+            other = parent_of.get(c)
+            if other is not None and other != mid:
+                issues.append(Issue("duplicate_parentage",
+                                    f"{_name(persons, c)} 同時是兩段婚姻（{other}、{mid}）的子女",
+                                    pids=(c,), mids=(other, mid)))
+            else:
+                parent_of[c] = mid
+
+    if not errors(issues):
+        issues.extend(_cycles(persons, marriages))
+    return issues
+
+
+def _cycles(persons: Dict[str, Any], marriages: Dict[str, Any]) -> List[Issue]:
+    # spouse groups (union-find), then Kahn over group -> child-group edges
+    parent = {pid: pid for pid in persons}
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for m in marriages.values():
+        sp = m.get("spouses", [])
+        for s in sp[1:]:
+            ra, rb = find(sp[0]), find(s)
+            if ra != rb:
+                parent[rb] = ra
+    succ: Dict[str, Set[str]] = {}
+    indeg: Dict[str, int] = {}
+    for m in marriages.values():
+        sp = m.get("spouses", [])
+        if not sp:
+            continue
+        gm = find(sp[0])
+        for c in m.get("children", []):
+            gc = find(c)
+            out = succ.setdefault(gm, set())
+            if gc not in out:
+                out.add(gc)
+                indeg[gc] = indeg.get(gc, 0) + 1
+    groups = {find(p) for p in persons}
+    queue = [g for g in groups if indeg.get(g, 0) == 0]
+    done = 0
+    while queue:
+        g = queue.pop()
+        done += 1
+        for c in succ.get(g, ()):
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                queue.append(c)
+    if done == len(groups):
+        return []
+
+    # walk predecessors inside the leftover set until a group repeats: that's a cycle
+    left = {g for g in groups if indeg.get(g, 0) > 0}
+    pred: Dict[str, str] = {}
+    for g, outs in succ.items():
+        for c in outs:
+            if c in left and g in left:
+                pred.setdefault(c, g)
+    cur, order, pos = next(iter(left)), [], {}
+    while cur not in pos:
+        pos[cur] = len(order)
+        order.append(cur)
+        cur = pred[cur]
+    cycle = order[pos[cur]:][::-1]
+    members: Dict[str, List[str]] = {}
+    for pid in persons:
+        r = find(pid)
+        if r in left:
+            members.setdefault(r, []).append(pid)
+    names = " → ".join("、".join(_name(persons, x) for x in members[g]) for g in cycle + cycle[:1])
+    return [Issue("cycle", f"親屬關係出現循環（成為自己的祖先）：{names}",
+                  pids=tuple(p for g in cycle for p in members[g]))]
+
+
+# ----------------------------- per-edit checks -----------------------------
+
+class Validator:
+    """Checks a single edit against the live graph before it is applied.
+
+    `generations` (familytree.generations.Generations) is optional: generation
+    numbers strictly increase from parents to children, so the search for a path
+    from X down to Y stops at anyone already below Y, and often never starts.
+    """
+
+    def __init__(self, graph: FamilyGraph, generations=None):
+        self.g = graph
+        self.gens = generations
+
+    def _name(self, pid: str) -> str:
+        return self.g.persons.get(pid, {}).get("name", pid)
+
+    def spouse_group(self, pids: Iterable[str]) -> Set[str]:
+        """Everyone linked to `pids` by marriage alone (one rank in the layout)."""
+        seen = set(pids)
+        q = deque(seen)
+        while q:
+            for s in self.g.spouses_of(q.popleft()):
+                if s not in seen:
+                    seen.add(s)
+                    q.append(s)
+        return seen
+
+    def reaches_down(self, src: str, targets: Iterable[str]) -> bool:
+        """Is any of `targets` `src`, a spouse-group mate of it, or a descendant of those?"""
+        targets = set(targets)
+        if src in targets:
+            return True
+        g = self.g
+        gen = self.gens.mapping() if self.gens is not None else None
+        limit = None
+        if gen is not None:
+            tg = [gen[t] for t in targets if t in gen]
+            limit = max(tg) if tg else None
+            if limit is not None and gen.get(src, limit) > limit:
+                return False
+        seen = {src}
+        q = deque([src])
+        while q:
+            cur = q.popleft()
+            for mid in g.marriages_of(cur):
+                m = g.marriages[mid]
+                for x in m.get("spouses", []) + m.get("children", []):
+                    if x in seen:
+                        continue
+                    if x in targets:
+                        return True
+                    if limit is not None and gen.get(x, limit) > limit:
+                        continue
+                    seen.add(x)
+                    q.append(x)
+        return False
+
+    def check_add_child(self, mid: str, pid: str) -> List[Issue]:
+        g = self.g
+        m = g.marriages.get(mid)
+        if m is None or pid not in g.persons:
+            return [Issue("missing_person", "婚姻或成員不存在", mids=(mid,), pids=(pid,))]
+        if g.has_child(mid, pid):
+            return []
+        spouses = [s for s in m.get("spouses", []) if s in g.persons]
+        if pid in spouses:
+            return [Issue("self_parent", f"{self._name(pid)} 不能成為自己婚姻的子女", pids=(pid,), mids=(mid,))]
+        other = [x for x in g.parent_marriages_of(pid) if x != mid]
+        if other:
+            return [Issue("duplicate_parentage",
+                          f"{self._name(pid)} 已是另一段婚姻（{other[0]}）的子女，請先移除",
+                          pids=(pid,), mids=(other[0], mid))]
+        if spouses and self.reaches_down(pid, self.spouse_group(spouses)):
+            return [Issue("cycle", f"{self._name(pid)} 是這段婚姻配偶的祖先（或同輩配偶），不能成為其子女",
+                          pids=(pid, *spouses), mids=(mid,))]
+        return []
+
+    def check_marriage(self, p1: str, p2: str) -> List[Issue]:
+        g = self.g
+        if p1 not in g.persons or p2 not in g.persons:
+            return [Issue("missing_person", "成員不存在", pids=(p1, p2))]
+        if p1 == p2:
+            return [Issue("bad_spouses", "配偶必須是兩位不同成員", pids=(p1,))]
+        if g.find_marriage(p1, p2) is not None:
+            return []
+        # the marriage merges two spouse groups; that closes a cycle iff one group
+        # already has descendants in the other
+        g1, g2 = self.spouse_group([p1]), self.spouse_group([p2])
+        if g1 & g2:
+            return []
+
+        def below(src_group: Set[str], dst_group: Set[str]) -> bool:
+            kids = {c for s in src_group for mid in g.marriages_of(s) for c in g.marriages[mid].get("children", [])}
+            return any(self.reaches_down(c, dst_group) for c in kids)
+
+        if below(g1, g2) or below(g2, g1):
+            return [Issue("cycle", f"{self._name(p1)} 與 {self._name(p2)} 為直系親屬關係，不能建立婚姻",
+                          pids=(p1, p2))]
+        return []
@@ -0,0 +1,139 @@
+# familytree/versions.py — named draft / final snapshots of one tree
+#
+# Saving a full copy of a large tree for every draft wastes memory, so a
+# VersionStore keeps
+#   checkpoints   the whole tree, packed (zlib JSON, see familytree.workspace)
+#   deltas        only the persons / marriages that changed since the previous
+#                 version (new image, or None = deleted), packed too
+# A new checkpoint is written every CHECKPOINT_EVERY versions, or sooner when
+# the deltas since the last one add up to half its size, so rebuilding any
+# version unpacks one checkpoint and a bounded number of small deltas.
+#
+# Changes are found with familytree.diff fingerprints: the store remembers the
+# last version's per-entity hashes, so a snapshot hashes the current tree once and
+# copies only what differs. It holds no reference to the FamilyGraph, so it
+# survives the workspace packing the tree and reloading it as a new graph.
+
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from familytree.diff import Diff, diff, fingerprints
+from familytree.workspace import pack, unpack
+
+Tree = Dict[str, Dict[str, Any]]
+
+CHECKPOINT_EVERY = 8
+DRAFT, FINAL = "draft", "final"
+
+
+class Version(NamedTuple):
+    label: str
+    status: str           # DRAFT or FINAL
+    created: float        # time.time()
+    persons: int
+    marriages: int
+    checkpoint: bool      # stored in full (else as a delta on the previous version)
+    bytes: int
+
+
+def _copy(tree: Tree) -> Tree:
+    return {key: {k: {f: list(v) if isinstance(v, list) else v for f, v in e.items()} for k, e in part.items()}
+            for key, part in tree.items()}
+
+
+def _delta(tree: Tree, fp_old, fp_new) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for key, old, new, src in (("persons", fp_old[0], fp_new[0], tree.get("persons", {})),
+                               ("marriages", fp_old[1], fp_new[1], tree.get("marriages", {}))):
+        part = {k: src[k] for k, h in new.items() if old.get(k) != h}
+        part.update({k: None for k in old if k not in new})
+        out[key] = part
+    return out
+
+
+class VersionStore:
+    """Snapshots of one tree; version numbers are list indexes, oldest first."""
+
+    def __init__(self, checkpoint_every: int = CHECKPOINT_EVERY):
+        self.checkpoint_every = max(1, checkpoint_every)
+        self._meta: List[Version] = []
+        self._blobs: List[bytes] = []
+        self._fp = None                           # fingerprints of the newest version
+        self._since_checkpoint = 0                # deltas (and their bytes) since the last checkpoint
+        self._delta_bytes = 0
+        self._cache: Optional[Tuple[int, Tree]] = None
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def versions(self) -> List[Version]:
+        return list(self._meta)
+
+    def total_bytes(self) -> int:
+        return sum(len(b) for b in self._blobs)
+
+    def snapshot(self, tree: Tree, label: str, status: str = DRAFT) -> int:
+        """Store the tree as a new version; returns its number."""
+        fp = fingerprints(tree)
+        last_cp = next((m for m in reversed(self._meta) if m.checkpoint), None)
+        delta = None
+        if self._fp is not None and self._since_checkpoint + 1 < self.checkpoint_every:
+            delta = pack(_delta(tree, self._fp, fp))
+            if last_cp is not None and self._delta_bytes + len(delta) > last_cp.bytes // 2:
+                delta = None
+        blob = delta if delta is not None else pack(tree)
+        if delta is None:
+            self._since_checkpoint = self._delta_bytes = 0
+        else:
+            self._since_checkpoint += 1
+            self._delta_bytes += len(blob)
+        self._meta.append(Version(label.strip() or f"版本 {len(self._meta) + 1}", status, time.time(),
+                                  len(tree.get("persons", {})), len(tree.get("marriages", {})),
+                                  delta is None, len(blob)))
+        self._blobs.append(blob)
+        self._fp = fp
+        return len(self._meta) - 1
+
+    def tree(self, i: int) -> Tree:
+        """Rebuild version `i` (a fresh copy, safe to edit)."""
+        if not 0 <= i < len(self._meta):
+            raise IndexError(i)
+        if self._cache is not None and self._cache[0] == i:
+            return _copy(self._cache[1])
+        start = i
+        while not self._meta[start].checkpoint:
+            start -= 1
+        out = unpack(self._blobs[start])
+        for j in range(start + 1, i + 1):
+            for key, part in unpack(self._blobs[j]).items():
+                dst = out.setdefault(key, {})
+                for k, v in part.items():
+                    if v is None:
+                        dst.pop(k, None)
+                    else:
+                        dst[k] = v
+        self._cache = (i, out)
+        return _copy(out)
+
+    def compare(self, i: int, j: int) -> Diff:
+        """Changes from version `i` to version `j`."""
+        return diff(self.tree(i), self.tree(j))
+
+    def set_status(self, i: int, status: str):
+        if status not in (DRAFT, FINAL):
+            raise ValueError(f"status must be {DRAFT!r} or {FINAL!r}")
+        self._meta[i] = self._meta[i]._replace(status=status)
+
+    def rename(self, i: int, label: str):
+        if self._meta[i].status == FINAL:
+            raise ValueError("定稿版本不可修改")
+        self._meta[i] = self._meta[i]._replace(label=label.strip() or self._meta[i].label)
+
+
+def highlight_map(d: Diff) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """(old side, new side) pid -> "removed" / "added" / "modified" for render_graph(highlight=…)."""
+    old = {pid: "removed" for pid in d.p_removed}
+    new = {pid: "added" for pid in d.p_added}
+    for pid in d.p_modified:
+        old[pid] = new[pid] = "modified"
+    return old, new
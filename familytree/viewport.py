@@ -0,0 +1,108 @@
+# familytree/viewport.py — render only what is on screen
+#
+# Starting from a focus person, walk the FamilyGraph indexes breadth-first and keep
+# people inside a generation window (up/down relative to the focus) and within
+# `hops` relationship steps (spouse, parent, child, sibling = one step each).
+# Marriages whose children are cut off — or that the user collapsed — get a single
+# "+N" summary child. The result is a small tree in the usual JSON shape, so it goes
+# through render_graph / layout_reuse unchanged and costs O(visible), not O(tree).
+
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+from familytree.graph import FamilyGraph
+
+SUMMARY_SUFFIX = "__more"
+
+
+def _count_hidden(graph: FamilyGraph, roots: Iterable[str], cap: int) -> int:
+    """People under `roots` (descendants and their spouses), counting stops at `cap`."""
+    seen = set()
+    stack = list(roots)
+    while stack and len(seen) < cap:
+        pid = stack.pop()
+        if pid in seen or pid not in graph.persons:
+            continue
+        seen.add(pid)
+        for mid in graph.marriages_of(pid):
+            m = graph.marriages[mid]
+            stack.extend(m.get("spouses", []))
+            stack.extend(m.get("children", []))
+    return len(seen)
+
+
+def visible_subtree(graph: FamilyGraph, focus: str, up: int = 2, down: int = 2,
+                    hops: Optional[int] = None, collapsed: Iterable[str] = (),
+                    summary_cap: int = 999) -> Dict[str, Any]:
+    """Subtree around `focus` in the `{"persons", "marriages"}` shape.
+
+    up / down   generations above / below the focus that may be shown
+    hops        max relationship steps from the focus (None = whole window)
+    collapsed   marriage ids whose children are folded into a "+N" node
+    """
+    persons, marriages = graph.persons, graph.marriages
+    if focus not in persons:
+        return {"persons": {}, "marriages": {}}
+    collapsed = set(collapsed)
+
+    gen: Dict[str, int] = {focus: 0}
+    mgen: Dict[str, int] = {}
+    q = deque([(focus, 0)])
+
+    def visit(pid: str, g: int, h: int):
+        if pid in gen or pid not in persons or not (-up <= g <= down):
+            return
+        gen[pid] = g
+        q.append((pid, h))
+
+    while q:
+        pid, h = q.popleft()
+        g0 = gen[pid]
+        for mid in graph.marriages_of(pid):
+            mgen.setdefault(mid, g0)
+            if hops is not None and h >= hops:
+                continue
+            m = marriages[mid]
+            for s in m.get("spouses", []):
+                visit(s, g0, h + 1)
+            if mid not in collapsed:
+                for c in m.get("children", []):
+                    visit(c, g0 + 1, h + 1)
+        if g0 - 1 < -up:
+            continue
+        for mid in graph.parent_marriages_of(pid):
+            mgen.setdefault(mid, g0 - 1)
+            if hops is not None and h >= hops:
+                continue
+            m = marriages[mid]
+            for s in m.get("spouses", []):
+                visit(s, g0 - 1, h + 1)
+            if mid not in collapsed:
+                for c in m.get("children", []):
+                    visit(c, g0, h + 1)
+
+    sub_p: Dict[str, Dict[str, Any]] = {pid: dict(persons[pid]) for pid in gen}
+    sub_p[focus]["focus"] = True
+    sub_m: Dict[str, Dict[str, Any]] = {}
+    for mid in mgen:
+        m = marriages[mid]
+        spouses = [s for s in m.get("spouses", []) if s in gen]
+        kids = [c for c in m.get("children", []) if c in gen]
+        hidden = [c for c in m.get("children", []) if c not in gen and c in persons]
+        if hidden:
+            n = _count_hidden(graph, hidden, summary_cap)
+            sid = f"{mid}{SUMMARY_SUFFIX}"
+            sub_p[sid] = {"name": f"+{n}" + ("+" if n >= summary_cap else ""), "summary": n}
+            kids.append(sid)
+        sub_m[mid] = {
+            "spouses": spouses,
+            "order": [s for s in (m.get("order") or m.get("spouses", [])) if s in gen],
+            "children": kids,
+            "divorced": m.get("divorced", False),
+        }
+    return {"persons": sub_p, "marriages": sub_m}
+
+
+def summary_owner(node_id: str) -> Optional[str]:
+    """Marriage id behind a "+N" node id, else None."""
+    return node_id[: -len(SUMMARY_SUFFIX)] if node_id.endswith(SUMMARY_SUFFIX) else None
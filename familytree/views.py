@@ -0,0 +1,94 @@
+# familytree/views.py — display data derived from the tree, kept between reruns
+#
+# The page used to rebuild its labels, the marriage table and the drawn graph on
+# every rerun, even when only an unrelated widget changed. TreeViews keeps them
+# materialised over a live FamilyGraph:
+#   labels        "name｜pid" per person and "mid｜A ↔ B" per marriage
+#   marriage rows the summary table (familytree.share.marriage_rows, row by row)
+# are patched only for what an edit touched (FamilyGraph listener; renaming a
+# person also dirties the marriages that show the name), and
+#   memo(name, key, fn)
+# caches one value per name against FamilyGraph.version plus the caller's key,
+# for whole derived results (viewport subtree, filtered tree, DOT / SVG output)
+# that are cheap to recompute only when nothing changed.
+
+from typing import Any, Callable, Dict, Hashable, List, Set, Tuple
+
+from familytree.graph import FamilyGraph
+
+
+class TreeViews:
+    """Cached display views over a live FamilyGraph."""
+
+    def __init__(self, graph: FamilyGraph):
+        self.g = graph
+        self._p_label: Dict[str, str] = {}
+        self._m_label: Dict[str, str] = {}
+        self._m_row: Dict[str, Dict[str, str]] = {}
+        self._dirty_p: Set[str] = set(graph.persons)
+        self._dirty_m: Set[str] = set(graph.marriages)
+        self._memo: Dict[str, Tuple[Tuple[int, Hashable], Any]] = {}
+        self.hits = self.misses = 0   # memo() counters (for benchmarks)
+        graph.add_listener(self._on_touch)
+
+    def _on_touch(self, kind: str, key: str):
+        if kind == "m":
+            self._dirty_m.add(key)
+            return
+        self._dirty_p.add(key)
+        # marriages that display this person's name
+        self._dirty_m.update(self.g.marriages_of(key))
+        self._dirty_m.update(self.g.parent_marriages_of(key))
+
+    def _refresh(self):
+        g = self.g
+        if self._dirty_p:
+            dirty, self._dirty_p = self._dirty_p, set()
+            for pid in dirty:
+                p = g.persons.get(pid)
+                if p is None:
+                    self._p_label.pop(pid, None)
+                else:
+                    self._p_label[pid] = f"{p.get('name', pid)}｜{pid}"
+        if self._dirty_m:
+            dirty, self._dirty_m = self._dirty_m, set()
+            for mid in dirty:
+                m = g.marriages.get(mid)
+                if m is None:
+                    self._m_label.pop(mid, None)
+                    self._m_row.pop(mid, None)
+                    continue
+                name = lambda x: g.persons.get(x, {}).get("name", x)
+                sp = [name(x) for x in (m.get("order") or m.get("spouses", []))]
+                self._m_label[mid] = f"{mid}｜{' ↔ '.join(sp)}"
+                self._m_row[mid] = {"mid": mid, "配偶": "、".join(sp),
+                                    "子女": "、".join(name(x) for x in m.get("children", [])),
+                                    "離婚": "是" if m.get("divorced", False) else "否"}
+
+    # ---------- views ----------
+    def person_label(self, pid: str) -> str:
+        self._refresh()
+        return self._p_label.get(pid, pid)
+
+    def marriage_label(self, mid: str) -> str:
+        self._refresh()
+        return self._m_label.get(mid, mid)
+
+    def marriage_rows(self) -> List[Dict[str, str]]:
+        """Same rows as share.marriage_rows(tree), in marriage order."""
+        return self.memo("marriage_rows", None, lambda: [self._m_row[mid] for mid in self.g.marriages],
+                         refresh=True)
+
+    def memo(self, name: str, key: Hashable, fn: Callable[[], Any], refresh: bool = False) -> Any:
+        """fn() cached under `name` until the tree changes or `key` differs (one entry per name)."""
+        if refresh:
+            self._refresh()
+        stamp = (self.g.version, key)
+        hit = self._memo.get(name)
+        if hit is not None and hit[0] == stamp:
+            self.hits += 1
+            return hit[1]
+        self.misses += 1
+        value = fn()
+        self._memo[name] = (stamp, value)
+        return value
@@ -0,0 +1,220 @@
+# familytree/workspace.py — several named trees per session under a memory budget
+#
+# An advisor keeps one tree per client family open. Each tree is in one of three
+# tiers, least recently used first to move down:
+#   live     FamilyGraph + whatever the page attached (history, generations, …);
+#            switching back is instant
+#   packed   zlib-compressed JSON in memory (typically 10-20x smaller)
+#   spilled  the packed bytes in a temp file; nothing kept in memory
+# After each switch the workspace keeps at most `max_live` live trees and demotes
+# the least recently used ones until the estimated total fits `max_bytes`. The
+# active tree is never demoted. Packing drops the attached objects (undo history
+# included): they are rebuilt empty when the tree is opened again. `on_pack` gets
+# them first, for objects that must be shut down rather than just dropped.
+
+import json
+import os
+import tempfile
+import weakref
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from familytree.graph import FamilyGraph
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_LIVE = 3
+
+# rough resident size of a live entity: dict + interned ids + index sets
+_LIVE_PERSON_BYTES = 700
+_LIVE_MARRIAGE_BYTES = 900
+
+
+def live_bytes(graph: FamilyGraph) -> int:
+    return len(graph.persons) * _LIVE_PERSON_BYTES + len(graph.marriages) * _LIVE_MARRIAGE_BYTES
+
+
+def pack(tree: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def unpack(data: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _remove_files(paths: Set[str]):
+    for p in list(paths):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+        paths.discard(p)
+
+
+class _Entry:
+    __slots__ = ("graph", "extras", "packed", "path", "persons")
+
+    def __init__(self, graph: FamilyGraph, extras: Optional[Dict[str, Any]] = None):
+        self.graph: Optional[FamilyGraph] = graph
+        self.extras: Dict[str, Any] = extras or {}
+        self.packed: Optional[bytes] = None
+        self.path: Optional[str] = None
+        self.persons = len(graph)
+
+    @property
+    def tier(self) -> str:
+        return "live" if self.graph is not None else ("packed" if self.packed is not None else "spilled")
+
+    @property
+    def bytes(self) -> int:
+        if self.graph is not None:
+            return live_bytes(self.graph)
+        return len(self.packed) if self.packed is not None else 0
+
+
+class Workspace:
+    """Named trees for one session; `open()` switches, demoting others as needed."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_live: int = DEFAULT_MAX_LIVE,
+                 spill_dir: Optional[str] = None,
+                 on_pack: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.max_bytes = max_bytes
+        self.max_live = max(1, max_live)
+        self.spill_dir = spill_dir
+        self.on_pack = on_pack     # (name, extras) just before a live tree is packed
+        self.active: Optional[str] = None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()   # LRU order, active last
+        self._order: Dict[str, int] = {}                              # name -> creation sequence
+        self._seq = 0
+        self._files: Set[str] = set()
+        weakref.finalize(self, _remove_files, self._files)
+
+    # ---------- tiers ----------
+    def _pack(self, name: str, e: _Entry):
+        if self.on_pack is not None and e.extras:
+            self.on_pack(name, e.extras)
+        e.persons = len(e.graph)
+        e.packed = pack(e.graph.tree)
+        e.graph = None
+        e.extras = {}
+
+    def _spill(self, e: _Entry):
+        fd, path = tempfile.mkstemp(prefix="ft_ws_", suffix=".json.z", dir=self.spill_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(e.packed)
+        except OSError:
+            os.remove(path)
+            return   # stays packed; the budget is best effort
+        self._files.add(path)
+        e.path = path
+        e.packed = None
+
+    def _load(self, e: _Entry):
+        if e.graph is not None:
+            return
+        if e.packed is None:
+            with open(e.path, "rb") as f:
+                e.packed = f.read()
+            self._drop_file(e)
+        e.graph = FamilyGraph.from_dict(unpack(e.packed))
+        e.packed = None
+
+    def _drop_file(self, e: _Entry):
+        if e.path:
+            _remove_files({e.path})
+            self._files.discard(e.path)
+            e.path = None
+
+    def _enforce(self):
+        others = [(name, e) for name, e in self._entries.items() if name != self.active]   # oldest first
+        live = [(name, e) for name, e in others if e.graph is not None]
+        for name, e in live[: max(0, len(live) - (self.max_live - 1))]:
+            self._pack(name, e)
+        total = sum(e.bytes for e in self._entries.values())
+        for name, e in others:
+            if total <= self.max_bytes:
+                break
+            if e.graph is not None:
+                before = e.bytes
+                self._pack(name, e)
+                total -= before - e.bytes
+            if e.packed is not None and total > self.max_bytes:
+                total -= e.bytes
+                self._spill(e)
+                total += e.bytes
+
+    # ---------- public ----------
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def names(self) -> List[str]:
+        """Tree names in the order they were added."""
+        return sorted(self._entries, key=lambda n: self._order[n])
+
+    def put(self, name: str, graph: FamilyGraph, extras: Optional[Dict[str, Any]] = None,
+            activate: bool = True):
+        """Add (or replace) a tree; replacing keeps its place in names()."""
+        old = self._entries.pop(name, None)
+        if old is not None:
+            self._drop_file(old)
+        self._entries[name] = _Entry(graph, extras)
+        if name not in self._order:
+            self._order[name] = self._seq
+            self._seq += 1
+        if activate or self.active is None:
+            self.active = name
+        else:
+            self._entries.move_to_end(name, last=False)
+        self._enforce()
+
+    def open(self, name: str) -> Tuple[FamilyGraph, Dict[str, Any]]:
+        """Make `name` active; returns its graph and the attached-objects dict (fill it in)."""
+        e = self._entries[name]
+        self._load(e)
+        self._entries.move_to_end(name)
+        self.active = name
+        self._enforce()
+        return e.graph, e.extras
+
+    def tree(self, name: str) -> Dict[str, Any]:
+        """Read-only copy of a tree without making it active (or changing its tier)."""
+        e = self._entries[name]
+        if e.graph is not None:
+            return unpack(pack(e.graph.tree))
+        if e.packed is not None:
+            return unpack(e.packed)
+        with open(e.path, "rb") as f:
+            return unpack(f.read())
+
+    def rename(self, old: str, new: str):
+        if new in self._entries:
+            raise ValueError(f"已有名為「{new}」的家族樹")
+        items = list(self._entries.items())
+        self._entries = OrderedDict((new if k == old else k, v) for k, v in items)
+        self._order[new] = self._order.pop(old)
+        if self.active == old:
+            self.active = new
+
+    def remove(self, name: str) -> Optional[str]:
+        """Drop a tree; returns the tree that should become active (most recent other), if any."""
+        e = self._entries.pop(name)
+        self._order.pop(name, None)
+        self._drop_file(e)
+        if self.active == name:
+            self.active = next(reversed(self._entries), None)
+        return self.active
+
+    def stats(self) -> List[Dict[str, Any]]:
+        out = []
+        for name in self.names():
+            e = self._entries[name]
+            out.append({"name": name, "tier": e.tier, "persons": len(e.graph) if e.graph is not None else e.persons,
+                        "bytes": e.bytes, "active": name == self.active})
+        return out
+
+    def total_bytes(self) -> int:
+        return sum(e.bytes for e in self._entries.values())
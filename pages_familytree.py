@@ -1,17 +1,43 @@
 # pages_familytree.py — Family tree with straight spouse line,
 # deceased flag + inline editing & delete, female styling fixed (rounded when deceased)
 
+import base64
+import functools
+import hashlib
+import io
 import json
 import uuid
-from typing import List, Dict, Any
+from itertools import islice
+from concurrent.futures import CancelledError
+from typing import List, Dict, Any, Optional, Tuple
 import streamlit as st
 import graphviz
+import numpy as np
 import pandas as pd
 
-# ----------------------------- State & Helpers -----------------------------
+from familytree.graph import FamilyGraph
+from familytree.history import History
+from familytree.generations import Generations, filter_generations
+from familytree.validate import ValidationError, Validator, errors
+from familytree.kinship import KinshipIndex
+from familytree import dedupe
+from familytree.branch import extract_branch
+from familytree.workspace import Workspace, pack, unpack
+from familytree.importer import read_tree
+from familytree.diff import diff, merge3
+from familytree.collab import Collab, FileStore, room_exists
+from familytree.search import SearchIndex
+from familytree.views import TreeViews
+from familytree.versions import DRAFT, FINAL, VersionStore, highlight_map
+from familytree.render import render_graph
+from familytree.viewport import visible_subtree
+from familytree.components import (packed_layered_layout, render_components_svg, render_within_budget,
+                                   request_render)
+from familytree.gv_pool import get_pool
+from familytree import poster
+from familytree.share import request_snapshot, snapshot_key
 
-def _uid(prefix: str = "id") -> str:
-    return f"{prefix}_{uuid.uuid4().hex[:8]}"
+# ----------------------------- State & Helpers -----------------------------
 
 def _safe_rerun():
     try:
@@ -19,29 +45,165 @@ def _safe_rerun():
     except Exception:
         st.experimental_rerun()
 
+def _section(fn):
+    """Run a page section as an st.fragment: its own widgets rerun only that section.
+
+    When the section changed the tree (or swapped it), the whole page reruns so the
+    other sections — graph, export, selectors — catch up.
+    """
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        before = (id(_graph()), _graph().version)
+        fn(*args, **kwargs)
+        if (id(_graph()), _graph().version) != before:
+            st.rerun()
+    return st.fragment(run)
+
+def _set_graph(graph: FamilyGraph, extras: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Make `graph` the page's tree; `extras` are its per-tree objects (kept by the workspace)."""
+    extras = {} if extras is None else extras
+    extras.setdefault("history", History(graph))
+    extras.setdefault("generations", Generations(graph))
+    extras.setdefault("search", SearchIndex(graph))
+    extras.setdefault("views", TreeViews(graph))
+    # family_tree stays the JSON-shaped view (same dicts) for existing callers
+    st.session_state.family_graph = graph
+    st.session_state.family_tree = graph.tree
+    st.session_state.family_history = extras["history"]
+    st.session_state.family_generations = extras["generations"]
+    st.session_state.family_search = extras["search"]
+    st.session_state.family_views = extras["views"]
+    st.session_state.family_collab = extras.get("collab")
+    return extras
+
+def _graph() -> FamilyGraph:
+    return st.session_state.family_graph
+
+def _history() -> History:
+    return st.session_state.family_history
+
+def _generations() -> Generations:
+    return st.session_state.family_generations
+
+def _search() -> SearchIndex:
+    return st.session_state.family_search
+
+def _views() -> TreeViews:
+    return st.session_state.family_views
+
+def _label(pid: str) -> str:
+    """`name｜pid` of a person in the active tree (cached between reruns)."""
+    return _views().person_label(pid)
+
+def _workspace() -> Workspace:
+    return st.session_state.family_workspace
+
+def _versions() -> VersionStore:
+    # kept per tree name outside the workspace extras, so packing a tree keeps its versions
+    stores = st.session_state.setdefault("family_versions", {})
+    return stores.setdefault(_workspace().active, VersionStore())
+
+def _collab() -> Optional[Collab]:
+    return st.session_state.get("family_collab")
+
+DEFAULT_TREE_NAME = "家族樹 1"
+
 def _init_state():
-    if "family_tree" not in st.session_state:
-        st.session_state.family_tree = {"persons": {}, "marriages": {}}
+    if "family_graph" not in st.session_state:
+        _set_graph(FamilyGraph.from_dict(st.session_state.get("family_tree") or {}))
+    if "family_history" not in st.session_state:
+        st.session_state.family_history = History(_graph())
+    if "family_generations" not in st.session_state:
+        st.session_state.family_generations = Generations(_graph())
+    if "family_search" not in st.session_state:
+        st.session_state.family_search = SearchIndex(_graph())
+    if "family_views" not in st.session_state:
+        st.session_state.family_views = TreeViews(_graph())
+    if "family_workspace" not in st.session_state:
+        ws = Workspace(on_pack=_on_tree_packed)
+        ws.put(DEFAULT_TREE_NAME, _graph(), {"history": _history(), "generations": _generations(),
+                                             "search": _search(), "views": _views()})
+        st.session_state.family_workspace = ws
     if "selected_mid" not in st.session_state:
         st.session_state.selected_mid = None
 
+def _on_tree_packed(name: str, extras: Dict[str, Any]):
+    # a packed tree has no live graph to sync: publish its last edits and leave the room
+    c = extras.pop("collab", None)
+    if c is None:
+        return
+    c.flush()
+    st.session_state.collab_notice = (f"「{name}」已暫時收起以節省記憶體，並離開共編室 {c.store.room}；"
+                                      "如需繼續共編，請切換回該家族樹後重新加入。")
+
+# per-tree results that must not survive a switch to another tree
+_TREE_SCOPED_KEYS = ("share_future", "dedupe_candidates", "branch_pdf")
+
+def _switch_tree(name: str):
+    graph, extras = _workspace().open(name)
+    _set_graph(graph, extras)
+    for k in _TREE_SCOPED_KEYS:
+        st.session_state.pop(k, None)
+    mids = list(graph.marriages)
+    st.session_state.selected_mid = mids[-1] if mids else None
+
+def _new_tree(name: str, graph: Optional[FamilyGraph] = None):
+    graph = graph if graph is not None else FamilyGraph()
+    _workspace().put(name, graph, _set_graph(graph))
+    _switch_tree(name)
+
+def _close_tree(name: str):
+    st.session_state.get("family_versions", {}).pop(name, None)
+    nxt = _workspace().remove(name)
+    if nxt is None:
+        _new_tree(DEFAULT_TREE_NAME)
+    else:
+        _switch_tree(nxt)
+
+def _unique_tree_name(base: str) -> str:
+    base = base.strip() or "家族樹"
+    name, i = base, 2
+    while name in _workspace():
+        name, i = f"{base} ({i})", i + 1
+    return name
+
 def _reset_tree():
-    st.session_state.family_tree = {"persons": {}, "marriages": {}}
+    # undoable: clearing by accident should not cost the whole tree
+    g = _graph()
+    with _history().step("全部清空"):
+        for pid in list(g.persons):
+            g.delete_person(pid)
+        for mid in list(g.marriages):
+            g.delete_marriage(mid)
     st.session_state.selected_mid = None
 
 def _export_json() -> str:
-    return json.dumps(st.session_state.family_tree, ensure_ascii=False, indent=2)
-
-def _import_json(text: str):
-    obj = json.loads(text)
-    persons = {str(k): v for k, v in obj.get("persons", {}).items()}
-    marriages = {str(k): v for k, v in obj.get("marriages", {}).items()}
-    # backfill order for old data
-    for mid, m in marriages.items():
-        if m.get("spouses") and "order" not in m:
-            marriages[mid]["order"] = list(m.get("spouses"))
-    st.session_state.family_tree = {"persons": persons, "marriages": marriages}
-    mids = list(marriages.keys())
+    tree = st.session_state.family_tree
+    return _views().memo("export_json", None, lambda: json.dumps(tree, ensure_ascii=False, indent=2))
+
+def _read_upload(fp, total: Optional[int] = None, verb: str = "匯入中"):
+    """read_tree() on an uploaded file, with a progress bar while it runs."""
+    bar = st.progress(0.0, text=f"{verb}…")
+
+    def progress(done: int, size: Optional[int], persons: int, marriages: int):
+        frac = min(done / size, 1.0) if size else 0.0
+        bar.progress(frac, text=f"{verb}…已讀取 {persons:,} 位成員、{marriages:,} 段婚姻")
+
+    try:
+        return read_tree(fp, progress=progress, total=total)
+    finally:
+        bar.empty()
+
+def _import_json(fp, name: Optional[str] = None, total: Optional[int] = None):
+    """Stream an uploaded file into the active tree, or into a new tree called `name`."""
+    graph, issues = _read_upload(fp, total)
+    # warnings survive the rerun that follows a successful import
+    st.session_state.import_warnings = [i.message for i in issues]
+    if name:
+        _new_tree(name, graph)
+        return
+    _workspace().put(_workspace().active, graph, _set_graph(graph))
+    mids = list(graph.marriages.keys())
     st.session_state.selected_mid = (
         st.session_state.selected_mid if st.session_state.selected_mid in mids
         else (mids[-1] if mids else None)
@@ -49,162 +211,117 @@ def _import_json(text: str):
 
 # ----------------------------- Mutators -----------------------------
 
+# Each mutator is one undo step; callers can group several with `_history().step(...)`.
+
 def add_person(name: str, gender: str = "", note: str = "", deceased: bool = False) -> str:
-    pid = _uid("p")
-    st.session_state.family_tree["persons"][pid] = {
-        "name": (name or "").strip() or pid,
-        "gender": (gender or "").strip(),
-        "note": (note or "").strip(),
-        "deceased": bool(deceased),
-    }
-    return pid
+    with _history().step("新增成員"):
+        return _graph().add_person(name, gender, note, deceased)
+
+def update_person(pid: str, **fields) -> bool:
+    with _history().step("編輯成員"):
+        return _graph().update_person(pid, **fields)
+
+def _validator() -> Validator:
+    return Validator(_graph(), _generations())
 
 def add_or_get_marriage(p1: str, p2: str) -> str:
-    a, b = sorted([p1, p2])
-    for mid, m in st.session_state.family_tree["marriages"].items():
-        if sorted(m.get("spouses", [])) == [a, b]:
-            if "order" not in m:
-                m["order"] = [a, b]
-            return mid
-    mid = _uid("m")
-    st.session_state.family_tree["marriages"][mid] = {
-        "spouses": [a, b],
-        "order": [a, b],
-        "children": [],
-        "divorced": False
-    }
-    return mid
+    """Raises ValidationError if the marriage would make someone their own ancestor."""
+    issues = _validator().check_marriage(p1, p2)
+    if issues:
+        raise ValidationError(issues)
+    with _history().step("建立婚姻"):
+        return _graph().add_or_get_marriage(p1, p2)
 
 def toggle_divorce(mid: str, value: bool):
-    m = st.session_state.family_tree["marriages"].get(mid)
-    if m:
-        m["divorced"] = bool(value)
+    with _history().step("設定離婚"):
+        _graph().toggle_divorce(mid, value)
 
 def add_child(mid: str, child_pid: str):
-    m = st.session_state.family_tree["marriages"].get(mid)
-    if m and child_pid not in m["children"]:
-        m["children"].append(child_pid)
+    """Raises ValidationError for cycles, self-parenting and a second set of parents."""
+    issues = _validator().check_add_child(mid, child_pid)
+    if issues:
+        raise ValidationError(issues)
+    with _history().step("加入子女"):
+        _graph().add_child(mid, child_pid)
 
 def remove_children(mid: str, child_ids: List[str]):
-    m = st.session_state.family_tree["marriages"].get(mid)
-    if not m:
-        return
-    m["children"] = [c for c in m.get("children", []) if c not in set(child_ids)]
+    with _history().step("刪除子女"):
+        _graph().remove_children(mid, child_ids)
 
 def _delete_person(pid: str):
     """Remove a person and clean up marriages that reference them."""
-    persons = st.session_state.family_tree["persons"]
-    marriages = st.session_state.family_tree["marriages"]
+    with _history().step("刪除成員"):
+        _graph().delete_person(pid)
 
-    if pid not in persons:
-        return
-
-    # 1) Remove from marriages (spouses & children)
-    to_delete_mids = []
-    for mid, m in list(marriages.items()):
-        if pid in m.get("spouses", []):
-            m["spouses"] = [x for x in m["spouses"] if x != pid]
-            m["order"] = [x for x in (m.get("order") or []) if x != pid]
-        if pid in m.get("children", []):
-            m["children"] = [x for x in m["children"] if x != pid]
+def merge_persons(keep: str, drop: str) -> List[str]:
+    """Fold `drop` into `keep` (one undo step); returns notes. Raises ValidationError for direct lines."""
+    with _history().step("合併重複成員"):
+        return dedupe.merge_persons(_graph(), keep, drop, _validator())
 
-        # If empty marriage, remove
-        if not m.get("spouses") and not m.get("children"):
-            to_delete_mids.append(mid)
+_TIER_LABELS = {"live": "", "packed": "（已壓縮）", "spilled": "（已暫存至磁碟）"}
 
-        if m.get("spouses") and not m.get("order"):
-            m["order"] = m["spouses"][:]
-
-    for mid in to_delete_mids:
-        marriages.pop(mid, None)
+def _workspace_bar():
+    """Switch between the session's trees; recently used ones stay in memory."""
+    ws = _workspace()
+    info = {row["name"]: row for row in ws.stats()}
+    names = ws.names()
+    c1, c2, c3 = st.columns([3, 2, 1])
+    with c1:
+        # no widget key: the selection follows ws.active after renames / new / close
+        choice = st.selectbox("工作區家族樹", names, index=names.index(ws.active),
+                              format_func=lambda n: f"{n}｜{info[n]['persons']} 人{_TIER_LABELS[info[n]['tier']]}")
+        if choice != ws.active:
+            _switch_tree(choice)
+            _safe_rerun()
+    with c2:
+        new_name = st.text_input("名稱", value=ws.active, key=f"ws_name_{ws.active}", label_visibility="collapsed")
+        r1, r2 = st.columns(2)
+        if r1.button("重新命名", use_container_width=True, key="ws_rename") and new_name.strip() != ws.active:
+            try:
+                old = ws.active
+                ws.rename(old, new_name.strip())
+                stores = st.session_state.get("family_versions", {})
+                if old in stores:
+                    stores[ws.active] = stores.pop(old)
+                _safe_rerun()
+            except ValueError as e:
+                st.error(str(e))
+        if r2.button("➕ 新增", use_container_width=True, key="ws_new"):
+            _new_tree(_unique_tree_name("新家族樹"))
+            _safe_rerun()
+    with c3:
+        if st.button("關閉", use_container_width=True, key="ws_close", disabled=len(ws) < 2,
+                     help="從工作區移除目前這棵家族樹（請先匯出備份）"):
+            _close_tree(ws.active)
+            _safe_rerun()
+    st.caption(f"工作區共 {len(ws)} 棵家族樹，約 {ws.total_bytes() / 1048576:.1f} MB；"
+               "較久未使用的會自動壓縮，切換回來時重新載入（復原紀錄不保留）。")
 
-    # 2) Remove the person
-    persons.pop(pid, None)
+def _undo_redo_controls():
+    h = _history()
+    c1, c2, c3 = st.columns([1, 1, 4])
+    with c1:
+        if st.button("↩️ 復原", disabled=not h.can_undo, use_container_width=True, key="undo_btn",
+                     help=f"復原：{h.undo_label()}" if h.can_undo else None):
+            st.toast(f"已復原：{h.undo()}")
+            _safe_rerun()
+    with c2:
+        if st.button("↪️ 重做", disabled=not h.can_redo, use_container_width=True, key="redo_btn",
+                     help=f"重做：{h.redo_label()}" if h.can_redo else None):
+            st.toast(f"已重做：{h.redo()}")
+            _safe_rerun()
 
 # ----------------------------- Rendering -----------------------------
 
-def render_graph(tree: dict) -> graphviz.Digraph:
-    g = graphviz.Digraph("G", engine="dot")
-    g.attr(rankdir="TB", splines="line", nodesep="0.5", ranksep="0.9")
-    g.attr("edge", dir="none", penwidth="2")
-
-    persons: Dict[str, Dict[str, Any]] = tree.get("persons", {})
-    marriages = tree.get("marriages", {})
-
-    # Person nodes with color/shape logic (deceased overrides only the fillcolor)
-    for pid, p in persons.items():
-        name = p.get("name", pid)
-        note = p.get("note")
-        deceased = p.get("deceased", False)
-        gender = p.get("gender", "")
-        label = name + (f"\n{note}" if note else "")
-
-        # base style by gender
-        if gender == "男":
-            shape = "box";         style = "filled";          fillcolor = "#E6F2FF"
-        elif gender == "女":
-            shape = "box";         style = "rounded,filled";  fillcolor = "#FFE6E6"
-        else:
-            shape = "box";         style = "rounded,filled";  fillcolor = "white"
-
-        # deceased: keep shape/style (so females stay rounded), just change fill
-        if deceased:
-            fillcolor = "#E0E0E0"
-
-        g.node(pid, label=label, shape=shape, style=style,
-               fillcolor=fillcolor, fontsize="11")
-
-    # Marriage mid points — tiny visible dot
-    for mid in marriages.keys():
-        g.node(mid, label="", shape="point", width="0.03", color="black")
-
-    # Spouse line (one straight segment), with mid centered by invisible constraints
-    for mid, m in marriages.items():
-        order = m.get("order") or m.get("spouses", [])
-        if len(order) != 2:
-            order = m.get("spouses", [])[:2]
-        divorced = m.get("divorced", False)
-
-        if len(order) == 2:
-            s1, s2 = order
-            with g.subgraph(name=f"cluster_{mid}") as sg:
-                sg.attr(rank="same", color="invis", style="invis", newrank="true")
-                sg.node(s1); sg.node(mid); sg.node(s2)
-                sg.edge(s1, mid, style="invis", constraint="true", weight="50000", minlen="0")
-                sg.edge(mid, s2, style="invis", constraint="true", weight="50000", minlen="0")
-            ls = "dashed" if divorced else "solid"
-            g.edge(s1, s2, style=ls, constraint="true", weight="1800", minlen="0")
-
-        elif len(order) == 1:
-            s1 = order[0]
-            with g.subgraph(name=f"cluster_{mid}") as sg:
-                sg.attr(rank="same", color="invis", style="invis", newrank="true")
-                sg.node(s1); sg.node(mid)
-                sg.edge(s1, mid, style="invis", constraint="true", weight="40000", minlen="0")
-            g.edge(s1, mid, style="solid", constraint="true", weight="1800", minlen="0")
-
-    # Children downward
-    for mid, m in marriages.items():
-        children = [c for c in m.get("children", []) if c in persons]
-        if not children:
-            continue
-        jn = f"{mid}_d"
-        g.node(jn, label="", shape="point", width="0.04", color="black")
-        g.edge(mid, jn, style="solid", weight="1200", minlen="1", constraint="true")
-        for c in children:
-            g.edge(jn, c, style="solid", weight="900", minlen="1", constraint="true")
-
-    return g
+# render_graph lives in familytree.render; re-exported here for existing callers.
 
 # ----------------------------- UI -----------------------------
 
-def _fmt_pid(persons: dict, pid: str) -> str:
-    return f"{persons.get(pid, {}).get('name', pid)}｜{pid}"
-
 def _sidebar_controls():
     # Per request: sidebar removed.
     return
 
+@_section
 def _bottom_io_controls():
     st.markdown("---")
     st.subheader("📦 資料匯入 / 匯出")
@@ -227,16 +344,139 @@ def _bottom_io_controls():
 
     with c2:
         st.markdown("**匯入 JSON 檔**")
+        for msg in st.session_state.pop("import_warnings", []):
+            st.warning(msg)
         up2 = st.file_uploader("選擇檔案", type=["json"], key="bottom_uploader")
         if up2 is not None:
+            as_new = st.checkbox("匯入為新的家族樹（保留目前這棵）", value=True, key="import_as_new")
             if st.button("▶️ 執行匯入", type="primary", use_container_width=True):
                 try:
-                    _import_json(up2.read().decode("utf-8"))
+                    name = _unique_tree_name(up2.name.rsplit(".", 1)[0]) if as_new else None
+                    _import_json(up2, name, total=up2.size)
                     st.success("已匯入，家族樹已更新")
                     _safe_rerun()
+                except ValidationError as e:
+                    st.error("匯入失敗，資料有以下問題：")
+                    for issue in errors(e.issues)[:20]:
+                        st.markdown(f"- {issue.message}")
                 except Exception as e:
                     st.error(f"匯入失敗：{e}")
 
+@_section
+def _poster_export():
+    with st.expander("🖨️ 海報列印（多頁拼貼）"):
+        tree = st.session_state.family_tree
+        if not tree["persons"]:
+            st.caption("尚未建立任何成員。")
+            return
+        c1, c2, c3 = st.columns(3)
+        paper = c1.selectbox("紙張", list(poster.PAPERS), index=1, key="poster_paper")
+        orient = c2.radio("方向", ["橫向", "直向"], horizontal=True, key="poster_orient")
+        fmt = c3.selectbox("格式", ["PDF（向量）", "SVG 分頁（zip）", "PNG 分頁（zip）"], key="poster_fmt")
+        st.caption("相鄰頁面重疊 10mm，四角附對位記號，方便裁切拼貼。")
+        if not st.button("產生列印檔", key="poster_build"):
+            return
+        layout = packed_layered_layout(tree)
+        buf = io.BytesIO()
+        if fmt.startswith("PDF"):
+            n = poster.export_pdf(tree, buf, paper=paper, landscape=(orient == "橫向"), layout=layout)
+            name, mime = "family_tree_poster.pdf", "application/pdf"
+        elif fmt.startswith("SVG"):
+            n = poster.export_svg_tiles(tree, buf, layout=layout)
+            name, mime = "family_tree_tiles_svg.zip", "application/zip"
+        else:
+            n = poster.export_png_tiles(tree, buf, layout=layout)
+            name, mime = "family_tree_tiles_png.zip", "application/zip"
+        st.download_button(f"⬇️ 下載（共 {n} 頁）", data=buf.getvalue(), file_name=name, mime=mime,
+                           use_container_width=True, key="poster_download")
+
+def _estate_inputs() -> Optional[Dict[str, Any]]:
+    # saved by the tax page once it has been opened in this session
+    return st.session_state.get("estate_inputs")
+
+@_section
+def _share_export():
+    with st.expander("🔗 唯讀分享頁（HTML）"):
+        tree = st.session_state.family_tree
+        if not tree["persons"]:
+            st.caption("尚未建立任何成員。")
+            return
+        estate = _estate_inputs()
+        with_estate = st.checkbox("附上遺產稅試算摘要", value=estate is not None, disabled=estate is None,
+                                  key="share_with_estate",
+                                  help=None if estate is not None else "請先於「法稅工具」頁輸入試算資料")
+        st.caption("單一 HTML 檔，家人以瀏覽器開啟即可檢視，不需登入或連線。")
+        used = estate if with_estate else None
+        # content key of what would be shared now; an older snapshot is not offered
+        key = _views().memo("share_key", json.dumps(used, sort_keys=True), lambda: snapshot_key(tree, used))
+        if st.button("產生分享頁", key="share_build"):
+            st.session_state.share_future = (key, request_snapshot(tree, used))
+        built = st.session_state.get("share_future")
+        if built is None:
+            return
+        if built[0] != key:
+            del st.session_state.share_future
+            st.caption("家族樹或試算資料已變更，請重新產生分享頁。")
+            return
+        fut = built[1]
+        if not fut.done():
+            st.info("分享頁產生中，可先繼續編輯；稍後按下方按鈕重新整理。")
+            st.button("重新整理", key="share_refresh")
+            return
+        try:
+            data = fut.result()
+        except Exception as e:
+            st.error(f"分享頁產生失敗：{e}")
+            return
+        st.download_button("⬇️ 下載分享頁", data=data, file_name="family_tree_share.html", mime="text/html",
+                           use_container_width=True, key="share_download")
+
+EDITOR_PAGE_SIZES = [25, 50, 100, 200]
+
+# editable column -> person field
+_PEOPLE_FIELDS = {"姓名": "name", "性別": "gender", "備註": "note", "已故": "deceased"}
+
+def _people_frame(pids: List[str]) -> pd.DataFrame:
+    persons = st.session_state.family_tree["persons"]
+    gens = _generations().mapping()
+    rows = [persons[pid] for pid in pids]
+    return pd.DataFrame({
+        "選取": False,
+        "pid": pids,
+        "世代": [gens.get(pid, 0) + 1 for pid in pids],
+        "姓名": [p.get("name", "") for p in rows],
+        "性別": [p.get("gender", "") for p in rows],
+        "備註": [p.get("note", "") for p in rows],
+        "已故": [bool(p.get("deceased", False)) for p in rows],
+    }, columns=["選取", "pid", "世代", "姓名", "性別", "備註", "已故"])
+
+def _changed_cells(before: pd.DataFrame, after: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    """pid -> {field: new value} for the cells that differ (one vectorised comparison)."""
+    cols = list(_PEOPLE_FIELDS)
+
+    def normalized(df: pd.DataFrame) -> pd.DataFrame:
+        # both sides alike: stored values with stray spaces or None are not edits
+        out = df[cols].copy()
+        text = ["姓名", "性別", "備註"]
+        out[text] = out[text].fillna("").astype(str).apply(lambda c: c.str.strip())
+        out["已故"] = out["已故"].fillna(False).astype(bool)
+        return out
+
+    a = normalized(after)
+    diff_mask = (a.to_numpy() != normalized(before).to_numpy())
+    rows = np.flatnonzero(diff_mask.any(axis=1))
+    out: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        pid = after["pid"].iat[r]
+        fields = {_PEOPLE_FIELDS[cols[c]]: a.iat[r, c] for c in np.flatnonzero(diff_mask[r])}
+        if "name" in fields:
+            fields["name"] = fields["name"] or pid
+        if "deceased" in fields:
+            fields["deceased"] = bool(fields["deceased"])
+        out[pid] = fields
+    return out
+
+@_section
 def _person_manager():
     st.subheader("👤 人員管理")
 
@@ -256,22 +496,24 @@ def _person_manager():
             st.error("請輸入姓名")
         else:
             pid = add_person(name, gender, note, deceased)
-            st.success(f"已新增：{name}（{pid}）")
+            st.toast(f"已新增：{name}（{pid}）")
 
-    # Editable table
+    # Editable table: only the visible page is turned into a DataFrame
     persons = st.session_state.family_tree["persons"]
     if persons:
-        base_rows = []
-        for pid, v in persons.items():
-            base_rows.append({
-                "選取": False,
-                "pid": pid,
-                "姓名": v.get("name", ""),
-                "性別": v.get("gender", ""),
-                "備註": v.get("note", ""),
-                "已故": bool(v.get("deceased", False)),
-            })
-        df = pd.DataFrame(base_rows)
+        c1, c2, c3 = st.columns([3, 1, 1])
+        query = c1.text_input("篩選成員", key="people_q", placeholder="姓名、拼音、注音或備註（留空 = 全部）")
+        size = c2.selectbox("每頁", EDITOR_PAGE_SIZES, index=1, key="people_page_size")
+        pids = _search().search(query, limit=len(persons)) if query.strip() else None
+        total = len(pids) if pids is not None else len(persons)
+        pages = max(1, -(-total // size))
+        if st.session_state.get("people_page", 1) > pages:
+            st.session_state.people_page = pages   # the list shrank (filter / deletions)
+        page = c3.number_input("頁次", 1, pages, 1, key="people_page") - 1
+        lo = page * size
+        page_pids = pids[lo:lo + size] if pids is not None else list(islice(persons, lo, lo + size))
+        st.caption(f"第 {page + 1} / {pages} 頁，共 {total} 位成員；換頁前請先儲存本頁的變更。")
+        df = _views().memo("people_frame", tuple(page_pids), lambda: _people_frame(page_pids))
 
         edited = st.data_editor(
             df,
@@ -280,52 +522,86 @@ def _person_manager():
             column_config={
                 "選取": st.column_config.CheckboxColumn("選取", default=False),
                 "pid": st.column_config.Column("pid", disabled=True),
+                "世代": st.column_config.NumberColumn("世代", disabled=True, help="同一家族由上而下第幾代"),
                 "姓名": st.column_config.TextColumn("姓名"),
                 "性別": st.column_config.SelectboxColumn("性別", options=["", "男", "女"]),
                 "備註": st.column_config.TextColumn("備註"),
                 "已故": st.column_config.CheckboxColumn("已故", default=False),
             },
-            key="people_editor",
+            disabled=["pid", "世代"],
+            num_rows="fixed",
+            # one editor state per page, so unsaved edits never land on another page's rows
+            key=f"people_editor_{query}_{size}_{lo}",
         )
 
         csave, cdel = st.columns([1,1])
         with csave:
             if st.button("💾 儲存變更", type="primary", use_container_width=True):
-                # write back
-                for _, row in edited.iterrows():
-                    pid = row["pid"]
-                    if pid in persons:
-                        persons[pid]["name"] = (row["姓名"] or "").strip() or pid
-                        persons[pid]["gender"] = row["性別"]
-                        persons[pid]["note"] = row["備註"]
-                        persons[pid]["deceased"] = bool(row["已故"])
-                st.success("已套用變更。")
+                changes = _changed_cells(df, edited)
+                # write back only the changed cells (one undo step for the whole page)
+                with _history().step("編輯成員"):
+                    for pid, fields in changes.items():
+                        if pid in persons:
+                            update_person(pid, **fields)
+                st.success(f"已套用 {len(changes)} 位成員的變更。" if changes else "沒有需要儲存的變更。")
                 _safe_rerun()
         with cdel:
             if st.button("🗑️ 刪除所選", type="secondary", use_container_width=True):
-                selected_pids = [row["pid"] for _, row in edited.iterrows() if row["選取"]]
+                selected_pids = edited.loc[edited["選取"].fillna(False).astype(bool), "pid"].tolist()
                 if not selected_pids:
                     st.warning("尚未選取要刪除的成員。")
                 else:
-                    for pid in selected_pids:
-                        _delete_person(pid)
+                    with _history().step(f"刪除 {len(selected_pids)} 位成員"):
+                        for pid in selected_pids:
+                            _delete_person(pid)
                     st.success(f"已刪除 {len(selected_pids)} 位成員，並清理關聯。")
                     _safe_rerun()
 
+PICKER_PAGE_SIZE = 20
+
+def _person_picker(label: str, key: str) -> str:
+    """Typeahead person selector: only one page of matches goes to the browser.
+
+    Returns the chosen pid, or "-" for none. The choice stays selected while the
+    search text or page changes.
+    """
+    persons = st.session_state.family_tree.get("persons", {})
+    query = st.text_input(f"搜尋{label}", key=f"{key}_q", placeholder="姓名、拼音、注音或備註",
+                          label_visibility="collapsed")
+    page_key = f"{key}_page"
+    if st.session_state.get(f"{key}_last_q") != query:
+        st.session_state[f"{key}_last_q"] = query
+        st.session_state[page_key] = 0
+    page = st.session_state.get(page_key, 0)
+    hits, total = _search().page(query, page, PICKER_PAGE_SIZE)
+    chosen = st.session_state.get(key, "-")
+    options = ["-"] + ([chosen] if chosen in persons and chosen not in hits else []) + hits
+    if chosen not in options:
+        st.session_state[key] = "-"
+    person_label = _views().person_label
+    pick = st.selectbox(label, options, key=key,
+                        format_func=lambda x: "-" if x == "-" else person_label(x))
+    pages = max(1, -(-total // PICKER_PAGE_SIZE))
+    if pages > 1:
+        b1, b2, b3 = st.columns([1, 2, 1])
+        # on_click: the page moves before the (section-only) rerun draws it
+        b1.button("◀", key=f"{key}_prev", disabled=page == 0, use_container_width=True,
+                  on_click=st.session_state.__setitem__, args=(page_key, page - 1))
+        b2.caption(f"第 {page + 1} / {pages} 頁，共 {total} 筆")
+        b3.button("▶", key=f"{key}_next", disabled=page + 1 >= pages, use_container_width=True,
+                  on_click=st.session_state.__setitem__, args=(page_key, page + 1))
+    return pick
+
+@_section
 def _marriage_manager():
     st.subheader("💍 婚姻與子女")
     persons = st.session_state.family_tree.get("persons", {})
-    p_values = list(persons.keys())
 
     c1, c2, c3 = st.columns(3)
     with c1:
-        s1 = st.selectbox("配偶 A", ["-"] + p_values,
-                          format_func=lambda x: "-" if x=="-" else _fmt_pid(persons, x),
-                          key="spouse_a_select")
+        s1 = _person_picker("配偶 A", "spouse_a_select")
     with c2:
-        s2 = st.selectbox("配偶 B", ["-"] + p_values,
-                          format_func=lambda x: "-" if x=="-" else _fmt_pid(persons, x),
-                          key="spouse_b_select")
+        s2 = _person_picker("配偶 B", "spouse_b_select")
     with c3:
         st.markdown("\n")
         make = st.button("建立婚姻")
@@ -334,8 +610,11 @@ def _marriage_manager():
         if s1 == "-" or s2 == "-" or s1 == s2:
             st.error("請選擇兩位不同成員作為配偶")
         else:
-            st.session_state.selected_mid = add_or_get_marriage(s1, s2)
-            st.success(f"已建立婚姻：{st.session_state.selected_mid}")
+            try:
+                st.session_state.selected_mid = add_or_get_marriage(s1, s2)
+                st.toast(f"已建立婚姻：{st.session_state.selected_mid}")
+            except ValidationError as e:
+                st.error(str(e))
 
     marriages = st.session_state.family_tree.get("marriages", {})
     if marriages:
@@ -344,26 +623,15 @@ def _marriage_manager():
             st.session_state.selected_mid = mids[-1]
         default_index = mids.index(st.session_state.selected_mid)
 
-        def _m_label(mid: str) -> str:
-            m = marriages[mid]
-            order = m.get("order") or m.get("spouses", [])
-            names = [persons.get(x, {}).get('name', x) for x in order]
-            return f"{mid}｜{' ↔ '.join(names)}"
-
         selected_mid = st.selectbox(
             "選擇婚姻（新增/刪除子女、設定離婚）",
-            options=mids, index=default_index, format_func=_m_label,
+            options=mids, index=default_index, format_func=_views().marriage_label,
         )
         st.session_state.selected_mid = selected_mid
 
         c4, c5 = st.columns([3, 2])
         with c4:
-            child = st.selectbox(
-                "選擇子女（現有成員）",
-                ["-"] + list(persons.keys()),
-                format_func=lambda x: "-" if x=="-" else _fmt_pid(persons, x),
-                key="child_select",
-            )
+            child = _person_picker("選擇子女（現有成員）", "child_select")
         with c5:
             st.markdown("\n")
             addc = st.button("加入子女")
@@ -372,9 +640,12 @@ def _marriage_manager():
             if child == "-":
                 st.error("請選擇一位成員作為子女")
             else:
-                add_child(selected_mid, child)
-                st.success("已加入子女")
-                _safe_rerun()
+                try:
+                    add_child(selected_mid, child)
+                    st.success("已加入子女")
+                    _safe_rerun()
+                except ValidationError as e:
+                    st.error(str(e))
 
         m = marriages[selected_mid]
         current_children = m.get("children", [])
@@ -383,7 +654,7 @@ def _marriage_manager():
             del_sel = st.multiselect(
                 "選擇要刪除的子女",
                 options=current_children,
-                format_func=lambda x: _fmt_pid(persons, x),
+                format_func=_views().person_label,
                 key="del_children_select"
             )
             if st.button("🗑️ 刪除子女"):
@@ -404,23 +675,453 @@ def _marriage_manager():
             _safe_rerun()
 
         st.markdown("---")
-        rows = []
-        for mid, mm in marriages.items():
-            order = mm.get("order") or mm.get("spouses", [])
-            sp_names = [persons.get(x, {}).get("name", x) for x in order]
-            ch = [persons.get(x, {}).get("name", x) for x in mm.get("children", [])]
-            rows.append({"mid": mid, "配偶": "、".join(sp_names),
-                         "子女": "、".join(ch), "離婚": "是" if mm.get("divorced", False) else "否"})
-        st.dataframe(rows, use_container_width=True, hide_index=True)
+        views = _views()
+        st.dataframe(views.memo("marriage_df", None, lambda: pd.DataFrame(views.marriage_rows())),
+                     use_container_width=True, hide_index=True)
+
+def _show_svg(svg: bytes):
+    # static <img>: the browser only paints it, no client-side layout
+    b64 = base64.b64encode(svg).decode("utf-8")
+    st.markdown(
+        f'<div style="overflow:auto;max-height:80vh;text-align:center;">'
+        f'<img src="data:image/svg+xml;base64,{b64}" style="max-width:100%;height:auto;" alt="family tree"></div>',
+        unsafe_allow_html=True,
+    )
 
+VIEWPORT_AUTO_THRESHOLD = 200  # trees larger than this open in focus view by default
+LEAN_DOT_THRESHOLD = 300       # ...and switch to the low-constraint DOT emitter
+
+def _viewport_controls(tree: dict) -> Tuple[dict, Optional[tuple]]:
+    """Focus-person view: returns the subtree to draw (or the whole tree) and its cache key."""
+    persons = tree["persons"]
+    with st.expander("🔍 視野（聚焦成員 / 代數範圍 / 收合分支）",
+                     expanded=len(persons) > VIEWPORT_AUTO_THRESHOLD):
+        on = st.checkbox("只顯示聚焦成員附近", value=len(persons) > VIEWPORT_AUTO_THRESHOLD,
+                         key="vp_on")
+        if not on:
+            return tree, None
+        pids = list(persons.keys())
+        if st.session_state.get("vp_focus") not in persons:
+            st.session_state.vp_focus = pids[0]
+        c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+        with c1:
+            focus = st.selectbox("聚焦成員", pids, format_func=_views().person_label,
+                                 key="vp_focus")
+        with c2:
+            up = st.number_input("往上幾代", min_value=0, max_value=20, value=2, step=1, key="vp_up")
+        with c3:
+            down = st.number_input("往下幾代", min_value=0, max_value=20, value=2, step=1, key="vp_down")
+        with c4:
+            hops = st.number_input("關係步數（0=不限）", min_value=0, max_value=50, value=4, step=1,
+                                   key="vp_hops")
+        collapsed = [m for m in st.session_state.get("vp_collapsed", []) if m in tree["marriages"]]
+        key = (focus, int(up), int(down), int(hops), tuple(collapsed))
+        sub = _views().memo("viewport", key, lambda: visible_subtree(
+            _graph(), focus, up=int(up), down=int(down), hops=int(hops) or None, collapsed=collapsed))
+        foldable = [mid for mid, m in sub["marriages"].items() if m["children"] or mid in collapsed]
+        foldable += [mid for mid in collapsed if mid not in sub["marriages"]]
+        st.session_state.vp_collapsed = collapsed
+        marriages = tree["marriages"]
+        st.multiselect(
+            "收合分支（子孫以「+N」顯示）", foldable,
+            format_func=lambda mid: "、".join(
+                persons.get(x, {}).get("name", x) for x in (marriages[mid].get("order") or [])) or mid,
+            key="vp_collapsed",
+        )
+        shown = sum(1 for p in sub["persons"].values() if p.get("summary") is None)
+        st.caption(f"顯示 {shown} / {len(persons)} 位成員")
+        return sub, key
+
+def _generation_filter(tree: dict, gens: Dict[str, int], key: Optional[tuple]) -> Tuple[dict, Optional[tuple]]:
+    """Generation slider; returns the tree to draw and the slider range (None = all)."""
+    def span():
+        levels = [gens[pid] for pid in tree["persons"] if pid in gens]
+        return (min(levels), max(levels)) if levels else None
+    levels = _views().memo("gen_span", key, span)
+    if not levels or levels[0] == levels[1]:
+        return tree, None
+    lo, hi = levels[0] + 1, levels[1] + 1
+    prev = st.session_state.get("gen_range")
+    if prev is not None:   # keep the stored range inside the current span after edits
+        a_, b_ = max(lo, min(prev[0], hi)), max(lo, min(prev[1], hi))
+        st.session_state.gen_range = (min(a_, b_), max(a_, b_))
+    # value only seeds a fresh widget; passing it alongside a stored range makes Streamlit warn
+    kw = {} if prev is not None else {"value": (lo, hi)}
+    sel = st.slider("顯示世代", min_value=lo, max_value=hi, key="gen_range", format="第 %d 代", **kw)
+    if sel == (lo, hi):
+        return tree, None
+    return _views().memo("gen_filter", (key, sel),
+                         lambda: filter_generations(tree, gens, sel[0] - 1, sel[1] - 1)), sel
+
+@st.fragment(run_every=0.5)
+def _await_drawing(fut):
+    # polls only while a drawing is pending; the rerun it triggers no longer calls it
+    if fut.done():
+        st.rerun()
+
+@_section
 def _viewer():
     st.subheader("🌳 家族樹")
     tree = st.session_state.family_tree
     if not tree["persons"]:
         st.info("尚未建立任何成員。請先於上方區塊新增人員，並建立婚姻與子女。")
         return
-    g = render_graph(tree)
-    st.graphviz_chart(g, use_container_width=True)
+    tree, vp_key = _viewport_controls(tree)
+    gens = _generations().mapping()
+    tree, sel = _generation_filter(tree, gens, vp_key)
+    mode = st.radio("繪製方式", ["伺服器預先繪製", "內建快速排版", "瀏覽器排版"], horizontal=True,
+                    key="tree_render_mode")
+    lean = st.checkbox("精簡 DOT（大型家族排版較快）", value=len(tree["persons"]) > LEAN_DOT_THRESHOLD,
+                       key="tree_lean_dot")
+    # the drawing only changes with the tree or these controls: reruns from other widgets reuse it
+    key = (vp_key, sel, mode, lean)
+    if mode == "伺服器預先繪製":
+        # per-clan layouts, reused across style-only edits, on the shared Graphviz pool.
+        # The layout runs off the script thread so a rerun never waits for it: a new
+        # drawing cancels the jobs of the one it replaces, and the page polls for it.
+        def submit():
+            old = st.session_state.get("gv_owner")
+            if old is not None:
+                get_pool().cancel(old)
+            owner = st.session_state.gv_owner = uuid.uuid4().hex   # fresh per drawing
+            return request_render(tree, lean=lean, owner=owner, generations=gens)
+
+        fut = _views().memo("tree_drawing", key, submit)
+        if not fut.done():
+            st.info("排版中，完成後會自動顯示…")
+            _await_drawing(fut)
+            return
+        try:
+            svg, level = fut.result()
+        except CancelledError:
+            return  # superseded by a newer drawing
+        if level == "degraded":
+            st.caption("排版超過時間上限，已改用簡化排版。")
+        elif level == "layered":
+            st.caption("Graphviz 無法使用或忙碌中，已改用內建排版。")
+        _show_svg(svg)
+        return
+    if mode == "內建快速排版":
+        _show_svg(_views().memo("tree_drawing", key, lambda: render_components_svg(tree, engine="layered")))
+        return
+    dot = _views().memo("tree_drawing", key, lambda: render_graph(tree, lean=lean, generations=gens).source)
+    st.graphviz_chart(dot, use_container_width=True)
+
+@_section
+def _kinship_panel():
+    with st.expander("🧭 親屬關係查詢"):
+        persons = st.session_state.family_tree["persons"]
+        if len(persons) < 2:
+            st.caption("至少需要兩位成員。")
+            return
+        kin = KinshipIndex(_graph())   # memo lives for this rerun only; edits rebuild it
+        pids = list(persons)
+        c1, c2 = st.columns(2)
+        a = c1.selectbox("甲", pids, format_func=_views().person_label, key="kin_a")
+        b = c2.selectbox("乙", pids, index=min(1, len(pids) - 1),
+                         format_func=_views().person_label, key="kin_b")
+        path, term = kin.relation(a, b)
+        name = lambda x: persons.get(x, {}).get("name", x)
+        st.markdown(f"**{name(b)}** 是 **{name(a)}** 的 **{term}**")
+        if path and path[1]:
+            st.caption(" → ".join(name(x) for x in path[0]))
+
+        st.markdown("**關係對照表**")
+        chosen = st.multiselect("選擇成員（最多 30 位）", pids, format_func=_views().person_label,
+                                max_selections=30, key="kin_table_sel")
+        if len(chosen) >= 2:
+            grid = {x: {} for x in chosen}
+            for x, y, t in kin.table(chosen):
+                grid[y][x] = t   # column = 甲, row = 乙 是 甲 的…
+            df = pd.DataFrame(grid).T.reindex(index=chosen, columns=chosen).fillna("—")
+            df.index = [name(x) for x in chosen]
+            df.columns = [name(x) for x in chosen]
+            st.caption("列成員 是 欄成員 的 …")
+            st.dataframe(df, use_container_width=True)
+        if st.button("產生全部成員關係表（CSV）", key="kin_all"):
+            rows = [(name(x), name(y), t) for x, y, t in kin.table()]
+            csv = pd.DataFrame(rows, columns=["甲", "乙", "乙是甲的"]).to_csv(index=False)
+            st.download_button("⬇️ 下載關係表", data=csv.encode("utf-8-sig"), file_name="kinship_table.csv",
+                               mime="text/csv", key="kin_all_dl")
+
+@_section
+def _dedupe_panel():
+    with st.expander("🧬 重複成員偵測與合併"):
+        persons = st.session_state.family_tree["persons"]
+        if len(persons) < 2:
+            st.caption("至少需要兩位成員。")
+            return
+        for msg in st.session_state.pop("dedupe_notes", []):
+            st.warning(msg)
+        c1, c2 = st.columns([3, 1])
+        threshold = c1.slider("相似度門檻", 0.5, 1.0, dedupe.DEFAULT_THRESHOLD, 0.05, key="dedupe_threshold")
+        if c2.button("🔍 掃描", use_container_width=True, key="dedupe_scan"):
+            st.session_state.dedupe_candidates = dedupe.find_duplicates(_graph(), threshold)
+        cands = [c for c in st.session_state.get("dedupe_candidates", [])
+                 if c.a in persons and c.b in persons]
+        if "dedupe_candidates" not in st.session_state:
+            st.caption("比對姓名（含簡繁、空白差異）、性別與共同親屬，找出可能重複的成員。")
+            return
+        if not cands:
+            st.success("沒有發現疑似重複的成員。")
+            return
+        name = lambda x: persons.get(x, {}).get("name", x)
+        st.dataframe(pd.DataFrame([{"成員甲": _label(c.a), "成員乙": _label(c.b),
+                                    "相似度": f"{c.score:.0%}", "依據": "、".join(c.reasons)}
+                                   for c in cands[:200]]), hide_index=True, use_container_width=True)
+        i = st.selectbox("選擇要合併的一組", range(len(cands[:200])), key="dedupe_pick",
+                         format_func=lambda k: f"{name(cands[k].a)} ↔ {name(cands[k].b)}（{cands[k].score:.0%}）")
+        pair = cands[i]
+        keep = st.radio("保留哪一筆資料", [pair.a, pair.b], horizontal=True, key="dedupe_keep",
+                        format_func=_views().person_label)
+        drop = pair.b if keep == pair.a else pair.a
+        st.caption("另一筆的婚姻、子女與父母關係會移到保留的成員，空白欄位以另一筆補上。")
+        if st.button("🔗 合併", type="primary", key="dedupe_merge"):
+            try:
+                notes = merge_persons(keep, drop)
+            except ValidationError as e:
+                st.error(str(e))
+                return
+            st.session_state.dedupe_notes = notes   # shown after the rerun
+            st.toast(f"已合併：{name(keep)}")
+            _safe_rerun()
+
+_BRANCH_MODES = {"後代": "descendants", "祖先": "ancestors", "祖先與後代": "both"}
+
+@_section
+def _branch_panel():
+    with st.expander("🌿 分支擷取（只匯出 / 檢視某一房）"):
+        persons = st.session_state.family_tree["persons"]
+        if not persons:
+            st.caption("尚未建立任何成員。")
+            return
+        pids = list(persons)
+        roots = st.multiselect("從哪些成員開始", pids, format_func=_views().person_label,
+                               key="branch_roots")
+        c1, c2 = st.columns([2, 1])
+        mode = c1.radio("範圍", list(_BRANCH_MODES), horizontal=True, key="branch_mode")
+        depth = c2.number_input("代數（0 = 全部）", 0, 50, 0, key="branch_depth")
+        if not roots:
+            return
+        # built from the graph indexes: cost follows the branch, not the whole clan
+        sub = extract_branch(_graph(), roots, _BRANCH_MODES[mode], depth=int(depth) or None)
+        st.caption(f"分支共 {len(sub['persons'])} 位成員、{len(sub['marriages'])} 段婚姻。")
+        c1, c2 = st.columns(2)
+        data = json.dumps(sub, ensure_ascii=False, indent=2).encode("utf-8")
+        c1.download_button("⬇️ 匯出分支 JSON", data=data, file_name="family_branch.json",
+                           mime="application/json", use_container_width=True, key="branch_json")
+        # the PDF is stale as soon as the branch's content differs, not just its size
+        key = hashlib.sha1(data).hexdigest()
+        if c2.button("產生分支 PDF（A3 拼貼）", use_container_width=True, key="branch_pdf_build"):
+            st.session_state.branch_pdf = (key, poster.export_pdf_bytes(sub, paper="A3", title="家族樹（分支）"))
+        built = st.session_state.get("branch_pdf")
+        if built and built[0] == key:
+            c2.download_button("⬇️ 下載分支 PDF", data=built[1], file_name="family_branch.pdf",
+                               mime="application/pdf", use_container_width=True, key="branch_pdf_dl")
+        if st.checkbox("預覽分支圖", key="branch_preview"):
+            svg, _ = render_within_budget(sub, lean=len(sub["persons"]) > LEAN_DOT_THRESHOLD)
+            _show_svg(svg)
+
+_UPLOAD = "（上傳 JSON 檔）"
+_NO_BASE = "（無：只比較差異）"
+
+def _pick_version(label: str, options: List[str], key: str) -> Optional[dict]:
+    choice = st.selectbox(label, options, key=key)
+    if choice == _NO_BASE:
+        return None
+    if choice != _UPLOAD:
+        return _workspace().tree(choice)
+    up = st.file_uploader(f"{label}檔案", type=["json"], key=f"{key}_file")
+    if up is None:
+        return None
+    # parsed once per upload, not on every rerun of the panel (a bad file's error too)
+    cached = st.session_state.get(f"{key}_parsed")
+    if cached is None or cached[0] != up.file_id:
+        up.seek(0)
+        try:
+            cached = (up.file_id, _read_upload(up, up.size, "讀取中")[0].tree)
+        except ValidationError as e:
+            cached = (up.file_id, e)
+        st.session_state[f"{key}_parsed"] = cached
+    if isinstance(cached[1], ValidationError):
+        raise cached[1]
+    return cached[1]
+
+@_section
+def _merge_panel():
+    with st.expander("🔀 版本比較與合併"):
+        ws = _workspace()
+        others = [n for n in ws.names() if n != ws.active]
+        st.caption(f"目前的家族樹「{ws.active}」為我方版本；衝突時以我方為準並列出明細。")
+        try:
+            theirs = _pick_version("對方版本", [_UPLOAD] + others, "merge_theirs")
+            base = _pick_version("共同底稿（雙方修改前的版本）", [_NO_BASE, _UPLOAD] + others, "merge_base")
+        except (ValidationError, ValueError) as e:
+            st.error(f"檔案無法使用：{e}")
+            return
+        if theirs is None:
+            return
+        ours = st.session_state.family_tree
+        if base is None:
+            d = diff(ours, theirs)
+            s = d.summary()
+            st.markdown(f"對方相對於我方：成員 +{s['persons_added']} / -{s['persons_removed']} / "
+                        f"修改 {s['persons_modified']}；婚姻 +{s['marriages_added']} / -{s['marriages_removed']} / "
+                        f"修改 {s['marriages_modified']}")
+            if d:
+                st.dataframe(pd.DataFrame(d.rows(ours["persons"])), hide_index=True, use_container_width=True)
+            return
+        merged, conflicts = merge3(base, ours, theirs)
+        st.markdown(f"合併結果：{len(merged['persons'])} 位成員、{len(merged['marriages'])} 段婚姻，"
+                    f"衝突 {len(conflicts)} 項。")
+        if conflicts:
+            st.dataframe(pd.DataFrame([{"類型": c.kind, "說明": c.message} for c in conflicts]),
+                         hide_index=True, use_container_width=True)
+        if any(c.kind == "invalid" for c in conflicts):
+            st.error("合併結果的親屬結構不一致（見上表），請先修正其中一方再合併。")
+            return
+        if st.button("建立合併結果為新的家族樹", type="primary", key="merge_apply"):
+            # merged shares records with the cached uploads: give the new tree its own copy
+            _new_tree(_unique_tree_name(f"{ws.active}（合併）"), FamilyGraph.from_dict(unpack(pack(merged))))
+            _safe_rerun()
+
+_STATUS_LABELS = {DRAFT: "草稿", FINAL: "定稿"}
+
+def _version_label(vs: VersionStore, i: int) -> str:
+    v = vs.versions()[i]
+    return f"#{i + 1} {v.label}（{_STATUS_LABELS[v.status]}）"
+
+def _compare_view(tree: dict, marks: Dict[str, str], mids: List[str]) -> dict:
+    # large trees: only the changed persons / couples and their parents, spouses, children
+    if len(tree["persons"]) <= VIEWPORT_AUTO_THRESHOLD:
+        return tree
+    roots = list(marks) + [s for mid in mids for s in tree["marriages"].get(mid, {}).get("spouses", [])]
+    return extract_branch(FamilyGraph.from_dict(tree), roots, "both", depth=1)
+
+@_section
+def _versions_panel():
+    with st.expander("🗂 版本管理（草稿 / 定稿）"):
+        vs = _versions()
+        c1, c2, c3 = st.columns([3, 1, 1])
+        label = c1.text_input("版本名稱", key="ver_label", placeholder=f"版本 {len(vs) + 1}")
+        status = c2.radio("狀態", [DRAFT, FINAL], format_func=_STATUS_LABELS.get, key="ver_status")
+        if c3.button("💾 儲存目前版本", use_container_width=True, key="ver_save"):
+            i = vs.snapshot(st.session_state.family_tree, label, status)
+            st.toast(f"已儲存：{_version_label(vs, i)}")
+        if not len(vs):
+            st.caption("儲存後可隨時比較任兩個版本；只保存各版之間的差異，定期存完整檢查點。定稿版本不可再修改名稱或狀態。")
+            return
+        st.dataframe(pd.DataFrame([{"版本": f"#{i + 1}", "名稱": v.label, "狀態": _STATUS_LABELS[v.status],
+                                    "成員": v.persons, "婚姻": v.marriages,
+                                    "儲存": "完整" if v.checkpoint else "差異", "大小 (KB)": round(v.bytes / 1024, 1)}
+                                   for i, v in enumerate(vs.versions())]),
+                     hide_index=True, use_container_width=True)
+        idx = list(range(len(vs)))
+        c1, c2, c3 = st.columns([2, 1, 1])
+        pick = c1.selectbox("選擇版本", idx, index=len(vs) - 1, key="ver_pick",
+                            format_func=lambda i: _version_label(vs, i))
+        locked = vs.versions()[pick].status == FINAL
+        if c2.button("標記為定稿", use_container_width=True, key="ver_final", disabled=locked):
+            vs.set_status(pick, FINAL)
+            _safe_rerun()
+        if c3.button("以此版本開新家族樹", use_container_width=True, key="ver_open"):
+            name = _unique_tree_name(f"{_workspace().active}（{vs.versions()[pick].label}）")
+            _new_tree(name, FamilyGraph.from_dict(vs.tree(pick)))
+            _safe_rerun()
+        if len(vs) < 2:
+            return
+        st.markdown("**版本比較**")
+        c1, c2 = st.columns(2)
+        a = c1.selectbox("舊版本", idx, index=len(vs) - 2, key="ver_a", format_func=lambda i: _version_label(vs, i))
+        b = c2.selectbox("新版本", idx, index=len(vs) - 1, key="ver_b", format_func=lambda i: _version_label(vs, i))
+        if a == b:
+            return
+        ta, tb = vs.tree(a), vs.tree(b)
+        d = diff(ta, tb)
+        s = d.summary()
+        st.markdown(f"成員 +{s['persons_added']} / -{s['persons_removed']} / 修改 {s['persons_modified']}；"
+                    f"婚姻 +{s['marriages_added']} / -{s['marriages_removed']} / 修改 {s['marriages_modified']}")
+        if not d:
+            st.success("兩個版本內容相同。")
+            return
+        st.dataframe(pd.DataFrame(d.rows(ta["persons"])), hide_index=True, use_container_width=True)
+        if st.checkbox("並排顯示差異圖（綠：新增、紅：刪除、橘：修改）", key="ver_side_by_side"):
+            old, new = highlight_map(d)
+            changed = list(d.m_modified)
+            sides = ((c1, ta, old, changed + list(d.m_removed), _version_label(vs, a)),
+                     (c2, tb, new, changed + list(d.m_added), _version_label(vs, b)))
+            for col, tree, marks, mids, title in sides:
+                with col:
+                    st.caption(title)
+                    view = _compare_view(tree, marks, mids)
+                    st.graphviz_chart(render_graph(view, lean=len(view["persons"]) > LEAN_DOT_THRESHOLD,
+                                                   highlight=marks), use_container_width=True)
+
+def _join_room(room: str, host: bool):
+    """Host: share the active tree under `room`. Guest: open the room's tree as a new tree."""
+    if host:
+        graph, extras = _workspace().open(_workspace().active)
+    else:
+        _new_tree(_unique_tree_name(f"共編 {room}"))
+        graph, extras = _workspace().open(_workspace().active)
+    c = Collab(graph, FileStore(room))
+    if host:
+        c.seed()
+    else:
+        c.poll()
+    extras["collab"] = c
+    st.session_state.family_collab = c
+
+def _leave_room(destroy: bool = False):
+    c = _collab()
+    if c is None:
+        return
+    c.flush()
+    if destroy:
+        c.store.destroy()
+    _, extras = _workspace().open(_workspace().active)
+    extras.pop("collab", None)
+    st.session_state.family_collab = None
+
+@st.fragment(run_every=1)
+def _collab_sync():
+    # reruns on its own every second: publishes local edits, pulls peers' ops and
+    # only reruns the whole page when something actually arrived
+    c = _collab()
+    if c is None:
+        return
+    if c.poll():
+        st.rerun(scope="app")
+    s = c.stats()
+    st.caption(f"🤝 共編室 {c.store.room}｜{len(c.peers()) + 1} 人參與｜已送出 {s['sent']}、已接收 {s['received']} 筆變更")
+
+def _collab_panel():
+    with st.expander("🤝 顧問陪跑模式（多人協作）"):
+        c = _collab()
+        if c is not None:
+            st.markdown(f"目前的家族樹已連上共編室 **{c.store.room}**，請將代碼告訴一起編輯的人。")
+            c1, c2 = st.columns(2)
+            if c1.button("離開共編室", use_container_width=True, key="collab_leave"):
+                _leave_room()
+                _safe_rerun()
+            if c2.button("結束共編室並刪除紀錄", use_container_width=True, key="collab_end",
+                         help="刪除伺服器上的共編紀錄；其他人手上的家族樹不受影響"):
+                _leave_room(destroy=True)
+                _safe_rerun()
+            return
+        st.caption("多位顧問或家屬同時編輯同一棵家族樹，彼此的修改約一秒內出現。"
+                   "共編期間的變更紀錄會暫存在伺服器上，結束共編室即刪除。")
+        c1, c2 = st.columns(2)
+        if c1.button("以目前的家族樹開新共編室", use_container_width=True, key="collab_host"):
+            _join_room(uuid.uuid4().hex[:6], host=True)
+            _safe_rerun()
+        room = c2.text_input("共編室代碼", key="collab_room", placeholder="例如 3fa9c1")
+        if c2.button("加入", use_container_width=True, key="collab_join", disabled=not room.strip()):
+            if not room_exists(room.strip()):
+                st.error("找不到這個共編室，請確認代碼。")
+                return
+            _join_room(room.strip(), host=False)
+            _safe_rerun()
 
 # ----------------------------- Entry -----------------------------
 
@@ -429,10 +1130,25 @@ def main():
     _init_state()
     st.title("🌳 家族樹")
     _sidebar_controls()
+    _workspace_bar()
+    notice = st.session_state.pop("collab_notice", None)
+    if notice:
+        st.warning(notice)
+    if _collab() is not None:
+        _collab_sync()   # polls every second: only for a tree that is in a room
+    _undo_redo_controls()
     with st.expander("➕ 建立 / 管理成員與關係", expanded=True):
         _person_manager(); _marriage_manager()
     _viewer()
+    _kinship_panel()
+    _branch_panel()
+    _dedupe_panel()
+    _merge_panel()
+    _versions_panel()
+    _collab_panel()
     _bottom_io_controls()
+    _poster_export()
+    _share_export()
 
 def render():
     main()
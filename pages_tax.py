@@ -10,12 +10,7 @@ try:
 except Exception:
     pdf_table = None
 
-from tax import (
-    determine_heirs_and_shares,
-    eligible_deduction_counts_by_heirs,
-    apply_brackets,
-    ESTATE_BRACKETS,
-)
+from tax import determine_heirs_and_shares, eligible_deduction_counts_by_heirs, estate_summary
 
 # ------------ helpers ------------
 def _wan(n: int | float) -> int:
@@ -151,12 +146,12 @@ def render():
     st.markdown("### ② 遺產與扣除（單位：萬元）")
     cA, cB, cC = st.columns(3)
     with cA:
-        estate_base_wan = st.number_input("遺產總額", min_value=0, value=12000, step=10)
-        funeral_wan     = st.number_input("喪葬費（上限 138 萬）", min_value=0, value=138, step=1)
+        estate_base_wan = st.number_input("遺產總額", min_value=0, value=12000, step=10, key="tx_estate")
+        funeral_wan     = st.number_input("喪葬費（上限 138 萬）", min_value=0, value=138, step=1, key="tx_funeral")
     with cB:
         spouse_ded = 5_530_000 if eligible["spouse"] == 1 else 0  # 元
         st.text_input("配偶扣除（自動）", value=_fmt_wan(spouse_ded), disabled=True)
-        basic_ex_wan    = st.number_input("基本免稅（1,333 萬）", min_value=0, value=1333, step=1)
+        basic_ex_wan    = st.number_input("基本免稅（1,333 萬）", min_value=0, value=1333, step=1, key="tx_basic")
     with cC:
         st.text_input("直系卑親屬人數（自動 ×56 萬）", value=str(eligible["children"]), disabled=True)
         st.text_input("直系尊親屬人數（自動 ×138 萬｜最多 2）", value=str(eligible["ascendants"]), disabled=True)
@@ -165,13 +160,23 @@ def render():
     funeral       = int(funeral_wan * 10000)
     basic_ex      = int(basic_ex_wan * 10000)
 
-    funeral_capped = min(funeral, 1_380_000)
-    amt_children   = eligible["children"] * 560_000
-    amt_asc        = eligible["ascendants"] * 1_380_000
-
-    total_deductions = int(funeral_capped + spouse_ded + basic_ex + amt_children + amt_asc)
-    taxable = max(0, int(estate_base - total_deductions))
-    result = apply_brackets(taxable, ESTATE_BRACKETS)
+    # widget keys are dropped while another page is shown; the family-tree page's
+    # share export reads this plain copy instead
+    ss["estate_inputs"] = {"spouse_alive": bool(spouse_alive), "child_count": int(child_count),
+                           "parent_count": int(parent_count), "sibling_count": int(sibling_count),
+                           "grandparent_count": int(grandparent_count),
+                           "estate_base": estate_base, "funeral": funeral, "basic_ex": basic_ex}
+
+    summary = estate_summary(spouse_alive, child_count, parent_count, sibling_count, grandparent_count,
+                             estate_base, funeral, basic_ex)
+    ded = summary["deductions"]
+    funeral_capped = ded["funeral"]
+    amt_children   = ded["children"]
+    amt_asc        = ded["ascendants"]
+
+    total_deductions = summary["total_deductions"]
+    taxable = summary["taxable"]
+    result = summary["result"]
 
     # ③ 試算結果（小型卡）
     st.markdown("### ③ 試算結果")
@@ -50,3 +50,19 @@ def eligible_deduction_counts_by_heirs(spouse_alive: bool, shares: Dict[str, flo
     cnt_children = sum(1 for k in shares if k.startswith("子女"))
     cnt_asc = sum(1 for k in shares if k.startswith("父母") or k.startswith("祖父母"))
     return {"spouse": 1 if spouse_alive and ("配偶" in shares) else 0, "children": cnt_children, "ascendants": min(cnt_asc, 2)}
+def estate_summary(spouse_alive: bool, child_count: int, parent_count: int, sibling_count: int, grandparent_count: int,
+                   estate_base: int, funeral: int, basic_ex: int) -> Dict[str, object]:
+    """Heirs, deductions and estate tax in one dict (amounts in 元)."""
+    order, shares = determine_heirs_and_shares(spouse_alive, child_count, parent_count, sibling_count, grandparent_count)
+    eligible = eligible_deduction_counts_by_heirs(spouse_alive, shares)
+    deductions = {
+        "funeral": min(funeral, 1_380_000),
+        "spouse": 5_530_000 if eligible["spouse"] == 1 else 0,
+        "basic": basic_ex,
+        "children": eligible["children"] * 560_000,
+        "ascendants": eligible["ascendants"] * 1_380_000,
+    }
+    total = int(sum(deductions.values()))
+    taxable = max(0, int(estate_base - total))
+    return {"order": order, "shares": shares, "eligible": eligible, "deductions": deductions,
+            "total_deductions": total, "taxable": taxable, "result": apply_brackets(taxable, ESTATE_BRACKETS)}
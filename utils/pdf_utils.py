@@ -18,7 +18,9 @@ try:
     if os.path.isfile(_FONT_PATH) and (FONT_NAME not in pdfmetrics.getRegisteredFontNames()):
         pdfmetrics.registerFont(TTFont(FONT_NAME, _FONT_PATH))
 except Exception:
-    FONT_NAME = "Helvetica"
+    pass
+if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+    FONT_NAME = "Helvetica"  # font file not deployed: keep PDFs buildable
 
 _styles = getSampleStyleSheet()
 styles = {
@@ -42,7 +44,7 @@ def _resolve_logo_path():
     return None
 
 def _draw_header_footer(c: canvas.Canvas, doc):
-    w, h = A4
+    w, h = getattr(doc, "pagesize", None) or A4
     band_h = 20 * mm
     c.saveState()
 